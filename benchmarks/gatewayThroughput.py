@@ -0,0 +1,135 @@
+# Copyright (c) 2019, Bosch Engineering Center Cluj and BFMC organizers
+# All rights reserved.
+
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met:
+
+# 1. Redistributions of source code must retain the above copyright notice, this
+#    list of conditions and the following disclaimer.
+
+# 2. Redistributions in binary form must reproduce the above copyright notice,
+#    this list of conditions and the following disclaimer in the documentation
+#    and/or other materials provided with the distribution.
+
+# 3. Neither the name of the copyright holder nor the names of its
+#    contributors may be used to endorse or promote products derived from
+#    this software without specific prior written permission.
+
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS"
+# AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE
+# IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE
+# DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT HOLDER OR CONTRIBUTORS BE LIABLE
+# FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL
+# DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR
+# SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER
+# CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY,
+# OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE
+# OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE
+
+# Measures the message throughput and the idle CPU usage of the gateway.
+#
+#       python3 benchmarks/gatewayThroughput.py
+#
+# The "polling" row runs the gateway loop used before the event driven dispatch (check every queue each 1 ms and move at most
+# one data message per check), the "event" row runs the current threadGateway.
+
+import sys
+
+sys.path.append(".")
+
+import argparse
+import logging
+import time
+from multiprocessing import Process, Queue, Pipe
+
+from src.gateway.threads.threadGateway import threadGateway
+from src.utils.messages.allMessages import CurrentSpeed
+from src.utils.messages.messageHandlerSender import messageHandlerSender
+from src.utils.messages.messageHandlerSubscriber import messageHandlerSubscriber
+
+
+class pollingGateway(threadGateway):
+    """The gateway loop before the event driven dispatch, kept here as the reference of the benchmark."""
+
+    def __init__(self, queueList, logger, debugging):
+        super(pollingGateway, self).__init__(queueList, logger, debugging)
+        self._pause = 0.001
+
+    def thread_work(self):
+        message = None
+        if not self.queuesList["Critical"].empty():
+            message = self.queuesList["Critical"].get()
+        elif not self.queuesList["Warning"].empty():
+            message = self.queuesList["Warning"].get()
+        elif not self.queuesList["General"].empty():
+            message = self.queuesList["General"].get()
+        if message is not None:
+            self.send(message)
+        if not self.queuesList["Config"].empty():
+            self.configure(self.queuesList["Config"].get())
+
+
+GATEWAYS = {"polling": pollingGateway, "event": threadGateway}
+
+
+def run_gateway(mode, queueList, control):
+    """Runs a gateway thread in its own process and answers the CPU time requests of the benchmark."""
+    gateway = GATEWAYS[mode](queueList, logging.getLogger(), False)
+    gateway.daemon = True
+    gateway.start()
+    while True:
+        command = control.recv()
+        if command == "cpu":
+            control.send(time.process_time())
+        else:
+            gateway.stop()
+            gateway.join(1)
+            break
+
+
+def benchmark(mode, count, idleTime):
+    queueList = {
+        "Critical": Queue(),
+        "Warning": Queue(),
+        "General": Queue(),
+        "Config": Queue(),
+    }
+    control, gatewayControl = Pipe()
+    process = Process(target=run_gateway, args=(mode, queueList, gatewayControl), daemon=True)
+    process.start()
+
+    subscriber = messageHandlerSubscriber(queueList, CurrentSpeed, "fifo", True)
+    sender = messageHandlerSender(queueList, CurrentSpeed)
+    time.sleep(0.5)
+
+    # idle CPU, nothing is sent
+    control.send("cpu")
+    cpuStart = control.recv()
+    time.sleep(idleTime)
+    control.send("cpu")
+    idleCpu = (control.recv() - cpuStart) / idleTime * 100
+
+    # throughput, every message has to reach the subscriber
+    start = time.perf_counter()
+    for value in range(count):
+        sender.send(float(value))
+    for _ in range(count):
+        subscriber.receive_with_block()
+    rate = count / (time.perf_counter() - start)
+
+    control.send("stop")
+    process.join(2)
+    return rate, idleCpu
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Gateway throughput and idle CPU benchmark")
+    parser.add_argument("--count", type=int, default=20000, help="messages sent in the throughput run")
+    parser.add_argument("--idle", type=float, default=3.0, help="seconds measured without traffic")
+    parser.add_argument("--modes", nargs="+", default=list(GATEWAYS), choices=list(GATEWAYS))
+    args = parser.parse_args()
+
+    print("%-10s %14s %12s" % ("gateway", "msgs/s", "idle CPU %"))
+    for mode in args.modes:
+        rate, idleCpu = benchmark(mode, args.count, args.idle)
+        print("%-10s %14.0f %12.1f" % (mode, rate, idleCpu))
@@ -59,9 +59,17 @@ logging.basicConfig(level=logging.INFO)
 # ===================================== PROCESS IMPORTS ==================================
 
 from src.gateway.processGateway import processGateway
+from src.gateway.threads.threadListener import LISTENER_ADDRESS
+from src.gateway.partitions import GATEWAY_PARTITIONS, create_partition_queues
+from src.utils.messages.dropCounters import create_drop_counters
+from src.utils.messages.latencyTracer import enable_latency_tracing
+from src.templates.placement import PROCESS_PLACEMENTS, ModeBudgets, use_placements
+from src.bridge.processBridge import processBridge
+from src.recorder.processRecorder import processRecorder
 from src.dashboard.processDashboard import processDashboard
 from src.hardware.camera.processCamera import processCamera
 from src.hardware.serialhandler.processSerialHandler import processSerialHandler
+from src.hardware.serialhandler.processAsyncSerialHandler import processAsyncSerialHandler
 from src.data.Semaphores.processSemaphores import processSemaphores
 from src.data.TrafficCommunication.processTrafficCommunication import processTrafficCommunication
 from src.utils.messages.messageHandlerSubscriber import messageHandlerSubscriber
@@ -110,13 +118,30 @@ print(BigPrint.PLEASE_WAIT.value)
 allProcesses = list()
 allEvents = list()
 
+# The data queues are bounded, a sender facing a full queue applies the DropPolicy of its topic (see allMessages).
+# The subscriptions are never dropped, so the Config queue stays unbounded.
 queueList = {
-    "Critical": Queue(),
-    "Warning": Queue(),
-    "General": Queue(),
+    "Critical": Queue(maxsize=64),
+    "Warning": Queue(maxsize=256),
+    "General": Queue(maxsize=1024),
     "Config": Queue(),
-    "Log": Queue(),
+    "Log": Queue(maxsize=1024),
 }
+create_drop_counters(queueList)
+# Latency tracing of the messages, every process reports its histograms on LatencyReport and in temp/latency
+traceLatency = False
+if traceLatency:
+    enable_latency_tracing(queueList, dumpDirectory=os.path.join("temp", "latency"))
+# Partitioning of the gateway, see src/gateway/partitions.py: "single", "queue" or "owner"
+gatewayMode = "single"
+gatewayPartitions = GATEWAY_PARTITIONS[gatewayMode]
+create_partition_queues(queueList, gatewayPartitions)
+# Placement of the processes on the cores, see src/templates/placement.py: "inherit", "pinned" or "realtime"
+processPlacement = "inherit"
+use_placements(PROCESS_PLACEMENTS[processPlacement])
+# The budgets of the processes in every mode, re-applied on every StateChange, see "resources" in SystemMode
+modeResources = False
+modeBudgets = ModeBudgets()
 logging = logging.getLogger()
 
 original_stdout = sys.stdout
@@ -131,9 +156,16 @@ sys.stderr = MultiWriter(original_stderr, queue_writer)
 stateChangeSubscriber = messageHandlerSubscriber(queueList, StateChange, "lastOnly", True)
 StateMachine.initialize_shared_state(queueList)
 
-# Initializing gateway
-processGateway = processGateway(queueList, logging)
-processGateway.start()
+# Initializing gateway, one process per partition
+# The tools outside the car's processes attach to the gateway on this socket, e.g. python3 src/gateway/busTop.py.
+# Disabled while None, set it to LISTENER_ADDRESS to attach them.
+gatewayListen = None
+gatewayProcesses = [
+    processGateway(queueList, logging, partition=partition, partitions=gatewayPartitions, listen=gatewayListen)
+    for partition in gatewayPartitions
+]
+for gateway in gatewayProcesses:
+    gateway.start()
 
 # ===================================== INITIALIZE PROCESSES ==================================
 
@@ -154,13 +186,36 @@ traffic_com_ready = Event()
 processTrafficCom = processTrafficCommunication(queueList, logging, 3, traffic_com_ready, debugging = False)
 
 # Initializing serial connection NUCLEO - > PI
+# The async handler does the same work with coroutines on one event loop, compare them with src/hardware/serialhandler/serialBenchmark.py
+serialHandlerAsync = False
 serial_handler_ready = Event()
-processSerialHandler = processSerialHandler(queueList, logging, serial_handler_ready, dashboard_ready, debugging = False)
+if serialHandlerAsync:
+    processSerialHandler = processAsyncSerialHandler(queueList, logging, serial_handler_ready, debugging = False)
+else:
+    processSerialHandler = processSerialHandler(queueList, logging, serial_handler_ready, debugging = False)
 
 # Adding all processes to the list
 allProcesses.extend([processCamera, processSemaphore, processTrafficCom, processSerialHandler, processDashboard])
 allEvents.extend([camera_ready, semaphore_ready, traffic_com_ready, serial_handler_ready, dashboard_ready])
 
+# Initializing the bridge to a bus on another machine, see src/bridge/processBridge.py. Disabled while None, e.g.:
+# bridgeConfig = {"listen": ("0.0.0.0", 5100), "exports": [CurrentSpeed], "imports": [SteerMotor, SpeedMotor],
+#                 "secret": os.environ["BFMC_BRIDGE_SECRET"].encode()}
+bridgeConfig = None
+if bridgeConfig is not None:
+    bridge_ready = Event()
+    processBridgeInstance = processBridge(queueList, logging, ready_event=bridge_ready, **bridgeConfig)
+    allProcesses.append(processBridgeInstance)
+    allEvents.append(bridge_ready)
+
+# Initializing the recorder of the bus, replay its log with src/recorder/replayer.py
+recordBus = False
+if recordBus:
+    recorder_ready = Event()
+    processRecorderInstance = processRecorder(queueList, logging, ready_event=recorder_ready)
+    allProcesses.append(processRecorderInstance)
+    allEvents.append(recorder_ready)
+
 # ------ New component initialize starts here ------#
 
 # ------ New component initialize ends here ------#
@@ -195,6 +250,9 @@ try:
             processSemaphore = manage_process_life(processSemaphores, processSemaphore, [queueList, logging, semaphore_ready, False], modeDictSemaphore["enabled"], allProcesses)
             processTrafficCom = manage_process_life(processTrafficCommunication, processTrafficCom, [queueList, logging, 3, traffic_com_ready, False], modeDictTrafficCom["enabled"], allProcesses)
 
+            if modeResources:
+                modeBudgets.apply(SystemMode[message].value["resources"], allProcesses + gatewayProcesses)
+
         blocker.wait(0.1)
 
 except KeyboardInterrupt:
@@ -202,9 +260,11 @@ except KeyboardInterrupt:
 
     for proc in reversed(allProcesses):
         proc.stop()
-    processGateway.stop()
+    for gateway in gatewayProcesses:
+        gateway.stop()
 
     # wait for all processes to finish before exiting
     for proc in reversed(allProcesses):
         shutdown_process(proc)
-    shutdown_process(processGateway)
+    for gateway in gatewayProcesses:
+        shutdown_process(gateway)
@@ -0,0 +1,137 @@
+# Copyright (c) 2019, Bosch Engineering Center Cluj and BFMC organizers
+# All rights reserved.
+
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met:
+
+# 1. Redistributions of source code must retain the above copyright notice, this
+#    list of conditions and the following disclaimer.
+
+# 2. Redistributions in binary form must reproduce the above copyright notice,
+#    this list of conditions and the following disclaimer in the documentation
+#    and/or other materials provided with the distribution.
+
+# 3. Neither the name of the copyright holder nor the names of its
+#    contributors may be used to endorse or promote products derived from
+#    this software without specific prior written permission.
+
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS"
+# AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE
+# IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE
+# DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT HOLDER OR CONTRIBUTORS BE LIABLE
+# FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL
+# DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR
+# SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER
+# CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY,
+# OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE
+# OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE
+
+if __name__ == "__main__":
+    import sys
+    sys.path.insert(0, "../..")
+
+from src.templates.workerprocess import WorkerProcess
+from src.bridge.threads.threadBridge import threadBridge
+
+
+class processBridge(WorkerProcess):
+    """This process connects the bus to the bus of another machine over TCP.\n
+    Args:
+        queueList (dictionar of multiprocessing.queues.Queue): Dictionar of queues where the ID is the type of messages.
+        logging (logging object): Made for debugging.
+        exports (list): The messages sent to the other machine.
+        imports (list): The messages received from the other machine and sent on this bus.
+        listen (tuple, optional): (host, port) to wait for the other machine on. Defaults to None.
+        connect (tuple, optional): (host, port) of the other machine, which listens. Defaults to None.
+        secret (bytes): The secret both machines are configured with, the other machine has to prove it knows it.
+        debugging (bool, optional): A flag for debugging. Defaults to False.
+
+    One end listens and the other one connects, both ends export and import. Both ends have to run the same allMessages and
+    have the same secret.
+    """
+
+    # ====================================== INIT ==========================================
+    def __init__(self, queueList, logging, exports=(), imports=(), listen=None, connect=None, ready_event=None, debugging=False,
+                 secret=b""):
+        if not secret:
+            raise ValueError("the bridge needs a secret shared with the other machine")
+        self.queuesList = queueList
+        self.logging = logging
+        self.exports = list(exports)
+        self.imports = list(imports)
+        self.listen = listen
+        self.connect = connect
+        self.secret = secret
+        self.debugging = debugging
+        super(processBridge, self).__init__(self.queuesList, ready_event)
+
+    # ===================================== INIT TH ======================================
+    def _init_threads(self):
+        """Create the bridge thread and add to the list of threads."""
+        bridgeTh = threadBridge(
+            self.queuesList, self.logging, self.debugging, self.exports, self.imports, self.listen, self.connect,
+            secret=self.secret
+        )
+        self.threads.append(bridgeTh)
+
+
+# =================================== EXAMPLE =========================================
+#             ++    THIS WILL RUN ONLY IF YOU RUN THE CODE FROM HERE  ++
+#                  in terminal:    python3 processBridge.py
+#
+# Two buses on the same machine, bridged over loopback: CurrentSpeed goes from the first one to the second one and
+# SteerMotor the other way around.
+
+if __name__ == "__main__":
+    from multiprocessing import Queue
+    import logging
+    import os
+    import time
+
+    from src.gateway.processGateway import processGateway
+    from src.utils.messages.allMessages import CurrentSpeed, SteerMotor
+    from src.utils.messages.messageHandlerSender import messageHandlerSender
+    from src.utils.messages.messageHandlerSubscriber import messageHandlerSubscriber
+
+    logger = logging.getLogger()
+    secret = os.urandom(32)
+    buses = []
+    for _ in range(2):
+        buses.append({
+            "Critical": Queue(),
+            "Warning": Queue(),
+            "General": Queue(),
+            "Config": Queue(),
+        })
+
+    gateways = [processGateway(queueList, logger) for queueList in buses]
+    bridges = [
+        processBridge(buses[0], logger, exports=[CurrentSpeed], imports=[SteerMotor], listen=("127.0.0.1", 5100),
+                      secret=secret),
+        processBridge(buses[1], logger, exports=[SteerMotor], imports=[CurrentSpeed], connect=("127.0.0.1", 5100),
+                      secret=secret),
+    ]
+    for process in gateways + bridges:
+        process.start()
+
+    speedSubscriber = messageHandlerSubscriber(buses[1], CurrentSpeed, "fifo", True)
+    steerSubscriber = messageHandlerSubscriber(buses[0], SteerMotor, "fifo", True)
+    time.sleep(2)
+
+    speedSender = messageHandlerSender(buses[0], CurrentSpeed)
+    steerSender = messageHandlerSender(buses[1], SteerMotor)
+    for i in range(5):
+        speedSender.send(float(i))
+        steerSender.send(str(i * 10))
+        time.sleep(0.1)
+    time.sleep(1)
+
+    print("CurrentSpeed on the second bus:", [speedSubscriber.receive() for _ in range(5)])
+    print("SteerMotor on the first bus:", [steerSubscriber.receive() for _ in range(5)])
+
+    # ===================================== STAYING ALIVE ====================================
+
+    for process in bridges + gateways:
+        process.stop()
+    for process in bridges + gateways:
+        process.join(2)
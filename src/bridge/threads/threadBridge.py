@@ -0,0 +1,358 @@
+# Copyright (c) 2019, Bosch Engineering Center Cluj and BFMC organizers
+# All rights reserved.
+
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met:
+
+# 1. Redistributions of source code must retain the above copyright notice, this
+#    list of conditions and the following disclaimer.
+
+# 2. Redistributions in binary form must reproduce the above copyright notice,
+#    this list of conditions and the following disclaimer in the documentation
+#    and/or other materials provided with the distribution.
+
+# 3. Neither the name of the copyright holder nor the names of its
+#    contributors may be used to endorse or promote products derived from
+#    this software without specific prior written permission.
+
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS"
+# AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE
+# IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE
+# DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT HOLDER OR CONTRIBUTORS BE LIABLE
+# FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL
+# DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR
+# SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER
+# CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY,
+# OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE
+# OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE
+
+import hashlib
+import hmac
+import json
+import os
+import selectors
+import socket
+import struct
+import time
+
+from src.templates.threadwithstop import ThreadWithStop
+from src.utils.messages.messageHandlerSender import messageHandlerSender
+from src.utils.messages.messageHandlerSubscriber import messageHandlerSubscriber
+from src.utils.messages.messageSchema import (
+    TOPICS_BY_ID,
+    FRAME_HEADER,
+    FLAG_BLOB,
+    CODEC_PICKLE,
+    CODEC_BYTES,
+    MAX_FRAME_SIZE,
+    topic_of,
+    decode,
+    schema_fingerprint,
+)
+from src.utils.sharedmemory.frameRing import FrameRing, get_frame_ring
+
+# Wire format of a connection, little endian. Both ends start with a hello carrying a random challenge:
+#       magic (4 bytes) | schema fingerprint (uint32) | challenge (16 bytes)
+# and answer the challenge of the other end with an HMAC-SHA256 over the shared secret, which the other end checks:
+#       HMAC(secret, challenge of the other end + own challenge) (32 bytes)
+# A connection with another schema or a wrong answer is closed. Then comes a stream of records, each one a schema frame
+# (see messageSchema), followed by the content of the frame ring slot the frame describes, for the topics carrying frame
+# ring descriptors:
+#       kind (uint8) | frame length (uint32) | data length (uint32) | frame | data
+# The frames never carry pickles or blob references: a value without a codec of its own, like a dict, is sent as a str
+# frame holding its JSON text, with the KIND_JSON bit of the kind.
+_HELLO = struct.Struct("<4sI16s")
+_MAGIC = b"BFMC"
+_ANSWER_SIZE = hashlib.sha256().digest_size
+_RECORD = struct.Struct("<BII")
+KIND_FRAME = 0
+KIND_RING = 1
+KIND_JSON = 2
+
+
+class threadBridge(ThreadWithStop):
+    """Thread which will handle processBridge functionalities.\n
+    Args:
+        queueList (dictionary of multiprocessing.queues.Queue): Dictionary of queues where the ID is the type of messages.
+        logger (logging object): Made for debugging.
+        debugging (bool): A flag for debugging.
+        exports (list): The messages sent to the other end.
+        imports (list): The messages received from the other end and sent on this bus. The exported ones are never imported.
+        listen (tuple, optional): (host, port) to wait for the other end on.
+        connect (tuple, optional): (host, port) to connect to the other end on, again every second until it answers.
+        maxBatch (int, optional): The most bytes gathered from the bus before they are written on the socket. Defaults to 256 KiB.
+        secret (bytes): The secret shared by both ends, a connection which doesn't prove it knows it is refused.
+        maxRingData (int, optional): The longest frame ring slot accepted from the other end. Defaults to 8 MiB.
+
+    Every message read from the bus within one select round goes out in a single write. The frames of the topics carrying
+    frame ring descriptors are sent with the content of their slot, the receiving end writes it into a local ring named
+    "bridge_<ring>" and sends on its bus the descriptor of its own copy.
+
+    The frames of the other end are only decoded for the imported topics and the codecs of the plain types: a frame with a
+    pickle, a blob reference or a length beyond the limits closes the connection.
+    """
+
+    # ===================================== INIT =========================================
+    def __init__(self, queueList, logger, debugging, exports, imports, listen=None, connect=None, maxBatch=256 * 1024, secret=b"",
+                 maxRingData=8 * 1024 * 1024):
+        super(threadBridge, self).__init__(pause=0)
+        self.queuesList = queueList
+        self.logger = logger
+        self.debugging = debugging
+        self.listen = listen
+        self.connect = connect
+        self.maxBatch = maxBatch
+        self.maxRingData = maxRingData
+        if not secret:
+            raise ValueError("the bridge needs a secret shared with the other end")
+        self._secret = secret
+        self.exportTopics = [topic_of(message) for message in exports]
+        self.importNames = {message.__name__ for message in imports} - {topic.name for topic in self.exportTopics}
+        self.importIds = {topic.topicId for topic in TOPICS_BY_ID.values() if topic.name in self.importNames}
+        self.importSenders = {}
+        self.importRings = {}
+        self._buffer = bytearray()
+        self._peer = None
+        self._nextConnect = 0.0
+        self._fingerprint = schema_fingerprint()
+        self.sent = 0
+        self.received = 0
+
+        self._selector = selectors.DefaultSelector()
+        self.subscribe(exports)
+        self._listener = None
+        if listen is not None:
+            self._listener = socket.create_server(listen, reuse_port=False)
+            self._listener.setblocking(False)
+            self._selector.register(self._listener, selectors.EVENT_READ, "listener")
+
+    def subscribe(self, exports):
+        """Subscribes to the exported messages, at most 64 of them wait unread in the gateway per message."""
+        for message, topic in zip(exports, self.exportTopics):
+            subscriber = messageHandlerSubscriber(self.queuesList, message, "fifo", True, depth=64)
+            self._selector.register(subscriber, selectors.EVENT_READ, (subscriber, topic))
+
+    # ===================================== RUN ==========================================
+    def thread_work(self):
+        if self._peer is None and self.connect is not None and time.monotonic() >= self._nextConnect:
+            self._open(self.connect)
+
+        records = []
+        size = 0
+        for key, _ in self._selector.select(0.1):
+            if key.data == "listener":
+                self._accept()
+            elif key.data == "peer":
+                self._receive()
+            else:
+                subscriber, topic = key.data
+                while size < self.maxBatch:
+                    value = subscriber.receive()
+                    if value is None:
+                        break
+                    record = self._record(topic, value)
+                    if record is not None:
+                        records.append(record)
+                        size += len(record)
+
+        # without the other end the exported messages are read and dropped, so they don't pile up in the gateway
+        if records and self._peer is not None:
+            try:
+                self._peer.sendall(b"".join(records))
+                self.sent += len(records)
+            except OSError as e:
+                self._close_peer(e)
+
+    def _record(self, topic, value):
+        """Encodes an exported message, with the content of its frame ring slot if it has one."""
+        if isinstance(value, dict) and "ring" in value and "slot" in value:
+            try:
+                data = get_frame_ring(value).read(value)
+            except FileNotFoundError:
+                data = None
+            if data is None:
+                # the slot was overwritten before the bridge read it
+                return None
+            kind, frame = self._encode(topic, value)
+            if frame is None:
+                return None
+            return _RECORD.pack(kind | KIND_RING, len(frame), len(data)) + frame + data
+        kind, frame = self._encode(topic, value)
+        if frame is None:
+            return None
+        return _RECORD.pack(kind, len(frame), 0) + frame
+
+    def _encode(self, topic, value):
+        """Encodes a value into a frame without a pickle, returns the kind bits and the frame, None if it can't be sent."""
+        frame = topic.encode(value)
+        kind = KIND_FRAME
+        if FRAME_HEADER.unpack_from(frame)[1] == CODEC_PICKLE:
+            try:
+                frame = topic.encode(json.dumps(value))
+            except (TypeError, ValueError):
+                print(f"\033[1;97m[ Bridge ] :\033[0m \033[1;93mWARNING\033[0m - {topic.name}: {type(value).__name__} value not exported, it has no JSON form")
+                return kind, None
+            kind = KIND_JSON
+        if len(frame) > MAX_FRAME_SIZE:
+            print(f"\033[1;97m[ Bridge ] :\033[0m \033[1;93mWARNING\033[0m - {topic.name}: {len(frame)} bytes frame not exported, longer than {MAX_FRAME_SIZE}")
+            return kind, None
+        return kind, frame
+
+    def _receive(self):
+        """Reads from the other end and sends the complete records on the bus."""
+        try:
+            chunk = self._peer.recv(1 << 16) # type: ignore
+        except BlockingIOError:
+            return
+        except OSError as e:
+            self._close_peer(e)
+            return
+        if not chunk:
+            self._close_peer("closed by the other end")
+            return
+        self._buffer += chunk
+
+        offset = 0
+        while len(self._buffer) - offset >= _RECORD.size:
+            kind, frameLength, dataLength = _RECORD.unpack_from(self._buffer, offset)
+            if kind > (KIND_RING | KIND_JSON) or not FRAME_HEADER.size <= frameLength <= MAX_FRAME_SIZE or dataLength > self.maxRingData \
+                    or (dataLength and not kind & KIND_RING):
+                self._close_peer("invalid record from the other end")
+                return
+            end = offset + _RECORD.size + frameLength + dataLength
+            if len(self._buffer) < end:
+                break
+            start = offset + _RECORD.size
+            frame = bytes(self._buffer[start:start + frameLength])
+            data = memoryview(self._buffer)[start + frameLength:end] if kind & KIND_RING else None
+            try:
+                accepted = self._import(kind, frame, data)
+            finally:
+                if data is not None:
+                    data.release()
+            if not accepted:
+                self._close_peer("invalid frame from the other end")
+                return
+            offset = end
+        del self._buffer[:offset]
+
+    def _import(self, kind, frame, data):
+        """Sends a frame of the other end on the bus, if its topic is imported. Returns False for a frame breaking the
+        wire format, which is never decoded."""
+        topicId, codec, flags = FRAME_HEADER.unpack_from(frame)
+        if codec == CODEC_PICKLE or codec > CODEC_BYTES or flags & FLAG_BLOB:
+            return False
+        if topicId not in self.importIds:
+            # checked before decoding, the other end may only send the imported topics
+            return topicId in TOPICS_BY_ID
+        try:
+            topic, value = decode(frame)
+            if kind & KIND_JSON:
+                value = json.loads(value)
+        except (ValueError, TypeError, UnicodeDecodeError, struct.error):
+            return False
+        if data is not None:
+            if not (isinstance(value, dict) and isinstance(value.get("ring"), str)):
+                return False
+            value = self._import_ring_frame(value, data)
+        sender = self.importSenders.get(topic.topicId)
+        if sender is None:
+            sender = messageHandlerSender(self.queuesList, topic.message)
+            self.importSenders[topic.topicId] = sender
+        sender.send(value)
+        self.received += 1
+        return True
+
+    def _import_ring_frame(self, descriptor, data):
+        """Copies a frame of the other end into the local ring and returns the descriptor of the copy."""
+        # the name comes from the other end, only the characters of the local ring names are kept
+        name = "".join(character for character in descriptor["ring"] if character.isalnum() or character in "_-")[:64]
+        ring = self.importRings.get(name)
+        if ring is None or ring.slotSize < len(data):
+            if ring is not None:
+                ring.close()
+            ring = FrameRing.create("bridge_" + name, len(data) * 3 // 2, 4)
+            self.importRings[name] = ring
+        local = ring.write(data)
+        if "shape" in descriptor and "dtype" in descriptor:
+            local["shape"] = descriptor["shape"]
+            local["dtype"] = descriptor["dtype"]
+        return local
+
+    # =================================== CONNECTION =====================================
+    def _open(self, address):
+        self._nextConnect = time.monotonic() + 1
+        try:
+            peer = socket.create_connection(address, timeout=1)
+        except OSError:
+            return
+        self._start_peer(peer, address)
+
+    def _accept(self):
+        try:
+            peer, address = self._listener.accept() # type: ignore
+        except BlockingIOError:
+            return
+        if self._peer is not None:
+            self._close_peer("replaced by a new connection")
+        self._start_peer(peer, address)
+
+    def _start_peer(self, peer, address):
+        """Exchanges the hellos with the other end, checks its answer to the challenge and starts using the connection if
+        the schemas match."""
+        challenge = os.urandom(16)
+        try:
+            peer.settimeout(2)
+            peer.sendall(_HELLO.pack(_MAGIC, self._fingerprint, challenge))
+            magic, fingerprint, peerChallenge = _HELLO.unpack(self._recv_exactly(peer, _HELLO.size))
+            if magic != _MAGIC or fingerprint != self._fingerprint:
+                print(f"\033[1;97m[ Bridge ] :\033[0m \033[1;91mERROR\033[0m - {address} runs a different version of allMessages, connection refused")
+                peer.close()
+                return
+            if peerChallenge == challenge:
+                raise ConnectionError("challenge sent back")
+            peer.sendall(hmac.new(self._secret, peerChallenge + challenge, hashlib.sha256).digest())
+            answer = self._recv_exactly(peer, _ANSWER_SIZE)
+        except OSError as e:
+            print(f"\033[1;97m[ Bridge ] :\033[0m \033[1;93mWARNING\033[0m - Connection with {address} failed ({e})")
+            peer.close()
+            return
+        if not hmac.compare_digest(answer, hmac.new(self._secret, challenge + peerChallenge, hashlib.sha256).digest()):
+            print(f"\033[1;97m[ Bridge ] :\033[0m \033[1;91mERROR\033[0m - {address} doesn't know the secret of the bridge, connection refused")
+            peer.close()
+            return
+
+        peer.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        # the writes block for at most 2 s, a slower other end is disconnected
+        peer.settimeout(2)
+        self._peer = peer
+        self._buffer.clear()
+        self._selector.register(peer, selectors.EVENT_READ, "peer")
+        print(f"\033[1;97m[ Bridge ] :\033[0m \033[1;92mINFO\033[0m - Connected to \033[94m{address}\033[0m")
+
+    def _recv_exactly(self, peer, size):
+        data = b""
+        while len(data) < size:
+            chunk = peer.recv(size - len(data))
+            if not chunk:
+                raise ConnectionError("closed during the hello")
+            data += chunk
+        return data
+
+    def _close_peer(self, reason):
+        print(f"\033[1;97m[ Bridge ] :\033[0m \033[1;93mWARNING\033[0m - Connection lost ({reason})")
+        self._selector.unregister(self._peer)
+        self._peer.close() # type: ignore
+        self._peer = None
+        self._nextConnect = time.monotonic() + 1
+
+    # ===================================== STOP =========================================
+    def run(self):
+        super(threadBridge, self).run()
+        if self._peer is not None:
+            self._peer.close()
+        if self._listener is not None:
+            self._listener.close()
+        self._selector.close()
+        for ring in self.importRings.values():
+            ring.close()
@@ -31,10 +31,12 @@ if __name__ == "__main__":
     sys.path.insert(0, "../../..")
 
 import queue
+import base64
 import psutil
 import json
 import inspect
 import eventlet
+from eventlet.green import select as green_select
 import os
 import time
 
@@ -45,6 +47,8 @@ from enum import Enum
 
 from src.utils.messages.messageHandlerSubscriber import messageHandlerSubscriber
 from src.utils.messages.messageHandlerSender import messageHandlerSender
+from src.utils.messages.messageInbox import messageInbox
+from src.utils.messages.subscriberGroup import SubscriberGroup
 from src.templates.workerprocess import WorkerProcess
 from src.utils.messages.allMessages import Semaphores
 from src.statemachine.stateMachine import StateMachine
@@ -52,6 +56,8 @@ from src.dashboard.components.calibration import Calibration
 from src.dashboard.components.wifi import WifiManager
 from src.dashboard.components.updates import UpdateManager
 from src.dashboard.components.firmware import FirmwareManager
+from src.utils.sharedmemory.frameRing import get_frame_ring
+from src.utils.messages.dropCounters import read_drops
 
 import src.utils.messages.allMessages as allMessages
 
@@ -64,6 +70,12 @@ class processDashboard(WorkerProcess):
         logging (logging object): Made for debugging.
         debugging (bool): Enable debugging mode.
     """
+
+    # the most messages per second the gateway delivers to the dashboard, for the topics faster than the UI needs
+    maxRates = {
+        "ImuData": 10,
+    }
+
     # ====================================== INIT ==========================================
     def __init__(self, queueList, logging, ready_event=None, debugging = False):
 
@@ -192,6 +204,11 @@ class processDashboard(WorkerProcess):
         def api_serial_status():
             return jsonify({'success': True, 'connected': self.serialConnected})
         
+        # Messages dropped by the senders on full queues, per topic
+        @self.app.route('/api/bus/drops', methods=['GET'])
+        def api_bus_drops():
+            return jsonify({'success': True, 'drops': read_drops(self.queueList)})
+        
         # Codebase Update Management
         @self.app.route('/api/update/check', methods=['GET'])
         def api_check_updates():
@@ -257,6 +274,7 @@ class processDashboard(WorkerProcess):
     # ===================================== RUN ==========================================
     def run(self):
         """Apply the initializing method."""
+        self._place()
         if self.ready_event:
             self.ready_event.set()
 
@@ -264,17 +282,27 @@ class processDashboard(WorkerProcess):
 
 
     def subscribe(self):
-        """Subscribe function. In this function we make all the required subscribe to process gateway."""
+        """Subscribe function. In this function we make all the required subscribe to process gateway.
+        The subscribers share one inbox instead of a pipe each, created here since the dashboard subscribes before it forks."""
+        self.inbox = messageInbox(self.queueList)
         for name, enum in self.messagesAndVals.items():
             if enum["owner"] != "Dashboard":
-                subscriber = messageHandlerSubscriber(self.queueList, enum["enum"], "lastOnly", True)
+                subscriber = messageHandlerSubscriber(
+                    self.queueList, enum["enum"], "lastOnly", True, maxRate=self.maxRates.get(name), inbox=self.inbox
+                )
                 self.messages[name] = {"obj": subscriber}
             else:
                 sender = messageHandlerSender(self.queueList, enum["enum"])
                 self.sendMessages[str(name)] = {"obj": sender}
 
-        subscriber = messageHandlerSubscriber(self.queueList, Semaphores, "fifo", True)
+        subscriber = messageHandlerSubscriber(self.queueList, Semaphores, "fifo", True, inbox=self.inbox)
         self.messages["Semaphores"] = {"obj": subscriber}
+        # the green select only blocks the greenlet waiting on the subscribers, not the whole eventlet hub
+        self.subscriberGroup = SubscriberGroup(
+            [subscriber["obj"] for subscriber in self.messages.values()],
+            waiter=lambda fds, timeout: green_select.select(fds, [], [], timeout)[0],
+        )
+        self.subscriberNames = {subscriber["obj"]: name for name, subscriber in self.messages.items()}
 
 
     def get_name_and_vals(self):
@@ -439,21 +467,35 @@ class processDashboard(WorkerProcess):
 
 
     def send_continuous_messages(self):
-        """Process and send subscriber messages to the frontend."""
-        if not self.running:
-            return
-
-        for msg, subscriber in self.messages.items():
-            resp = subscriber["obj"].receive()
-            if resp is not None:
-                if msg == "SerialConnectionState":
-                    self.serialConnected = resp
-
-                self.socketio.emit(msg, {"value": resp})
-                if self.debugging:
-                    self.logger.info(f"{msg}: {resp}")
-
-        eventlet.spawn_after(0.1, self.send_continuous_messages)
+        """Process and send subscriber messages to the frontend, as soon as they arrive."""
+        while self.running:
+            for subscriber in self.subscriberGroup.wait(1.0):
+                msg = self.subscriberNames[subscriber]
+                resp = subscriber.receive()
+                if resp is not None:
+                    if msg == "SerialConnectionState":
+                        self.serialConnected = resp
+                    elif msg == "serialCamera":
+                        resp = self.read_camera_frame(resp)
+                        if resp is None:
+                            continue
+
+                    self.socketio.emit(msg, {"value": resp})
+                    if self.debugging:
+                        self.logger.info(f"{msg}: {resp}")
+            # lets the other greenlets run between two bursts of messages
+            eventlet.sleep(0)
+
+
+    def read_camera_frame(self, descriptor):
+        """Read the JPEG frame of a descriptor from its frame ring and encode it for the frontend."""
+        try:
+            frame = get_frame_ring(descriptor).read(descriptor)
+        except FileNotFoundError:
+            return None
+        if frame is None:
+            return None
+        return base64.b64encode(frame).decode("utf-8")
 
 
     def send_hardware_data_to_frontend(self):
@@ -0,0 +1,176 @@
+# Copyright (c) 2019, Bosch Engineering Center Cluj and BFMC organizers
+# All rights reserved.
+
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met:
+
+# 1. Redistributions of source code must retain the above copyright notice, this
+#    list of conditions and the following disclaimer.
+
+# 2. Redistributions in binary form must reproduce the above copyright notice,
+#    this list of conditions and the following disclaimer in the documentation
+#    and/or other materials provided with the distribution.
+
+# 3. Neither the name of the copyright holder nor the names of its
+#    contributors may be used to endorse or promote products derived from
+#    this software without specific prior written permission.
+
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS"
+# AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE
+# IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE
+# DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT HOLDER OR CONTRIBUTORS BE LIABLE
+# FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL
+# DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR
+# SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER
+# CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY,
+# OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE
+# OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE
+if __name__ == "__main__":
+    import sys
+    sys.path.insert(0, "../..")
+
+import os
+import time
+from multiprocessing.connection import Client, wait
+
+from src.gateway.threads.threadListener import LISTENER_ADDRESS, read_listener_key
+from src.utils.messages.messageSchema import TOPICS_BY_ID, frame_topic_id, payload_size, schema_fingerprint
+
+
+class BusTop:
+    """A passive view of the bus of a running car: the rate, the volume and the subscribers of every topic of allMessages.\n
+    Args:
+        address (str, optional): The Unix socket the gateway listens on, see threadListener. Defaults to LISTENER_ADDRESS.
+        authkey (bytes, optional): The key of the listener. Defaults to None, read from the key file of the listener.
+
+    It attaches to the gateway as a tap on every partition, with one more connection the senders of the direct topics write
+    into, and only reads the headers of the frames: the tap doesn't read the shared memory blobs, so the gateway doesn't hold
+    them for it. The gateway writes into the tap like into any slow subscriber, without ever waiting for it, and a tap that
+    stops reading is evicted. The number of subscribers of every topic is asked from every partition with "describe".
+    The first message of a latched topic is the last one, which the gateway replays to the tap when it attaches.
+    """
+
+    def __init__(self, address=LISTENER_ADDRESS, authkey=None):
+        self.address = address
+        self.authkey = authkey if authkey is not None else read_listener_key(address)
+        self.receiver = "busTop:%d" % os.getpid()
+        self.hello = None
+        # {topic ID: [messages, payload bytes, monotonic time of the last message]}
+        self.stats = {topicId: [0, 0, None] for topicId in TOPICS_BY_ID}
+        self._direct = self._request({"Subscribe/Unsubscribe": "hold", "To": {"receiver": self.receiver}})
+        if self.hello["fingerprint"] != schema_fingerprint(): # type: ignore
+            print(f"\033[1;97m[ BusTop ] :\033[0m \033[1;93mWARNING\033[0m - The car runs another allMessages, the topics may not match")
+        self._taps = [
+            self._request(
+                {
+                    "Subscribe/Unsubscribe": "tap",
+                    "Queue": name,
+                    "To": {"receiver": self.receiver, "pipe": "connection", "direct": "held", "payloads": False},
+                }
+            )
+            for name in self.hello["configQueues"] # type: ignore
+        ]
+        self._connections = self._taps + [self._direct]
+
+    def _request(self, message):
+        """Opens a connection to the listener and sends it a config message, see threadListener."""
+        connection = Client(self.address, "AF_UNIX", authkey=self.authkey)
+        self.hello = connection.recv()
+        connection.send(message)
+        return connection
+
+    def receive(self, timeout):
+        """Counts the frames arriving within timeout seconds. Raises EOFError once the gateway is gone."""
+        deadline = time.monotonic() + timeout
+        remaining = timeout
+        while remaining > 0:
+            for connection in wait(self._connections, remaining):
+                while connection.poll():
+                    frame = connection.recv_bytes()
+                    entry = self.stats.get(frame_topic_id(frame))
+                    if entry is not None:
+                        entry[0] += 1
+                        entry[1] += payload_size(frame)
+                        entry[2] = time.monotonic()
+            remaining = deadline - time.monotonic()
+
+    def subscribers(self):
+        """Returns the number of subscribers of every topic, {topic ID: count}, asked from every partition."""
+        counts = {}
+        for name in self.hello["configQueues"]: # type: ignore
+            connection = self._request({"Subscribe/Unsubscribe": "describe", "Queue": name, "To": {"pipe": "connection"}})
+            try:
+                if connection.poll(1):
+                    counts.update(connection.recv())
+            except EOFError:
+                pass
+            finally:
+                connection.close()
+        return counts
+
+    def close(self):
+        """Closes the connections, the listener then takes the taps back."""
+        for connection in self._connections:
+            connection.close()
+
+
+def render(stats, previous, elapsed, subscribers, now):
+    """Returns the table of the topics, the rates are those since the previous table."""
+    lines = ["%-28s %10s %12s %10s %6s %10s" % ("topic", "msg/s", "bytes/s", "avg size", "subs", "last")]
+    totalRate = totalVolume = 0.0
+    for topicId, topic in TOPICS_BY_ID.items():
+        count, volume, last = stats[topicId]
+        rate = (count - previous[topicId][0]) / elapsed
+        volumeRate = (volume - previous[topicId][1]) / elapsed
+        totalRate += rate
+        totalVolume += volumeRate
+        lines.append("%-28s %10.1f %12.0f %10s %6d %10s" % (
+            topic.name[:28],
+            rate,
+            volumeRate,
+            "%.0f" % (volume / count) if count else "-",
+            subscribers.get(topicId, 0),
+            "%.2f s" % (now - last) if last is not None else "-",
+        ))
+    lines.append("%-28s %10.1f %12.0f" % ("total", totalRate, totalVolume))
+    return "\n".join(lines)
+
+
+# =================================== EXAMPLE =========================================
+#             ++    THIS WILL RUN ONLY IF YOU RUN THE CODE Owner HERE  ++
+#                  in terminal:    python3 busTop.py       (with main.py running)
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Shows the live rates, sizes and subscribers of the topics of a running car.")
+    parser.add_argument("--address", default=LISTENER_ADDRESS, help="the socket the gateway listens on")
+    parser.add_argument("--interval", type=float, default=1.0, help="seconds between two refreshes of the table")
+    parser.add_argument("--iterations", type=int, default=0, help="number of refreshes before exiting, 0 runs until Ctrl+C")
+    parser.add_argument("--plain", action="store_true", help="prints the tables one after the other instead of refreshing the screen")
+    arguments = parser.parse_args()
+
+    try:
+        top = BusTop(arguments.address)
+    except (OSError, EOFError) as e:
+        print(f"\033[1;97m[ BusTop ] :\033[0m \033[1;91mERROR\033[0m - Cannot attach to the gateway on {arguments.address} ({e})")
+        sys.exit(1)
+
+    iteration = 0
+    try:
+        start = time.monotonic()
+        previous = {topicId: list(entry) for topicId, entry in top.stats.items()}
+        while arguments.iterations == 0 or iteration < arguments.iterations:
+            top.receive(arguments.interval)
+            now = time.monotonic()
+            table = render(top.stats, previous, now - start, top.subscribers(), now)
+            print(table if arguments.plain else "\033[H\033[2J" + table, flush=True)
+            start = now
+            previous = {topicId: list(entry) for topicId, entry in top.stats.items()}
+            iteration += 1
+    except KeyboardInterrupt:
+        pass
+    except EOFError:
+        print(f"\033[1;97m[ BusTop ] :\033[0m \033[1;93mWARNING\033[0m - The gateway stopped")
+    finally:
+        top.close()
@@ -0,0 +1,71 @@
+# Copyright (c) 2019, Bosch Engineering Center Cluj and BFMC organizers
+# All rights reserved.
+
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met:
+
+# 1. Redistributions of source code must retain the above copyright notice, this
+#    list of conditions and the following disclaimer.
+
+# 2. Redistributions in binary form must reproduce the above copyright notice,
+#    this list of conditions and the following disclaimer in the documentation
+#    and/or other materials provided with the distribution.
+
+# 3. Neither the name of the copyright holder nor the names of its
+#    contributors may be used to endorse or promote products derived from
+#    this software without specific prior written permission.
+
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS"
+# AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE
+# IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE
+# DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT HOLDER OR CONTRIBUTORS BE LIABLE
+# FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL
+# DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR
+# SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER
+# CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY,
+# OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE
+# OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE
+
+from multiprocessing import Queue
+
+# Partitioning modes of the gateway. Every partition is served by its own processGateway, with its own thread and GIL.
+# A partition lists the data queues its gateway serves: a queue class ("Critical", "Warning", "General") or "Queue:Owner",
+# a queue dedicated to the topics of one owner, which their senders use instead of the queue declared in allMessages.
+# The "main" partition serves the "Config" queue and forwards the subscriptions of the other partitions to them.
+GATEWAY_PARTITIONS = {
+    "single": {
+        "main": ["Critical", "Warning", "General"],
+    },
+    "queue": {
+        "main": ["General"],
+        "control": ["Critical", "Warning"],
+    },
+    "owner": {
+        "main": ["Critical", "Warning", "General"],
+        "camera": ["General:threadCamera"],
+    },
+}
+
+
+def config_queue_name(partition):
+    """Returns the name of the config queue of a partition."""
+    return "Config" if partition == "main" else "Config:" + partition
+
+
+def create_partition_queues(queueList, partitions):
+    """Adds to the queue list the dedicated data queues and the config queues of the partitions.
+    A "Queue:Owner" queue gets the size of its queue class. Must be called before creating any sender, subscriber or process.
+
+    Args:
+        queueList (dictionary of multiprocessing.queues.Queue): Dictionary of queues where the ID is the type of messages.
+        partitions (dict): One of the GATEWAY_PARTITIONS modes.
+    """
+    for partition, queues in partitions.items():
+        for name in queues + [config_queue_name(partition)]:
+            if name not in queueList:
+                queueList[name] = Queue(queueList[name.split(":")[0]]._maxsize)
+
+
+def config_forwards(partitions):
+    """Returns, for every data queue outside the main partition, the config queue of the partition serving it."""
+    return {name: config_queue_name(partition) for partition, queues in partitions.items() if partition != "main" for name in queues}
@@ -32,6 +32,8 @@ if __name__ == "__main__":
 
 from src.templates.workerprocess import WorkerProcess
 from src.gateway.threads.threadGateway import threadGateway
+from src.gateway.threads.threadListener import threadListener
+from src.gateway.partitions import GATEWAY_PARTITIONS, config_queue_name, config_forwards
 
 
 class processGateway(WorkerProcess):
@@ -40,19 +42,39 @@ class processGateway(WorkerProcess):
         queueList (dictionar of multiprocessing.queues.Queue): Dictionar of queues where the ID is the type of messages.
         logger (logging object): Made for debugging.
         debugging (bool, optional): A flag for debugging. Defaults to False.
+        partition (string, optional): The partition served by this process. Defaults to "main".
+        partitions (dict, optional): The partitioning mode, one of GATEWAY_PARTITIONS. Defaults to a single gateway.
+        listen (str, optional): The Unix socket the tools outside the car's processes attach on, e.g. busTop, see
+            threadListener. Only the "main" partition listens. Defaults to None, no tool can attach.
+
+    A partitioned bus runs one processGateway per partition, the queues of every partition are created beforehand with
+    create_partition_queues.
     """
 
-    def __init__(self, queueList, logger, ready_event=None, debugging=False):
+    def __init__(self, queueList, logger, ready_event=None, debugging=False, partition="main", partitions=None, listen=None):
         self.logger = logger
         self.debugging = debugging
+        self.partition = partition
+        self.partitions = partitions if partitions is not None else GATEWAY_PARTITIONS["single"]
+        self.listen = listen
         super(processGateway, self).__init__(queueList, ready_event)
 
     # ===================================== INIT TH ==========================================
     def _init_threads(self):
         """Initializes the gateway thread."""
         
-        gatewayThread = threadGateway(self.queuesList, self.logger, self.debugging)
+        forwards = config_forwards(self.partitions) if self.partition == "main" else None
+        gatewayThread = threadGateway(
+            self.queuesList,
+            self.logger,
+            self.debugging,
+            queues=self.partitions[self.partition],
+            configQueue=config_queue_name(self.partition),
+            forwards=forwards,
+        )
         self.threads.append(gatewayThread)
+        if self.listen is not None and self.partition == "main":
+            self.threads.append(threadListener(self.queuesList, self.logger, self.debugging, address=self.listen))
 
 
 # =================================== EXAMPLE =========================================
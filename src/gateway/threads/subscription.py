@@ -0,0 +1,361 @@
+# Copyright (c) 2019, Bosch Engineering Center Cluj and BFMC organizers
+# All rights reserved.
+
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met:
+
+# 1. Redistributions of source code must retain the above copyright notice, this
+#    list of conditions and the following disclaimer.
+
+# 2. Redistributions in binary form must reproduce the above copyright notice,
+#    this list of conditions and the following disclaimer in the documentation
+#    and/or other materials provided with the distribution.
+
+# 3. Neither the name of the copyright holder nor the names of its
+#    contributors may be used to endorse or promote products derived from
+#    this software without specific prior written permission.
+
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS"
+# AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE
+# IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE
+# DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT HOLDER OR CONTRIBUTORS BE LIABLE
+# FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL
+# DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR
+# SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER
+# CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY,
+# OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE
+# OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE
+
+import os
+import select
+import struct
+from collections import deque
+
+from src.utils.messages.messageSchema import FLAG_TRACED, TRACE_OUT_OFFSET, FRAME_HEADER, MARK_NEWER, MARK_SYNCED, ACK_SYNC
+
+# the length prefix written by multiprocessing.connection before every message, so the receiver reads it with recv_bytes
+_LENGTH = struct.Struct("!i")
+# the token of the subscriber put before every message of an inbox, see messageInbox
+_TOKEN = struct.Struct("<I")
+_STAMP = struct.Struct("<d")
+
+
+class Channel:
+    """The pipe the gateway writes into: the pipe of one subscription, or the inbox of a process, shared by all the
+    subscriptions of the process. Every message of an inbox starts with the token of its subscriber, which the process uses
+    to demultiplex them, and the acknowledgements read on the ack pipe of an inbox are (token, count) pairs.
+
+    The pipe is non-blocking: what doesn't fit in it waits in the outbox of the channel, which the gateway drains when
+    the pipe becomes writable, so a receiver that stops reading never blocks the gateway. Past maxBacklog bytes the outbox
+    is conflated to the latest message of every subscription, and the gateway evicts the subscriptions of a channel whose
+    outbox stays stalled for too long.
+
+    The pipe of a subscriber of a direct topic is shared: the senders of the topic write into it too, see
+    messageHandlerSender. Its messages are only ever written whole, in a single write no longer than PIPE_BUF, which a
+    pipe takes entirely or not at all, so the writes of the gateway and of the senders never interleave. Such a channel has
+    no outbox, what doesn't fit in the pipe is dropped, like the senders do.
+
+    Args:
+        pipe (multiprocessing.connection.Connection): The pipe the messages are written into.
+        maxBacklog (int, optional): The most bytes kept in the outbox before it is conflated. Defaults to 1 MiB.
+        inbox (str, optional): The name of the inbox, None for the pipe of a single subscription.
+        shared (bool, optional): True for the pipe of a subscriber of a direct topic, also written by its senders. Defaults to False.
+    """
+
+    def __init__(self, pipe, maxBacklog=1 << 20, inbox=None, shared=False):
+        self.pipe = pipe
+        self.inbox = inbox
+        self.shared = shared
+        # the pipe the receivers acknowledge the read messages on, registered by the gateway
+        self.ack = None
+        # {token: Subscription}, the subscription of a single pipe has the token None
+        self.subscriptions = {}
+        self.closed = False
+        # called with every message dropped or left unwritten, which the receiver will never read
+        self.onDrop = None
+
+        self._fd = pipe.fileno()
+        os.set_blocking(self._fd, False)
+        # messages not written yet, (token, message with its length prefix), the first one may be written in part
+        self.outbox = deque()
+        self.outboxOffset = 0
+        self.backlog = 0
+        self.maxBacklog = maxBacklog
+        # the time the outbox stopped being empty, None while it is empty
+        self.stalledSince = None
+
+    def write(self, token, payload, now, framed=False):
+        """Writes a message into the pipe, or into the outbox behind the messages already waiting there. A frame traced for
+        latency gets the time it left the gateway, now, written into it on the way. A pipe whose reading end is gone raises
+        BrokenPipeError."""
+        if framed and payload[3] & FLAG_TRACED:
+            payload = memoryview(payload)
+            body = (payload[:TRACE_OUT_OFFSET], _STAMP.pack(now), payload[TRACE_OUT_OFFSET + _STAMP.size:])
+        else:
+            body = (payload,)
+        if token is None:
+            parts = (_LENGTH.pack(len(payload)),) + body
+        else:
+            parts = (_LENGTH.pack(_TOKEN.size + len(payload)), _TOKEN.pack(token)) + body
+        size = sum(map(len, parts))
+        if self.shared:
+            self._write_whole(token, parts, size)
+            return
+        if self.outbox:
+            written = 0
+        else:
+            try:
+                written = os.writev(self._fd, parts)
+            except BlockingIOError:
+                written = 0
+            if written == size:
+                return
+            self.outboxOffset = written
+            self.stalledSince = now
+        self.outbox.append((token, b"".join(parts)))
+        self.backlog += size - written
+        if self.backlog > self.maxBacklog:
+            self._conflate()
+
+    def _write_whole(self, token, parts, size):
+        """Writes a message into a shared pipe in a single write, or drops it."""
+        if size <= select.PIPE_BUF:
+            try:
+                os.writev(self._fd, parts)
+                return
+            except BlockingIOError:
+                pass
+        self._drop((token, b"".join(parts)))
+
+    def _conflate(self):
+        """Keeps only the latest message of every subscription in the outbox, the marks, and the one being written, so the
+        stream stays whole."""
+        head = self.outbox.popleft() if self.outboxOffset else None
+        kept = set()
+        keep = deque()
+        for entry in reversed(self.outbox):
+            if self._is_mark(entry):
+                keep.appendleft(entry)
+            elif entry[0] in kept:
+                self._drop(entry)
+            else:
+                kept.add(entry[0])
+                keep.appendleft(entry)
+        if head is not None:
+            keep.appendleft(head)
+        self.outbox = keep
+        self.backlog = sum(len(chunk) for _, chunk in keep) - self.outboxOffset
+
+    def _drop(self, entry):
+        """Counts a message which will never be written."""
+        token, chunk = entry
+        subscription = self.subscriptions.get(token)
+        if subscription is not None:
+            subscription.dropped += 1
+            if subscription.managed:
+                # the dropped message will never be acknowledged
+                subscription.inFlight = max(0, subscription.inFlight - 1)
+        self._drop_unwritten(entry)
+
+    def _payload(self, entry):
+        token, chunk = entry
+        return memoryview(chunk)[_LENGTH.size if token is None else _LENGTH.size + _TOKEN.size:]
+
+    def _is_mark(self, entry):
+        return len(self._payload(entry)) < FRAME_HEADER.size
+
+    def _drop_unwritten(self, entry):
+        """Hands a message of the outbox which will never be written to onDrop, the marks carry nothing to release."""
+        if self.onDrop is not None and not self._is_mark(entry):
+            self.onDrop(self._payload(entry))
+
+    def drain(self):
+        """Writes the outbox into the pipe until the pipe is full.
+
+        Returns:
+            bool: True if the outbox is empty.
+        """
+        while self.outbox:
+            chunk = self.outbox[0][1]
+            try:
+                written = os.write(self._fd, memoryview(chunk)[self.outboxOffset:])
+            except BlockingIOError:
+                return False
+            self.backlog -= written
+            self.outboxOffset += written
+            if self.outboxOffset < len(chunk):
+                return False
+            self.outbox.popleft()
+            self.outboxOffset = 0
+        self.stalledSince = None
+        return True
+
+    def read_ack(self):
+        """Reads an acknowledgement from the ack pipe. Raises EOFError or OSError once the receiver is gone.
+
+        Returns:
+            tuple: (Subscription or None, count), the subscription is None if it was removed in the meantime.
+        """
+        data = self.ack.recv_bytes() # type: ignore
+        if self.inbox is None:
+            return self.subscriptions.get(None), int.from_bytes(data, "little")
+        token, = _TOKEN.unpack_from(data)
+        return self.subscriptions.get(token), int.from_bytes(data[_TOKEN.size:], "little")
+
+    def detach(self, subscription):
+        """Removes a subscription from the channel, with its messages still waiting in the outbox.
+
+        Returns:
+            bool: True if no subscription is left, the gateway then closes the channel.
+        """
+        if self.subscriptions.get(subscription.token) is subscription:
+            del self.subscriptions[subscription.token]
+        if self.subscriptions and self.outbox:
+            head = self.outbox.popleft() if self.outboxOffset else None
+            keep = deque()
+            for entry in self.outbox:
+                if entry[0] == subscription.token:
+                    self.backlog -= len(entry[1])
+                    self._drop_unwritten(entry)
+                else:
+                    keep.append(entry)
+            if head is not None:
+                keep.appendleft(head)
+            self.outbox = keep
+        return not self.subscriptions
+
+    def close(self):
+        """Closes the pipes of the gateway, the messages left in the outbox are dropped."""
+        self.closed = True
+        for entry in self.outbox:
+            self._drop_unwritten(entry)
+        self.outbox.clear()
+        self.pipe.close()
+        if self.ack is not None:
+            self.ack.close()
+
+    def __repr__(self):
+        return "Channel(%s, subscriptions=%d, backlog=%d)" % (self.inbox, len(self.subscriptions), self.backlog)
+
+
+class Subscription:
+    """The delivery state of one receiver subscribed to one topic, kept by the gateway.\n
+    Without a QoS policy every message is written into the channel right away. With a policy the gateway tracks how many
+    messages the receiver got but didn't read yet (the receiver acknowledges every message it reads on the ack pipe):
+
+    - depth: at most this many unread messages are in the pipe, the newer ones wait in the gateway and when more than
+      depth of them wait the oldest is dropped. A depth of 1 conflates the topic to its latest value.
+    - maxRate: at most this many messages per second are delivered, the ones in between wait in the gateway as above.
+
+    The messages in the pipe are older than the ones waiting, so when a message has to wait for room the gateway writes
+    MARK_NEWER after the unread ones, once until the next acknowledgement. The receiver then acknowledges what it read with
+    ACK_SYNC, the gateway answers with the waiting messages followed by MARK_SYNCED, and the receiver keeps the newest ones:
+    a LastOnly receiver always gets the latest value and a FIFO one the depth latest messages.
+
+    A message that waits in the gateway was already serialized once for all the subscribers of the topic, a dropped one is
+    never written into the pipe nor unpickled by the receiver.
+
+    Args:
+        topic (int or tuple): The topic ID, or (Owner, msgID) for a topic outside the schema.
+        receiver (str): The name of the receiver.
+        channel (Channel): The pipe, or the inbox, the messages are written into.
+        token (int, optional): The token of the receiver in an inbox, None for a pipe of its own.
+        acknowledged (bool, optional): True if the receiver acknowledges the read messages on the ack pipe of the channel.
+        qos (dict, optional): The policy of the receiver, {"depth": int or None, "maxRate": float or None}.
+        framed (bool, optional): True if the receiver reads schema frames, False if it reads pickled dictionaries.
+        readsBlobs (bool, optional): False if the receiver never reads the blobs of the frames, nor releases them, so the
+            gateway doesn't hold them for it. Defaults to True.
+    """
+
+    def __init__(self, topic, receiver, channel, token=None, acknowledged=False, qos=None, framed=False, readsBlobs=True):
+        self.topic = topic
+        self.receiver = receiver
+        self.channel = channel
+        self.token = token
+        self.framed = framed
+        self.readsBlobs = readsBlobs
+        qos = qos or {}
+        maxRate = qos.get("maxRate")
+        self.depth = qos.get("depth")
+        self.interval = 1.0 / maxRate if maxRate else 0.0
+        if self.interval and self.depth is None:
+            self.depth = 1
+        if not acknowledged:
+            # without acknowledgements nothing is known about the reading side, so the messages are never held back
+            self.depth = None
+            self.interval = 0.0
+
+        self.managed = self.depth is not None
+        self.pending = deque(maxlen=self.depth)
+        self.inFlight = 0
+        self.nextDelivery = 0.0
+        # True once MARK_NEWER was written, until the next acknowledgement
+        self.signaled = False
+        self.dropped = 0
+        self.closed = False
+        channel.subscriptions[token] = self
+
+    @property
+    def pipe(self):
+        return self.channel.pipe
+
+    def offer(self, payload, now):
+        """Delivers a message or keeps it until the policy allows it.
+
+        Returns:
+            float or None: The time of the next delivery the gateway has to trigger with flush, None if there is nothing to wait for.
+        """
+        if not self.managed:
+            self.channel.write(self.token, payload, now, self.framed)
+            return None
+
+        if len(self.pending) == self.depth:
+            self.dropped += 1
+            if self.channel.onDrop is not None:
+                self.channel.onDrop(self.pending[0])
+        self.pending.append(payload)
+        due = self.flush(now)
+        if self.pending and self.inFlight >= self.depth and not self.signaled and not self.interval:
+            # the receiver would read older messages than the waiting ones, it is told to ask for them
+            self.channel.write(self.token, MARK_NEWER, now)
+            self.signaled = True
+        return due
+
+    def acknowledge(self, count, now):
+        """Applies the acknowledgement of count read messages and delivers the waiting ones, followed by MARK_SYNCED if the
+        acknowledgement has the ACK_SYNC bit."""
+        sync = count & ACK_SYNC
+        self.inFlight = max(0, self.inFlight - (count & ~ACK_SYNC))
+        self.signaled = False
+        due = self.flush(now)
+        if sync:
+            self.channel.write(self.token, MARK_SYNCED, now)
+        return due
+
+    def flush(self, now):
+        """Writes the waiting messages into the channel, as far as the policy allows.
+
+        Returns:
+            float or None: The time the next waiting message can be delivered, None if it doesn't depend on time.
+        """
+        while self.pending and self.inFlight < self.depth:
+            if now < self.nextDelivery:
+                return self.nextDelivery
+            self.channel.write(self.token, self.pending.popleft(), now, self.framed)
+            self.inFlight += 1
+            if self.interval:
+                self.nextDelivery = now + self.interval
+        return None
+
+    def close(self):
+        """Marks the subscription as removed, so the pending timers of the gateway ignore it, and drops its waiting messages.
+        The gateway detaches it from its channel."""
+        self.closed = True
+        if self.channel.onDrop is not None:
+            for payload in self.pending:
+                self.channel.onDrop(payload)
+        self.pending.clear()
+
+    def __repr__(self):
+        return "Subscription(%s, depth=%s, inFlight=%d, pending=%d, backlog=%d, dropped=%d)" % (
+            self.receiver, self.depth, self.inFlight, len(self.pending), self.channel.backlog, self.dropped)
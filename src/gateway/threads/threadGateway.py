@@ -26,8 +26,28 @@
 # OR TORT (INCLUDING NEGLIGENCE OR OTHERWITrueSE) ARISING IN ANY WAY OUT OF THE USE
 # OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE
 
-from src.templates.threadwithstop import ThreadWithStop
+import heapq
+import itertools
+import math
+import os
+import queue
+import selectors
 import time
+from multiprocessing.reduction import ForkingPickler
+
+from src.templates.threadwithstop import ThreadWithStop
+from src.gateway.threads.subscription import Channel, Subscription
+from src.utils.messages.allMessages import GatewayBacklog
+from src.utils.messages.messageSchema import (
+    TOPICS_BY_ID, TOPICS_BY_KEY, FLAG_BLOB, FLAG_TRACED, trace_gateway_in, route_key, frame_topic_id, frame_stamp, queue_key, blob_of, decode
+)
+from src.utils.sharedmemory.blobStore import release_blob
+
+# The order in which ready queues are served, the configuration messages come first so a subscription is in place before its data.
+PRIORITY_ORDER = ("Config", "Critical", "Warning", "General")
+PRIORITY_RANK = {name: rank for rank, name in enumerate(PRIORITY_ORDER)}
+# The topic key of the taps, the receivers getting every schema frame whatever its topic, see tap.
+TAP = "*"
 
 class threadGateway(ThreadWithStop):
     """Thread which will handle processGateway functionalities.\n
@@ -35,38 +55,110 @@ class threadGateway(ThreadWithStop):
         queuesList (dictionary of multiprocessing.queues.Queue): Dictionary of queues where the ID is the type of messages.
         logger (logging object): Made for debugging.
         debugger (bool): A flag for debugging.
+        batchSize (int, optional): The most messages handled before the thread checks its stop flag. Defaults to 256.
+        idleTimeout (float, optional): The longest time, in seconds, the thread blocks while all the queues are empty. Defaults to 0.1.
+        maxBacklog (int, optional): The most bytes waiting in the gateway for one subscriber before they are conflated. Defaults to 1 MiB.
+        evictAfter (float, optional): The longest time, in seconds, a subscriber may leave messages waiting before it is evicted. Defaults to 10.
+        blobLease (float, optional): The longest time, in seconds, a blob is kept for the subscribers which didn't release it. Defaults to 30.
+        queues (list, optional): The data queues served by the thread, see partitions.py. Defaults to Critical, Warning and General.
+        configQueue (string, optional): The queue the subscriptions are read from. Defaults to "Config".
+        forwards (dict, optional): The config queue of the partition serving each data queue outside this one: {queue: config queue}.
     """
 
     # ===================================== INIT =========================================
 
-    def __init__(self, queueList, logger, debugging):
-        super(threadGateway, self).__init__(pause=0.001)
+    def __init__(self, queueList, logger, debugging, batchSize=256, idleTimeout=0.1, maxBacklog=1 << 20, evictAfter=10.0,
+                 blobLease=30.0, queues=None, configQueue="Config", forwards=None):
+        # the thread blocks inside thread_work until there is something to do, so there is no pause between the cycles
+        super(threadGateway, self).__init__(pause=0)
         self.logger = logger
         self.debugging = debugging
-        self.sendingList = {}
         self.queuesList = queueList
-        self.messageApproved = []
+        # subscriptions of every topic: {topic ID: {receiver: Subscription}}, a topic outside the schema is keyed by (Owner, msgID)
+        self.sendingList = {}
+        # routing index used by send, rebuilt only when the subscriptions of a topic change: {topic ID: (Subscription, ...)}
+        self.routes = {}
+        # last message of every latched topic, replayed to the new subscribers: {topic ID: frame or dictionary}
+        self.latched = {}
+        self._latchedTopics = frozenset(topic.topicId for topic in TOPICS_BY_ID.values() if topic.latched)
+        # senders of the direct topics: {topic ID: [(publisher, control pipe), ...]}
+        self.publishers = {}
+        # the pipes of the taps the senders of the direct topics write into: {receiver: pipe}
+        self.tapPipes = {}
+        # deliveries held back by a max rate QoS: heap of (due time, counter, Subscription)
+        self._timers = []
+        self._timerCounter = itertools.count()
+        # first message of the ready data queues, waiting to be dispatched: {queue: (rank, deadline, counter, message)}
+        self._heads = {}
+        self._headCounter = itertools.count()
+        # dispatches later than the deadline of their topic: {topic name: count}, and the ones not reported yet
+        self.deadlineMisses = {}
+        self._unreportedMisses = {}
+        self._lastMissReport = 0.0
+        self.batchSize = batchSize
+        self.idleTimeout = idleTimeout
+        self.maxBacklog = maxBacklog
+        self.evictAfter = evictAfter
+        # inboxes of the processes, each shared by the subscriptions of one process: {inbox name: Channel}
+        self.inboxes = {}
+        # channels with messages waiting in their outbox, their pipe is watched for writability
+        self._backlogged = set()
+        self.evictions = 0
+        self._backlogTopic = TOPICS_BY_KEY[(GatewayBacklog.Owner.value, GatewayBacklog.msgID.value)]
+        self._nextBacklogReport = 0.0
+        # references to the blobs of the frames in flight: {blob name: [references, time of the first one]}
+        self.blobs = {}
+        # the blobs of the latched messages, kept outside the references, so the lease never frees them
+        self.latchedBlobs = set()
+        self.blobLease = blobLease
+        self._nextBlobSweep = 0.0
+        self.configQueue = configQueue
+        self.forwards = forwards or {}
+        # serving rank of every queue, a "Queue:Owner" queue has the rank of its queue class
+        self.ranks = {configQueue: PRIORITY_RANK["Config"]}
+        for name in queues or PRIORITY_ORDER[1:]:
+            self.ranks[name] = PRIORITY_RANK[name.split(":")[0]]
+
+        # The readable end of every queue is registered, so one select call tells which queues hold messages.
+        # multiprocessing.Queue doesn't expose it publicly, "_reader" is the connection get() reads from.
+        self._selector = selectors.DefaultSelector()
+        for name in self.ranks:
+            self._selector.register(self.queuesList[name]._reader, selectors.EVENT_READ, name)
 
     # =================================== SUBSCRIBE ======================================
 
     def subscribe(self, message):
-        """This functin will add the pipe into the approved messages list and it will be added into the dictionary of sending
+        """This function adds the receiver to the subscriptions of the topic and rebuilds the route of the topic.
+        A receiver subscribing again to the same topic replaces its previous subscription, so it never gets the messages twice.
+        The optional "QoS" entry of the message sets the delivery policy of the receiver, see Subscription.
+        A new subscriber of a latched topic gets the last message of the topic right away.
+        A subscriber reading from the inbox of its process ("inbox" and "token" in "To") shares the channel of the inbox with
+        the other subscribers of the process, every subscription sends the pipes of the inbox again and the gateway keeps one.
         Args:
             message(dictionary): Dictionary received from the multiprocessing queues ( the config one).
         """
-        
-        # Declaration of variables:
-        Owner = message["Owner"]
-        Id = message["msgID"]
-        To = message["To"]["receiver"]
-        Pipe = message["To"]["pipe"]
-        if not Owner in self.sendingList.keys():
-            self.sendingList[Owner] = {}
-        if not Id in self.sendingList[Owner].keys():
-            self.sendingList[Owner][Id] = {}
-        if not To in self.sendingList[Owner][Id].keys():
-            self.sendingList[Owner][Id][To] = Pipe
-        self.messageApproved.append((Owner, Id))
+
+        topic = route_key(message["Owner"], message["msgID"])
+        To = message["To"]
+        subscribers = self.sendingList.setdefault(topic, {})
+        previous = subscribers.get(To["receiver"])
+        if previous is not None:
+            self._close_subscription(previous)
+
+        framed = message.get("Codec") == "schema"
+        channel = self._channel(To, framed, topic.__class__ is int and TOPICS_BY_ID[topic].direct)
+        subscription = Subscription(
+            topic, To["receiver"], channel, To.get("token"), To.get("ack") is not None, message.get("QoS"), framed
+        )
+        subscribers[subscription.receiver] = subscription
+
+        self._rebuild_route(topic)
+        latched = self.latched.get(topic)
+        if latched is not None:
+            self._replay(subscription, latched)
+        if subscription.framed and subscription.token is None:
+            # a direct sender can only write into a pipe of its own
+            self._notify_publishers(topic, ("subscribe", subscription.receiver, subscription.pipe))
         # Debugging( you can comment this):
         if self.debugging:
             self.print_list()
@@ -74,41 +166,395 @@ class threadGateway(ThreadWithStop):
     # ================================== UNSUBSCRIBE =====================================
 
     def unsubscribe(self, message):
-        """This functin will remove the pipe into the approved messages list and it will be added into the dictionary of sending
+        """This function removes the receiver from the subscriptions of the topic and rebuilds the route of the topic.
         Args:
             message(dictionary): Dictionary received from the multiprocessing queues ( the config one).
         """
 
-        Owner = message["Owner"]
-        Id = message["msgID"]
-        To = message["To"]["receiver"]
+        topic = route_key(message["Owner"], message["msgID"])
+        self._remove_subscription(topic, message["To"]["receiver"])
+        if self.debugging:
+            self.print_list()
+
+    def _channel(self, To, framed, direct=False):
+        """Returns the channel of a new subscription: the inbox it names, or a channel of its own pipe, shared with the
+        senders of a direct topic."""
+        inbox = To.get("inbox")
+        channel = self.inboxes.get(inbox) if inbox is not None else None
+        if channel is None:
+            channel = Channel(To["pipe"], self.maxBacklog, inbox, shared=direct and framed and inbox is None)
+            if framed:
+                # the frames the subscriber will never read release their blob
+                channel.onDrop = self._dropped_frame
+            if inbox is not None:
+                self.inboxes[inbox] = channel
+        else:
+            # a copy of the pipe of the inbox, the gateway already holds one
+            To["pipe"].close()
+        ack = To.get("ack")
+        if ack is not None:
+            if channel.ack is None:
+                channel.ack = ack
+                self._selector.register(ack, selectors.EVENT_READ, channel)
+            else:
+                ack.close()
+        return channel
+
+    def _remove_subscription(self, topic, receiver):
+        subscribers = self.sendingList.get(topic, {})
+        subscription = subscribers.pop(receiver, None)
+        if subscription is not None:
+            self._close_subscription(subscription)
+        if not subscribers:
+            self.sendingList.pop(topic, None)
+        self._rebuild_route(topic)
+        if subscription is not None:
+            self._notify_publishers(topic, ("unsubscribe", receiver, None))
+        if topic == TAP:
+            pipe = self.tapPipes.pop(receiver, None)
+            if pipe is not None:
+                pipe.close()
+                for directTopic in self.publishers:
+                    self._notify_publishers(directTopic, ("unsubscribe", "tap:" + receiver, None))
+
+    def _drop_subscription(self, subscription):
+        """Removes a subscription, unless its receiver subscribed again in the meantime."""
+        if self.sendingList.get(subscription.topic, {}).get(subscription.receiver) is subscription:
+            self._remove_subscription(subscription.topic, subscription.receiver)
+
+    def _drop_channel(self, channel):
+        """Removes all the subscriptions of a channel, whose receiving process is gone or stopped reading."""
+        for subscription in list(channel.subscriptions.values()):
+            self._drop_subscription(subscription)
+
+    def _close_subscription(self, subscription):
+        subscription.close()
+        channel = subscription.channel
+        if not channel.detach(subscription):
+            return
+        if channel.ack is not None:
+            self._selector.unregister(channel.ack)
+        if channel in self._backlogged:
+            self._backlogged.discard(channel)
+            self._selector.unregister(channel.pipe)
+        if channel.inbox is not None:
+            self.inboxes.pop(channel.inbox, None)
+        channel.close()
+
+    def _rebuild_route(self, topic):
+        """Compiles the destinations of a topic into the routing index."""
+        subscribers = self.sendingList.get(topic)
+        if subscribers:
+            self.routes[topic] = tuple(subscribers.values())
+        else:
+            self.routes.pop(topic, None)
 
-        # We delete the value from Dictionary
-        del self.sendingList[Owner][Id][To]
-        self.messageApproved.remove((Owner, Id))
+    # ===================================== TAP ==========================================
+
+    def tap(self, message):
+        """This function adds a tap: a receiver getting every schema frame sent on the queues of this gateway, whatever its
+        topic, e.g. a recorder. The frames of the direct topics don't pass through the gateway, their senders write them
+        into the second pipe of the tap ("direct" in "To"). The messages outside the schema aren't tapped.
+        A new tap gets the last frame of every latched topic right away. A tap with "payloads" set to False in "To" only
+        looks at the frames, e.g. busTop, the gateway doesn't hold their blobs for it and it doesn't release them.
+        Args:
+            message(dictionary): Dictionary received from the multiprocessing queues ( the config one).
+        """
+
+        To = message["To"]
+        receiver = To["receiver"]
+        if receiver in self.sendingList.get(TAP, {}):
+            self._remove_subscription(TAP, receiver)
+        readsBlobs = To.get("payloads", True)
+        channel = self._channel(To, True)
+        if not readsBlobs:
+            channel.onDrop = None
+        subscription = Subscription(TAP, receiver, channel, framed=True, readsBlobs=readsBlobs)
+        self.sendingList.setdefault(TAP, {})[receiver] = subscription
+        self._rebuild_route(TAP)
+
+        for latched in self.latched.values():
+            if latched.__class__ is bytes:
+                self._replay(subscription, latched)
+        direct = To.get("direct")
+        if direct is not None:
+            # like the pipes of the subscribers, a tap which stops reading never blocks the senders
+            os.set_blocking(direct.fileno(), False)
+            self.tapPipes[receiver] = direct
+            for topic in self.publishers:
+                self._notify_publishers(topic, ("subscribe", "tap:" + receiver, direct))
         if self.debugging:
             self.print_list()
 
+    # ================================== DESCRIBE ========================================
+
+    def describe(self, message):
+        """This function sends the number of subscribers of every topic in the schema served by this gateway on the pipe of
+        the message ("pipe" in "To"), {topic ID: count}, the taps are not counted. It is sent to the config queue of every
+        partition, like a tap.
+        Args:
+            message(dictionary): Dictionary received from the multiprocessing queues ( the config one).
+        """
+
+        pipe = message["To"]["pipe"]
+        counts = {topic: len(subscribers) for topic, subscribers in self.sendingList.items() if topic.__class__ is int}
+        try:
+            pipe.send(counts)
+        except OSError:
+            pass
+        pipe.close()
+
+    # =================================== PUBLISH ========================================
+
+    def publish(self, message):
+        """This function registers a sender of a direct topic and sends it the pipes of the current subscribers of the topic.
+        From then on, the sender is told about every subscriber added or removed and writes the frames itself.
+        Args:
+            message(dictionary): Dictionary received from the multiprocessing queues ( the config one).
+        """
+
+        topic = route_key(message["Owner"], message["msgID"])
+        To = message["To"]
+        # a direct sender writes frames, so it only gets the subscribers reading frames
+        channels = {
+            subscription.receiver: subscription.pipe
+            for subscription in self.routes.get(topic, ())
+            if subscription.framed and subscription.token is None
+        }
+        channels.update(("tap:" + receiver, pipe) for receiver, pipe in self.tapPipes.items())
+        try:
+            To["pipe"].send(("channels", channels))
+        except OSError:
+            return
+        self.publishers.setdefault(topic, []).append((To["receiver"], To["pipe"]))
+
+    def _notify_publishers(self, topic, update):
+        """Sends a change of the subscribers to the senders of a direct topic, the senders that are gone are dropped."""
+        publishers = self.publishers.get(topic)
+        if not publishers:
+            return
+        for publisher in list(publishers):
+            try:
+                publisher[1].send(update)
+            except OSError:
+                publisher[1].close()
+                publishers.remove(publisher)
+
     # =================================== SENDING ========================================
 
     def send(self, message):
-        """This functin will send the message on all the pipes that are in the sending list of the message ID.
+        """This function will send the message on all the pipes from the route of the message topic.\n
+        A message is either a schema frame, put by messageHandlerSender, or a dictionary. The subscribers reading frames get the
+        frame as it is, the ones reading dictionaries get the dictionary pickled once. Each form is built at most once per message
+        and the same bytes are written into every pipe.
         Args:
-            message(dictionary): Dictionary received from the multiprocessing queues ( the config one).
+            message(bytes or dictionary): Frame or dictionary received from the multiprocessing queues.
         """
 
-        Owner = message["Owner"]
-        Id = message["msgID"]
-        Type = message["msgType"]
-        Value = message["msgValue"]
-        if (Owner, Id) in self.messageApproved:
-            for element in self.sendingList[Owner][Id]:
-                # We send a dictionary that contain the type of the message and message
-                self.sendingList[Owner][Id][element].send(
-                    {"Type": Type, "value": Value, "id": Id, "Owner": Owner}
-                )
-                if self.debugging:
-                    self.logger.warning(message)
+        if message.__class__ is bytes:
+            frame = message
+            key = frame_topic_id(frame)
+        else:
+            frame = None
+            key = route_key(message["Owner"], message["msgID"])
+        # the gateway holds a reference to the blob of the frame while it is sending it
+        blob = blob_of(frame) if frame is not None and frame[3] & FLAG_BLOB else None
+        if blob is not None:
+            self._hold_blob(blob)
+        if key in self._latchedTopics:
+            self._latch(key, message, blob)
+        destinations = self.routes.get(key)
+        taps = self.routes.get(TAP)
+        if taps is not None and key.__class__ is int:
+            destinations = destinations + taps if destinations is not None else taps
+        if destinations is None:
+            if blob is not None:
+                self._release_blob(blob)
+            return
+
+        pickled = None
+        now = time.monotonic()
+        for subscription in destinations:
+            if subscription.framed:
+                if frame is None:
+                    frame = TOPICS_BY_ID[key].encode(message["msgValue"])
+                if blob is not None and subscription.readsBlobs:
+                    self._hold_blob(blob)
+                payload = frame
+            else:
+                if pickled is None:
+                    pickled = self._pickled_dictionary(message, frame)
+                payload = pickled
+            self._deliver(subscription, subscription.offer, payload, now)
+        if self.debugging:
+            self.logger.warning(message if frame is None else decode(frame))
+        if blob is not None:
+            self._release_blob(blob)
+
+    def _pickled_dictionary(self, message, frame):
+        """Builds the dictionary read by the subscribers outside the schema."""
+        if message.__class__ is bytes:
+            topic, value = decode(frame)
+            # We send a dictionary that contain the type of the message and message
+            return ForkingPickler.dumps({"Type": topic.msgType, "value": value, "id": topic.msgID, "Owner": topic.owner})
+        return ForkingPickler.dumps({"Type": message["msgType"], "value": message["msgValue"], "id": message["msgID"], "Owner": message["Owner"]})
+
+    def _replay(self, subscription, message):
+        """Delivers the last message of a latched topic to a new subscriber."""
+        if message.__class__ is bytes:
+            if subscription.framed:
+                blob = blob_of(message)
+                if blob is not None and subscription.readsBlobs:
+                    self._hold_blob(blob)
+                payload = message
+            else:
+                payload = self._pickled_dictionary(message, message)
+        elif subscription.framed:
+            payload = TOPICS_BY_ID[subscription.topic].encode(message["msgValue"])
+        else:
+            payload = self._pickled_dictionary(message, None)
+        self._deliver(subscription, subscription.offer, payload, time.monotonic())
+
+    def _latch(self, topic, message, blob):
+        """Keeps the last message of a latched topic and its blob, until the next message of the topic."""
+        previous = self.latched.get(topic)
+        self.latched[topic] = message
+        if blob is not None:
+            self.latchedBlobs.add(blob)
+        if previous.__class__ is bytes and previous[3] & FLAG_BLOB:
+            name = blob_of(previous)
+            self.latchedBlobs.discard(name)
+            if name not in self.blobs:
+                release_blob(name)
+
+    # ===================================== BLOBS ========================================
+
+    def _hold_blob(self, name):
+        references = self.blobs.get(name)
+        if references is None:
+            self.blobs[name] = [1, time.monotonic()]
+        else:
+            references[0] += 1
+
+    def _release_blob(self, name):
+        """Drops a reference to a blob, the blob is freed with the last one."""
+        references = self.blobs.get(name)
+        if references is None:
+            return
+        references[0] -= 1
+        if references[0] <= 0:
+            del self.blobs[name]
+            if name not in self.latchedBlobs:
+                release_blob(name)
+
+    def _dropped_frame(self, frame):
+        """Releases the blob of a frame a subscriber will never read."""
+        if frame[3] & FLAG_BLOB:
+            self._release_blob(blob_of(frame))
+
+    def _expire_blobs(self, now):
+        """Frees the blobs held for longer than blobLease, the references left are of subscribers which will never read them.
+        The blob of a latched message is only freed once the next message of its topic replaces it."""
+        expired = [name for name, (_, since) in self.blobs.items() if now - since > self.blobLease]
+        for name in expired:
+            del self.blobs[name]
+            if name not in self.latchedBlobs:
+                release_blob(name)
+        if expired:
+            print(f"\033[1;97m[ Gateway ] :\033[0m \033[1;93mWARNING\033[0m - Freed {len(expired)} blobs not released within {self.blobLease} s")
+
+    # ==================================== DELIVERY ======================================
+
+    def _deliver(self, subscription, delivery, *args):
+        """Runs a delivery of the subscription (offer, acknowledge or flush) and follows it up: schedules the held back
+        messages and watches the pipe while the outbox isn't empty. A receiver whose pipe is broken is removed."""
+        try:
+            due = delivery(*args)
+        except OSError:
+            # the receiver's process is gone
+            self._drop_subscription(subscription)
+            return
+        if due is not None:
+            self._schedule(subscription, due)
+        channel = subscription.channel
+        if channel.outbox and channel not in self._backlogged:
+            self._backlogged.add(channel)
+            self._selector.register(channel.pipe, selectors.EVENT_WRITE, channel)
+
+    def _drain(self, channel):
+        """Writes the outbox of a channel whose pipe became writable."""
+        if channel.closed:
+            # removed earlier in the same select round
+            return
+        try:
+            empty = channel.drain()
+        except OSError:
+            self._drop_channel(channel)
+            return
+        if empty:
+            self._backlogged.discard(channel)
+            self._selector.unregister(channel.pipe)
+
+    def _check_backlogs(self, now):
+        """Evicts the subscribers whose outbox stalled for longer than evictAfter, frees the expired blobs and publishes the
+        backlogs every second."""
+        for channel in list(self._backlogged):
+            if now - channel.stalledSince > self.evictAfter:
+                print(f"\033[1;97m[ Gateway ] :\033[0m \033[1;93mWARNING\033[0m - Evicting {self._channel_name(channel)}, it stopped reading ({channel.backlog} bytes waiting)")
+                self.evictions += len(channel.subscriptions)
+                self._drop_channel(channel)
+
+        if self.blobs and now >= self._nextBlobSweep:
+            self._nextBlobSweep = now + 1
+            self._expire_blobs(now)
+
+        if now >= self._nextBacklogReport:
+            self._nextBacklogReport = now + 1
+            if self._backlogTopic.topicId in self.routes:
+                backlogs = {}
+                for subscribers in self.sendingList.values():
+                    for subscription in subscribers.values():
+                        channel = subscription.channel
+                        if channel.backlog or subscription.dropped:
+                            # the subscriptions of an inbox share its backlog, so it is reported once for the inbox
+                            entry = backlogs.setdefault(self._channel_name(channel), {"backlog": channel.backlog, "dropped": 0})
+                            entry["dropped"] += subscription.dropped
+                self.send(self._backlogTopic.encode(backlogs))
+
+    def _topic_name(self, topic):
+        return TOPICS_BY_ID[topic].name if topic.__class__ is int else str(topic)
+
+    def _channel_name(self, channel):
+        """Returns "receiver/topic" for the pipe of a single subscription, the name of the inbox for an inbox."""
+        if channel.inbox is not None:
+            return channel.inbox
+        subscription = channel.subscriptions[None]
+        return subscription.receiver + "/" + self._topic_name(subscription.topic)
+
+    def _acknowledge(self, channel):
+        """Reads an acknowledgement of a receiver and delivers the messages it makes room for."""
+        if channel.closed:
+            return
+        try:
+            subscription, count = channel.read_ack()
+        except (EOFError, OSError):
+            # the receiver closed its end, its process is gone
+            self._drop_channel(channel)
+            return
+        if subscription is not None and subscription.managed:
+            self._deliver(subscription, subscription.acknowledge, count, time.monotonic())
+
+    def _schedule(self, subscription, due):
+        heapq.heappush(self._timers, (due, next(self._timerCounter), subscription))
+
+    def _run_timers(self):
+        """Delivers the held back messages whose time has come."""
+        now = time.monotonic()
+        while self._timers and self._timers[0][0] <= now:
+            _, _, subscription = heapq.heappop(self._timers)
+            if subscription.closed:
+                continue
+            self._deliver(subscription, subscription.flush, now)
 
     # ====================================================================================
 
@@ -116,35 +562,147 @@ class threadGateway(ThreadWithStop):
     def print_list(self):
         """Made for debugging"""
 
-        self.logger.warning(self.sendingList)
+        self.logger.warning({topic: list(subscribers.values()) for topic, subscribers in self.sendingList.items()})
+        if self.publishers:
+            self.logger.warning({topic: [name for name, _ in publishers] for topic, publishers in self.publishers.items()})
 
     # ==================================== RUN ===========================================
 
     def thread_work(self):
-        """This function will take the messages in priority order form the queues.\n
-        the prioirty is: Critical > Warning > General
+        """This function blocks until at least one queue holds a message and then drains the queues in batches.\n
+        After every message the readiness of all the queues is checked again. The config messages are applied first, then the
+        first message of every ready queue is taken as its head and the head with the highest priority is dispatched:
+        Critical > Warning > General. Between the heads of the same priority (e.g. "General" and a "General:Owner" queue of a
+        partition), the one with the earliest deadline goes first.
         """
-        
-        # while self._running:
-        message = None
-        # We are using "elif" because we are processing one message at a time.
-        # We work with the queues in the priority order( We start from the high priority to low priority)
-        if not self.queuesList["Critical"].empty():
-            message = self.queuesList["Critical"].get()
-        elif not self.queuesList["Warning"].empty():
-            message = self.queuesList["Warning"].get()
-        elif not self.queuesList["General"].empty():
-            message = self.queuesList["General"].get()
-        if message is not None:
-            self.send(message)
-        if not self.queuesList["Config"].empty():
-            message2 = self.queuesList["Config"].get()
-            if str.lower(message2["Subscribe/Unsubscribe"]) == "subscribe":
-                self.subscribe(message2)
+
+        ready = self._ready_queues(self._wait_timeout())
+        handled = 0
+        while (ready or self._heads) and handled < self.batchSize:
+            if self.configQueue in ready:
+                message = self._take(self.configQueue)
+                if message is not None:
+                    self.configure(message)
+            else:
+                for name in ready:
+                    if name not in self._heads:
+                        message = self._take(name)
+                        if message is not None:
+                            if message.__class__ is bytes and message[3] & FLAG_TRACED:
+                                message = trace_gateway_in(message, time.monotonic())
+                            self._heads[name] = (self.ranks[name], self._deadline(message), next(self._headCounter), message)
+                if self._heads:
+                    _, deadline, _, message = self._heads.pop(min(self._heads, key=self._heads.__getitem__))
+                    if deadline != math.inf:
+                        lateness = time.monotonic() - deadline
+                        if lateness > 0:
+                            self._count_deadline_miss(message, lateness)
+                    self.send(message)
+            handled += 1
+            ready = self._ready_queues(0)
+
+        self._run_timers()
+        if self._unreportedMisses:
+            self._report_deadline_misses()
+        self._check_backlogs(time.monotonic())
+
+    def _take(self, name):
+        try:
+            return self.queuesList[name].get_nowait()
+        except queue.Empty:
+            # the queue is readable but another message is still being written into it
+            return None
+
+    def _deadline(self, message):
+        """Returns the time a message must be dispatched by: its send time plus the deadline of its topic, inf if it has none."""
+        if message.__class__ is bytes:
+            stamp = frame_stamp(message)
+            if stamp is not None:
+                # a frame traced for latency is stamped also when its topic has no deadline
+                deadline = TOPICS_BY_ID[frame_topic_id(message)].deadline
+                if deadline is not None:
+                    return stamp + deadline
+        return math.inf
+
+    def _count_deadline_miss(self, frame, lateness):
+        name = TOPICS_BY_ID[frame_topic_id(frame)].name
+        self.deadlineMisses[name] = self.deadlineMisses.get(name, 0) + 1
+        count, worst = self._unreportedMisses.get(name, (0, 0.0))
+        self._unreportedMisses[name] = (count + 1, max(worst, lateness))
+
+    def _report_deadline_misses(self):
+        """Prints the deadline misses, at most once per second."""
+        now = time.monotonic()
+        if now - self._lastMissReport < 1:
+            return
+        misses = ", ".join("%s: %d (up to %.1f ms late)" % (name, count, worst * 1000) for name, (count, worst) in self._unreportedMisses.items())
+        print(f"\033[1;97m[ Gateway ] :\033[0m \033[1;93mWARNING\033[0m - Deadline misses: {misses}")
+        self._unreportedMisses = {}
+        self._lastMissReport = now
+
+    def _ready_queues(self, timeout):
+        """Returns the names of the queues holding messages, waiting at most timeout seconds for a queue, an acknowledgement or
+        a pipe with a backlog becoming writable. The acknowledgements and the writable pipes are handled right away."""
+        ready = set()
+        for key, _ in self._selector.select(timeout):
+            if key.data.__class__ is str:
+                ready.add(key.data)
+            elif key.fileobj is key.data.ack:
+                self._acknowledge(key.data)
             else:
-                self.unsubscribe(message2)
+                self._drain(key.data)
+        return ready
+
+    def _wait_timeout(self):
+        if self._heads:
+            return 0
+        if not self._timers:
+            return self.idleTimeout
+        return max(0.0, min(self.idleTimeout, self._timers[0][0] - time.monotonic()))
+
+    def configure(self, message):
+        """Applies a message received on the config queue, or forwards it to the partition serving the topic."""
+        action = str.lower(message["Subscribe/Unsubscribe"])
+        if action == "tap":
+            # a tap is sent to the config queue of every partition, see messageHandlerTap
+            self.tap(message)
+            return
+        if action == "untap":
+            self._remove_subscription(TAP, message["To"]["receiver"])
+            return
+        if action == "describe":
+            self.describe(message)
+            return
+        forward = self._partition_of(message)
+        if forward is not None:
+            self.queuesList[forward].put(message)
+        elif action == "subscribe":
+            self.subscribe(message)
+        elif action == "publish":
+            self.publish(message)
+        elif action == "release":
+            self._release_blob(message["Blob"])
+        else:
+            self.unsubscribe(message)
+
+    def _partition_of(self, message):
+        """Returns the config queue of the partition serving the topic of the message, None if this thread serves it."""
+        if not self.forwards:
+            return None
+        topic = TOPICS_BY_KEY.get((message["Owner"], message["msgID"]))
+        if topic is None:
+            # a topic outside the schema is always sent on the queue class it declares
+            return None
+        return self.forwards.get(queue_key(self.queuesList, topic.queue, topic.owner))
 
-        # print(time.perf_counter_ns())
+    def run(self):
+        super(threadGateway, self).run()
+        self._selector.close()
+        # the blobs aren't tracked by any process, those still held are freed with the gateway
+        for name in self.blobs.keys() | self.latchedBlobs:
+            release_blob(name)
+        self.blobs.clear()
+        self.latchedBlobs.clear()
 
 
-# =====================================================================================
\ No newline at end of file
+# =====================================================================================
@@ -0,0 +1,206 @@
+# Copyright (c) 2019, Bosch Engineering Center Cluj and BFMC organizers
+# All rights reserved.
+
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met:
+
+# 1. Redistributions of source code must retain the above copyright notice, this
+#    list of conditions and the following disclaimer.
+
+# 2. Redistributions in binary form must reproduce the above copyright notice,
+#    this list of conditions and the following disclaimer in the documentation
+#    and/or other materials provided with the distribution.
+
+# 3. Neither the name of the copyright holder nor the names of its
+#    contributors may be used to endorse or promote products derived from
+#    this software without specific prior written permission.
+
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS"
+# AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE
+# IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE
+# DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT HOLDER OR CONTRIBUTORS BE LIABLE
+# FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL
+# DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR
+# SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER
+# CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY,
+# OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE
+# OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE
+
+import os
+import socket
+import struct
+import tempfile
+import threading
+from collections import deque
+from multiprocessing import AuthenticationError
+from multiprocessing.connection import Listener, wait, deliver_challenge, answer_challenge
+
+from src.templates.threadwithstop import ThreadWithStop
+from src.utils.messages.messageSchema import schema_fingerprint
+
+# The Unix socket the tools running outside the processes of the car attach to the gateway on, e.g. busTop. The key they
+# authenticate with is drawn at random for every run and written next to it, see read_listener_key.
+LISTENER_ADDRESS = os.path.join(tempfile.gettempdir(), "bfmc_gateway")
+# the config messages the tools may send, all of them only read the bus
+LISTENER_ACTIONS = ("tap", "hold", "describe")
+# the most clients in their handshake at once
+_MAX_HANDSHAKES = 8
+
+
+def read_listener_key(address=LISTENER_ADDRESS):
+    """Returns the key of the listener on the address, read from the key file only its user can read."""
+    with open(address + ".key", "rb") as file:
+        return file.read()
+
+
+class threadListener(ThreadWithStop):
+    """Thread which lets the tools running outside the processes of the car read the bus through the gateway, e.g. busTop.\n
+    Args:
+        queueList (dictionary of multiprocessing.queues.Queue): Dictionary of queues where the ID is the type of messages.
+        logger (logging object): Made for debugging.
+        debugging (bool): A flag for debugging.
+        address (str, optional): The path of the Unix socket to listen on. Defaults to LISTENER_ADDRESS.
+
+    The socket and the key file, <address>.key, can only be used by the user running the car: the key is drawn at random
+    when the listener starts and a client must prove it knows it.
+    Every connection carries one config message. The listener first sends the client a hello, {"fingerprint": checksum of
+    the schema, "configQueues": [the config queue of every partition]}, then reads the config message and puts it on the
+    config queue named by its "Queue" entry ("Config" by default). Only the actions which read the bus are accepted, see
+    LISTENER_ACTIONS. The entries of its "To" set to "connection" are replaced by the connection itself, which the gateway
+    writes into like into a pipe.
+    A "hold" message, {"Subscribe/Unsubscribe": "hold", "To": {"receiver": name}}, only keeps its connection: the entries
+    set to "held" in the "To" of the next messages of the receiver are replaced by it, e.g. the pipe of the direct topics
+    of a tap.
+    The handshake of every client, up to its config message, runs on a thread of its own, so a slow client never holds the
+    others back.
+
+    The client sends nothing else on a connection. Once it closes it, the listener closes its end too and takes back the
+    tap made with it.
+    """
+
+    # ===================================== INIT =========================================
+    def __init__(self, queueList, logger, debugging, address=LISTENER_ADDRESS):
+        super(threadListener, self).__init__(pause=0)
+        self.queuesList = queueList
+        self.logger = logger
+        self.debugging = debugging
+        self.address = address
+        self._configQueues = [name for name in queueList if name.split(":")[0] == "Config"]
+        self._fingerprint = schema_fingerprint()
+        # the open connections: {connection: (config queue, action, message)}, (None, "hold", message) for a held one
+        self._clients = {}
+        # the held connections: {receiver: connection}
+        self._held = {}
+        # (connection, message) of the clients done with their handshake, relayed by the thread of the listener
+        self._handshaken = deque()
+        self._handshakes = threading.BoundedSemaphore(_MAX_HANDSHAKES)
+
+        # the socket of a gateway that didn't stop cleanly would keep the address taken
+        for path in (address, address + ".key"):
+            if os.path.exists(path):
+                os.unlink(path)
+        self._authkey = os.urandom(32)
+        keyFile = os.open(address + ".key", os.O_WRONLY | os.O_CREAT | os.O_EXCL, 0o600)
+        with os.fdopen(keyFile, "wb") as file:
+            file.write(self._authkey)
+        self._listener = Listener(address, "AF_UNIX")
+        os.chmod(address, 0o600)
+        # Listener doesn't expose its socket publicly, it is waited on with the connections
+        self._socket = self._listener._listener._socket # type: ignore
+
+    # ===================================== RUN ==========================================
+    def thread_work(self):
+        while self._handshaken:
+            self._relay(*self._handshaken.popleft())
+        for ready in wait([self._socket] + list(self._clients), 0.1):
+            if ready is self._socket:
+                self._accept()
+            else:
+                # the clients send nothing after their message, so a readable connection was closed by the client
+                self._close_client(ready)
+
+    def _accept(self):
+        """Accepts a client and starts its handshake on a thread of its own."""
+        try:
+            # the socket without the authentication of Listener.accept, which waits for the client
+            connection = self._listener._listener.accept() # type: ignore
+        except OSError as e:
+            print(f"\033[1;97m[ Listener ] :\033[0m \033[1;93mWARNING\033[0m - Refused a client ({e})")
+            return
+        if not self._handshakes.acquire(blocking=False):
+            print(f"\033[1;97m[ Listener ] :\033[0m \033[1;93mWARNING\033[0m - Refused a client, {_MAX_HANDSHAKES} handshakes already running")
+            connection.close()
+            return
+        threading.Thread(target=self._handshake, args=(connection,), daemon=True).start()
+
+    def _handshake(self, connection):
+        """Authenticates a client, sends it the hello and reads its config message, every read within 2 s."""
+        try:
+            self._set_timeout(connection, 2)
+            deliver_challenge(connection, self._authkey)
+            answer_challenge(connection, self._authkey)
+            connection.send({"fingerprint": self._fingerprint, "configQueues": self._configQueues})
+            if not connection.poll(2):
+                raise TimeoutError("no message within 2 s")
+            message = connection.recv()
+            action = str.lower(message["Subscribe/Unsubscribe"])
+            if action not in LISTENER_ACTIONS:
+                raise PermissionError("%s not allowed" % action)
+            self._set_timeout(connection, 0)
+        except (OSError, EOFError, AuthenticationError, KeyError, TypeError) as e:
+            print(f"\033[1;97m[ Listener ] :\033[0m \033[1;93mWARNING\033[0m - Refused a client ({e})")
+            connection.close()
+            return
+        finally:
+            self._handshakes.release()
+        self._handshaken.append((connection, message))
+
+    def _set_timeout(self, connection, seconds):
+        """Bounds the reads of a connection, a read past the timeout raises an OSError. 0 removes the bound."""
+        # the connection doesn't own a socket object, the option is set on the same socket through a duplicate
+        with socket.socket(fileno=os.dup(connection.fileno())) as duplicate:
+            duplicate.setsockopt(socket.SOL_SOCKET, socket.SO_RCVTIMEO, struct.pack("ll", int(seconds), 0))
+
+    def _relay(self, connection, message):
+        """Puts the message of a client on its config queue, with the connections in place of their placeholders."""
+        action = str.lower(message["Subscribe/Unsubscribe"])
+        To = message.get("To", {})
+        if action == "hold":
+            self._held[To["receiver"]] = connection
+            self._clients[connection] = (None, action, message)
+            return
+        queueName = message.pop("Queue", "Config")
+        if queueName not in self._configQueues:
+            print(f"\033[1;97m[ Listener ] :\033[0m \033[1;93mWARNING\033[0m - Unknown config queue {queueName}")
+            connection.close()
+            return
+        for key, value in To.items():
+            if value == "connection":
+                To[key] = connection
+            elif value == "held":
+                To[key] = self._held.get(To.get("receiver"))
+        self.queuesList[queueName].put(message)
+        self._clients[connection] = (queueName, action, message)
+        if self.debugging:
+            self.logger.warning(message)
+
+    def _close_client(self, connection):
+        """Closes a connection the client closed and takes back what was made with it."""
+        queueName, action, message = self._clients.pop(connection)
+        if action == "hold":
+            if self._held.get(message["To"]["receiver"]) is connection:
+                del self._held[message["To"]["receiver"]]
+        elif action == "tap":
+            self.queuesList[queueName].put({"Subscribe/Unsubscribe": "untap", "To": {"receiver": message["To"]["receiver"]}})
+        connection.close()
+
+    # ===================================== STOP =========================================
+    def run(self):
+        super(threadListener, self).run()
+        for connection in self._clients:
+            connection.close()
+        self._clients.clear()
+        self._held.clear()
+        self._listener.close()
+        if os.path.exists(self.address + ".key"):
+            os.unlink(self.address + ".key")
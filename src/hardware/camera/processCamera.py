@@ -84,8 +84,8 @@ if __name__ == "__main__":
     import time
     import logging
     import cv2
-    import base64
-    import numpy as np
+    from src.utils.sharedmemory.frameRing import get_frame_ring
+    from src.utils.messages.messageSchema import decode
 
     allProcesses = list()
 
@@ -108,17 +108,13 @@ if __name__ == "__main__":
     time.sleep(4)
     if debugg:
         logger.warning("getting")
-    img = {"msgValue": 1}
-    while not isinstance(img["msgValue"], str):
-        img = queueList["General"].get()
-    
-    msg_value = img["msgValue"]
-    if isinstance(msg_value, str):
-        image_data = base64.b64decode(msg_value)
-    else:
-        raise ValueError("Expected string for base64 decoding")
-    img = np.frombuffer(image_data, dtype=np.uint8)
-    image = cv2.imdecode(img, cv2.IMREAD_COLOR)
+    descriptor = None
+    while not isinstance(descriptor, dict):
+        _, descriptor = decode(queueList["General"].get())
+
+    image = get_frame_ring(descriptor).array(descriptor)
+    if image is None:
+        raise ValueError("The frame was overwritten before it could be read")
     if debugg:
         logger.warning("got")
     cv2.imwrite("test.jpg", image)
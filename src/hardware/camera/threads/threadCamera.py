@@ -27,8 +27,6 @@
 # OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE
 
 import cv2
-import threading
-import base64
 import picamera2
 import time
 
@@ -45,8 +43,12 @@ from src.utils.messages.messageHandlerSubscriber import messageHandlerSubscriber
 from src.templates.threadwithstop import ThreadWithStop
 from src.utils.messages.allMessages import StateChange
 from src.utils.messages.messageHandlerSubscriber import messageHandlerSubscriber
+from src.utils.sharedmemory.frameRing import FrameRing
 from src.statemachine.systemMode import SystemMode
 
+MAIN_SIZE = (2048, 1080)
+LORES_SIZE = (512, 270)
+
 class threadCamera(ThreadWithStop):
     """Thread which will handle camera functionalities.\n
     Args:
@@ -57,7 +59,8 @@ class threadCamera(ThreadWithStop):
 
     # ================================ INIT ===============================================
     def __init__(self, queuesList, logger, debugger):
-        super(threadCamera, self).__init__(pause=0.001)
+        # the frames are captured at a fixed 30 Hz until a mode sets its "fps", see ThreadWithStop.rate_stats
+        super(threadCamera, self).__init__(period=1 / 30)
         self.queuesList = queuesList
         self.logger = logger
         self.debugger = debugger
@@ -70,10 +73,16 @@ class threadCamera(ThreadWithStop):
         self.mainCameraSender = messageHandlerSender(self.queuesList, mainCamera)
         self.serialCameraSender = messageHandlerSender(self.queuesList, serialCamera)
 
+        # frames travel through shared memory, only their descriptors go on the bus
+        self.mainCameraRing = FrameRing.create("mainCamera", MAIN_SIZE[0] * MAIN_SIZE[1] * 3, 3)
+        self.serialCameraRing = FrameRing.create("serialCamera", 512 * 1024, 4)
+
         self.subscribe()
         self._init_camera()
-        self.queue_sending()
+        # Recording is latched, the gateway replays it to the subscribers coming later
+        self.recordingSender.send(self.recording)
         self.configs()
+        self.call_every(1, self.configs)
 
     def subscribe(self):
         """Subscribe function. In this function we make all the required subscribe to process gateway"""
@@ -83,27 +92,26 @@ class threadCamera(ThreadWithStop):
         self.contrastSubscriber = messageHandlerSubscriber(self.queuesList, Contrast, "lastOnly", True)
         self.stateChangeSubscriber = messageHandlerSubscriber(self.queuesList, StateChange, "lastOnly", True)
 
-    def queue_sending(self):
-        """Callback function for recording flag."""
-        if self._blocker.is_set():
-            return
-        self.recordingSender.send(self.recording)
-        threading.Timer(1, self.queue_sending).start()
-
     # ================================ RUN ================================================
+    def run(self):
+        super(threadCamera, self).run()
+        # the rings are released only once the loop is over, so no frame is written into a closed ring
+        self.mainCameraRing.close()
+        self.serialCameraRing.close()
+
     def thread_work(self):
         """This function will run while the running flag is True. 
         It captures the image from camera and make the required modifies 
         and then it send the data to process gateway."""
         # if camera is not available, skip processing
         if self.camera is None:
-            time.sleep(0.1)
             return
             
         try:
             recordRecv = self.recordSubscriber.receive()
             if recordRecv is not None: 
                 self.recording = bool(recordRecv)
+                self.recordingSender.send(self.recording)
                 if recordRecv == False:
                     self.video_writer.release() # type: ignore
                 else:
@@ -114,7 +122,7 @@ class threadCamera(ThreadWithStop):
                         "output_video" + str(time.time()) + ".avi",
                         fourcc,
                         self.frame_rate,
-                        (2048, 1080),
+                        MAIN_SIZE,
                     )
 
         except Exception as e:
@@ -129,17 +137,14 @@ class threadCamera(ThreadWithStop):
 
             serialRequest = cv2.cvtColor(serialRequest, cv2.COLOR_YUV2BGR_I420) # type: ignore
 
-            _, mainEncodedImg = cv2.imencode(".jpg", mainRequest) # type: ignore
+            # the main frame is shared raw, the lores one is the JPEG shown on the dashboard
             _, serialEncodedImg = cv2.imencode(".jpg", serialRequest) # type: ignore
 
-            mainEncodedImageData = base64.b64encode(mainEncodedImg).decode("utf-8") # type: ignore
-            serialEncodedImageData = base64.b64encode(serialEncodedImg).decode("utf-8") # type: ignore
-
             if self._blocker.is_set():
                 return
 
-            self.mainCameraSender.send(mainEncodedImageData)
-            self.serialCameraSender.send(serialEncodedImageData)
+            self.mainCameraSender.send(self.mainCameraRing.write(mainRequest))
+            self.serialCameraSender.send(self.serialCameraRing.write(serialEncodedImg))
         except Exception as e:
             print(f"\033[1;97m[ Camera ] :\033[0m \033[1;91mERROR\033[0m - {e}")
 
@@ -152,6 +157,10 @@ class threadCamera(ThreadWithStop):
             if "resolution" in modeDict:
                 print(f"\033[1;97m[ Camera Thread ] :\033[0m \033[1;92mINFO\033[0m - Resolution changed to {modeDict['resolution']}")
 
+            if "fps" in modeDict and modeDict["fps"] != round(1 / self._period):
+                self.set_period(1 / modeDict["fps"])
+                print(f"\033[1;97m[ Camera Thread ] :\033[0m \033[1;92mINFO\033[0m - Frame rate changed to {modeDict['fps']} fps")
+
     # ================================ INIT CAMERA ========================================
     def _init_camera(self):
         """This function will initialize the camera object. It will make this camera object have two chanels "lore" and "main"."""
@@ -167,8 +176,8 @@ class threadCamera(ThreadWithStop):
             config = self.camera.create_preview_configuration(
                 buffer_count=1,
                 queue=False,
-                main={"format": "RGB888", "size": (2048, 1080)},
-                lores={"size": (512, 270)},
+                main={"format": "RGB888", "size": MAIN_SIZE},
+                lores={"size": LORES_SIZE},
                 encode="lores",
             )
             self.camera.configure(config) # type: ignore
@@ -212,5 +221,4 @@ class threadCamera(ThreadWithStop):
                     "AwbEnable": False,
                     "Contrast": max(0.0, min(32.0, float(message))), # type: ignore
                 }
-            )
-        threading.Timer(1, self.configs).start()
\ No newline at end of file
+            )
\ No newline at end of file
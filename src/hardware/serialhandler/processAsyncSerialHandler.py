@@ -0,0 +1,258 @@
+# Copyright (c) 2019, Bosch Engineering Center Cluj and BFMC organizers
+# All rights reserved.
+
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met:
+
+# 1. Redistributions of source code must retain the above copyright notice, this
+#    list of conditions and the following disclaimer.
+
+# 2. Redistributions in binary form must reproduce the above copyright notice,
+#    this list of conditions and the following disclaimer in the documentation
+#    and/or other materials provided with the distribution.
+
+# 3. Neither the name of the copyright holder nor the names of its
+#    contributors may be used to endorse or promote products derived from
+#    this software without specific prior written permission.
+
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS"
+# AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE
+# IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE
+# DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT HOLDER OR CONTRIBUTORS BE LIABLE
+# FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL
+# DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR
+# SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER
+# CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY,
+# OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE
+# OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE
+
+if __name__ == "__main__":
+    import sys
+    sys.path.insert(0, "../../..")
+
+import asyncio
+import re
+import serial
+import serial.tools.list_ports
+
+from src.templates.asyncworkerprocess import AsyncWorkerProcess, wait_readable, release_readable
+from src.templates.placement import apply_io_policy
+from src.hardware.serialhandler.processSerialHandler import TELEMETRY_VALUES
+from src.hardware.serialhandler.threads.filehandler import FileHandler
+from src.hardware.serialhandler.threads.messageconverter import MessageConverter
+from src.hardware.serialhandler.threads.replyhandler import ReplyHandler
+from src.hardware.serialhandler.threads.commandhandler import CommandHandler, COMMAND_GAP, ENGINE_MESSAGES
+from src.utils.messages.messageHandlerAsyncSubscriber import messageHandlerAsyncSubscriber
+from src.utils.messages.messageHandlerSubscriber import messageHandlerSubscriber
+from src.utils.messages.messageHandlerSender import messageHandlerSender
+from src.statemachine.systemMode import SystemMode
+from src.utils.messages.allMessages import Klem, StateChange, SerialConnectionState
+from src.utils.sharedmemory.valueTable import ValueTable, TELEMETRY_TABLE
+
+
+class processAsyncSerialHandler(AsyncWorkerProcess):
+    """This process handle connection between NUCLEO and Raspberry PI, like processSerialHandler, with coroutines on one
+    event loop instead of the read and the write thread.\n
+    Args:
+        queueList (dictionar of multiprocessing.queues.Queue): Dictionar of queues where the ID is the type of messages.
+        logging (logging object): Made for debugging.
+        debugging (bool, optional): A flag for debugging. Defaults to False.
+        device (str, optional): The serial device, the first /dev/ttyACM* found when None. Defaults to None.
+
+    The serial port is registered with the event loop: a reply is parsed as soon as its bytes come, instead of at the next
+    100 Hz poll. Every message for NUCLEO has a coroutine of its own, waiting on its subscriber, which sends the commands
+    while the message is read in the current state of the car; the others wait for the Klem to change it. The replies and
+    the commands are handled by the same ReplyHandler and CommandHandler as the threads of processSerialHandler. A lost
+    connection is retried once a second. The commands are short, they are written without waiting for the port.
+    """
+
+    # ===================================== INIT =========================================
+    def __init__(self, queueList, logging, ready_event=None, debugging=False, device=None):
+        logFile = "temp/serial_history.log"
+
+        self.logger = logging
+        self.queuesList = queueList
+        self.debugging = debugging
+        self.device = device
+
+        # comm init
+        self.serialCon = None
+        self.serialConnected = False
+        self.serialDevice = None
+
+        self.stateChangeSubscriber = messageHandlerSubscriber(self.queuesList, StateChange, "lastOnly", True)
+
+        # log file init
+        self.historyFile = FileHandler(logFile)
+
+        super(processAsyncSerialHandler, self).__init__(self.queuesList, ready_event)
+
+    # ===================================== INIT TASKS =================================
+    def _init_tasks(self):
+        """Initializes the reading task and one writing task per message for NUCLEO."""
+        # the telemetry table is owned by this process, the senders of the replies write into it as well
+        self.valueTable = ValueTable.create(TELEMETRY_TABLE, TELEMETRY_VALUES)
+        self.serialConnectedSender = messageHandlerSender(self.queuesList, SerialConnectionState, valueTable=self.valueTable)
+        self.replies = ReplyHandler(self.queuesList, self.valueTable, self.logger, self.debugging, self.call_later)
+        self.commandHandler = CommandHandler()
+        self.messageConverter = MessageConverter()
+        # notified when a Klem changed the messages read
+        self.stateChanged = asyncio.Condition()
+
+        self._try_serial_connection()
+        if not self.serialConnected:
+            print(f"\033[1;97m[ Serial Handler ] :\033[0m \033[1;93mWARNING\033[0m - No serial connection found")
+        self.serialConnectedSender.send(self.serialConnected)
+        # EnableButton is latched, the gateway replays it to the subscribers coming later
+        self.replies.enableButtonSender.send(True)
+
+        self.tasks.append(self.write_commands(self.commandHandler.load_config("init")))
+        self.tasks.append(self._read_serial())
+        # the subscribers share the inbox of the process and wake up together when it is readable
+        for message in ENGINE_MESSAGES:
+            subscriber = messageHandlerAsyncSubscriber(self.queuesList, message, "lastOnly", True, inbox=True)
+            self.tasks.append(self._forward(message, subscriber))
+
+    # ===================================== SERIAL =======================================
+    def _try_serial_connection(self):
+        """Try to connect to the serial device."""
+        try:
+            self.serialDevice = self.device or next((port.device for port in serial.tools.list_ports.comports() if re.match(r"/dev/ttyACM\d+", port.device)), None)
+            self.serialCon = serial.Serial(self.serialDevice, 115200, timeout=0.1)
+            self.serialCon.reset_input_buffer()
+            self.serialCon.reset_output_buffer()
+            self.serialConnected = True
+            print(f"\033[1;97m[ Serial Handler ] :\033[0m \033[1;92mINFO\033[0m - Connected to \033[94m{self.serialDevice}\033[0m")
+
+        except (serial.SerialException, FileNotFoundError):
+            self._close_serial()
+
+    def _close_serial(self):
+        if self.serialCon is not None:
+            try:
+                release_readable(self.serialCon)
+                self.serialCon.close()
+            except Exception as e:
+                print(f"\033[1;97m[ Serial Handler ] :\033[0m \033[1;93mWARNING\033[0m - Error closing serial connection: {e}")
+        self.serialCon = None
+        self.serialConnected = False
+
+    def _handle_serial_disconnection(self, error):
+        """Closes a failed serial connection, the reading task retries it."""
+        if not self.serialConnected:
+            return
+        print(f"\033[1;97m[ Serial Handler ] :\033[0m \033[1;91mERROR\033[0m - {error}")
+        print(f"\033[1;97m[ Serial Handler ] :\033[0m \033[1;93mWARNING\033[0m - Serial device disconnected")
+        self._close_serial()
+        self.serialConnectedSender.send(False)
+
+    async def _read_serial(self):
+        """Reads the replies of NUCLEO as soon as they come, and tries to reconnect once a second while the connection is lost."""
+        while True:
+            if not self.serialConnected:
+                await asyncio.sleep(1)
+                self._try_serial_connection()
+                if self.serialConnected:
+                    self.serialConnectedSender.send(True)
+                continue
+
+            await self.wait_resumed()
+            serialCon = self.serialCon
+            try:
+                await wait_readable(serialCon)
+                if serialCon is not self.serialCon:
+                    continue
+                # a readable port without data is a lost device, reading it raises
+                data = serialCon.read(max(1, serialCon.in_waiting)).decode("ascii")
+            except Exception as e:
+                self._handle_serial_disconnection(f"Reading from serial ({e})")
+                continue
+
+            self.replies.feed(data)
+
+    # ==================================== SENDING =======================================
+    async def _forward(self, message, subscriber):
+        """Sends the commands for the messages of one subscriber, while the message is read in the current state of the car."""
+        while True:
+            await subscriber.wait()
+            await self.wait_resumed()
+            if not self.commandHandler.reads(message):
+                async with self.stateChanged:
+                    await self.stateChanged.wait_for(lambda: self.commandHandler.reads(message))
+
+            value = subscriber.receive_nowait()
+            if value is None:
+                continue
+            if self.debugging:
+                self.logger.info(value)
+            await self.write_commands(self.commandHandler.commands(message, value))
+
+            if message is Klem:
+                async with self.stateChanged:
+                    self.stateChanged.notify_all()
+
+    async def write_commands(self, commands):
+        """Sends the commands for one message, COMMAND_GAP seconds apart."""
+        for index, command in enumerate(commands):
+            if index:
+                await asyncio.sleep(COMMAND_GAP)
+            self.send_to_serial(command)
+
+    def send_to_serial(self, msg):
+        command_msg = self.messageConverter.get_command(**msg)
+        if command_msg == "error" or not self.serialConnected:
+            return
+        try:
+            self.serialCon.write(command_msg.encode("ascii")) # type: ignore
+            self.historyFile.write(command_msg)
+        except Exception as e:
+            self._handle_serial_disconnection(f"Failed to write to serial ({e})")
+
+    # ===================================== RUN ==========================================
+    def _place(self):
+        """Applies the placement, and its real time class, if any, to the thread running the event loop, the serial I/O."""
+        super(processAsyncSerialHandler, self)._place()
+        apply_io_policy(self.placement, type(self).__name__)
+
+    def run(self):
+        """Runs the tasks, then stops the car and closes the serial port."""
+        super(processAsyncSerialHandler, self).run()
+        self.send_to_serial({"action": "kl", "mode": 0})
+        self._close_serial()
+        self.historyFile.close()
+        self.valueTable.close()
+
+    # ================================ STATE CHANGE HANDLER ========================================
+    def state_change_handler(self):
+        message = self.stateChangeSubscriber.receive()
+        if message is not None:
+            modeDict = SystemMode[message].value["serial_handler"]["process"]
+
+            if modeDict["enabled"] == True:
+                self.resume_threads()
+
+            elif modeDict["enabled"] == False:
+                self.pause_threads()
+
+
+# =================================== EXAMPLE =========================================
+#             ++    THIS WILL RUN ONLY IF YOU RUN THE CODE FROM HERE  ++
+#                  in terminal:    python3 processAsyncSerialHandler.py
+
+if __name__ == "__main__":
+    from multiprocessing import Queue
+    import logging
+    import time
+
+    queueList = {
+        "Critical": Queue(),
+        "Warning": Queue(),
+        "General": Queue(),
+        "Config": Queue(),
+    }
+    logger = logging.getLogger()
+    process = processAsyncSerialHandler(queueList, logger)
+    process.daemon = True
+    process.start()
+    time.sleep(4)  # modify the value to increase/decrease the time of the example
+    process.stop()
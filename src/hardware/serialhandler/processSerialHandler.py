@@ -33,7 +33,6 @@ if __name__ == "__main__":
 import re
 import serial
 import serial.tools.list_ports
-import threading
 from threading import Lock
 
 from src.templates.workerprocess import WorkerProcess
@@ -43,7 +42,18 @@ from src.hardware.serialhandler.threads.threadWrite import threadWrite
 from src.utils.messages.messageHandlerSubscriber import messageHandlerSubscriber
 from src.utils.messages.messageHandlerSender import messageHandlerSender
 from src.statemachine.systemMode import SystemMode
-from src.utils.messages.allMessages import StateChange, SerialConnectionState
+from src.utils.messages.allMessages import (
+    StateChange,
+    SerialConnectionState,
+    CurrentSpeed,
+    CurrentSteer,
+    BatteryLvl,
+    InstantConsumption,
+)
+from src.utils.sharedmemory.valueTable import ValueTable, TELEMETRY_TABLE
+
+# the messages whose latest value is kept in the telemetry table, for the processes which only need the current state
+TELEMETRY_VALUES = (CurrentSpeed, CurrentSteer, BatteryLvl, InstantConsumption, SerialConnectionState)
 
 class processSerialHandler(WorkerProcess):
     """This process handle connection between NUCLEO and Raspberry PI.\n
@@ -52,10 +62,13 @@ class processSerialHandler(WorkerProcess):
         logging (logging object): Made for debugging.
         debugging (bool, optional): A flag for debugging. Defaults to False.
         example (bool, optional): A flag for running the example. Defaults to False.
+        device (str, optional): The serial device, the first /dev/ttyACM* found when None. Defaults to None.
+
+    processAsyncSerialHandler does the same work with coroutines on one event loop, see serialBenchmark.
     """
 
     # ===================================== INIT =========================================
-    def __init__(self, queueList, logging, ready_event=None, dashboard_ready=None, debugging=False, example=False):
+    def __init__(self, queueList, logging, ready_event=None, debugging=False, example=False, device=None):
         # devFile = "/dev/ttyACM0"
         logFile = "temp/serial_history.log"
 
@@ -63,7 +76,7 @@ class processSerialHandler(WorkerProcess):
         self.queuesList = queueList
         self.debugging = debugging
         self.example = example
-        self.dashboard_ready = dashboard_ready
+        self.device = device
 
         # comm init
         self.serialCon = None
@@ -73,7 +86,6 @@ class processSerialHandler(WorkerProcess):
         self.reconnecting = False
 
         self._init_subscribers()
-        self._init_senders()
 
         # log file init
         self.historyFile = FileHandler(logFile)
@@ -85,7 +97,7 @@ class processSerialHandler(WorkerProcess):
         self.serialConnectionStateSubscriber = messageHandlerSubscriber(self.queuesList, SerialConnectionState, "lastOnly", True)
 
     def _init_senders(self):
-        self.serialConnectedSender = messageHandlerSender(self.queuesList, SerialConnectionState)
+        self.serialConnectedSender = messageHandlerSender(self.queuesList, SerialConnectionState, valueTable=self.valueTable)
 
     def _safe_close_serial(self):
         """Safely close the serial connection with proper error handling."""
@@ -104,7 +116,7 @@ class processSerialHandler(WorkerProcess):
                 # clean up existing connection safely
                 self._safe_close_serial()
 
-                self.serialDevice = next((port.device for port in serial.tools.list_ports.comports() if re.match(r"/dev/ttyACM\d+", port.device)), None)
+                self.serialDevice = self.device or next((port.device for port in serial.tools.list_ports.comports() if re.match(r"/dev/ttyACM\d+", port.device)), None)
                 self.serialCon = serial.Serial(self.serialDevice, 115200, timeout=0.1)
                 self.serialCon.reset_input_buffer()
                 self.serialCon.reset_output_buffer()
@@ -117,7 +129,7 @@ class processSerialHandler(WorkerProcess):
                 self.serialConnected = False
 
     def _try_reconnect(self):
-        """Try to reconnect to serial device (called by timer)."""
+        """Try to reconnect to serial device (called by the scheduler of the process)."""
         if self.reconnecting:
             return # another reconnection attempt is already in progress
 
@@ -134,7 +146,7 @@ class processSerialHandler(WorkerProcess):
         else:
             # schedule next attempt
             self.reconnecting = False
-            threading.Timer(1, self._try_reconnect).start()
+            self.call_later(1, self._try_reconnect)
 
     def _reset_thread_error_states(self):
         """Reset error states in threads after successful reconnection."""
@@ -143,12 +155,6 @@ class processSerialHandler(WorkerProcess):
                 if hasattr(thread, 'last_error_time'):
                     thread.last_error_time = None
 
-    def _wait_for_dashboard_and_notify(self):
-        """Wait for dashboard to be ready, then notify connected state once without blocking init."""
-        self.dashboard_ready.wait()
-        if self.dashboard_ready.is_set():
-            self.serialConnectedSender.send(self.serialConnected)
-
 
     def _handle_serial_disconnection(self):
         """Handle serial disconnection by pausing threads and starting reconnection."""
@@ -171,25 +177,27 @@ class processSerialHandler(WorkerProcess):
             if self.threads:
                 self.pause_threads()
 
-            threading.Timer(1, self._try_reconnect).start()
+            self.call_later(1, self._try_reconnect)
 
     # ===================================== RUN ==========================================
     def run(self):
         """Apply the initializing methods and start the threads."""
+        # the telemetry table is owned by this process, the senders of the threads write into it as well
+        self.valueTable = ValueTable.create(TELEMETRY_TABLE, TELEMETRY_VALUES)
+        self._init_senders()
         self._try_serial_connection()
 
         if not self.serialConnected:
             print(f"\033[1;97m[ Serial Handler ] :\033[0m \033[1;93mWARNING\033[0m - No serial connection found")
-            threading.Timer(1, self._try_reconnect).start()
+            self.call_later(1, self._try_reconnect)
 
-        if self.dashboard_ready is not None:
-            if self.dashboard_ready.is_set():
-                self.serialConnectedSender.send(self.serialConnected)
-            else:
-                threading.Thread(target=self._wait_for_dashboard_and_notify, daemon=True).start()
+        # SerialConnectionState is latched: the current state replaces the one left by a previous run and reaches the dashboard
+        # whenever it subscribes. The state replayed to this process is read by process_work like any other one.
+        self.serialConnectedSender.send(self.serialConnected)
 
         super(processSerialHandler, self).run()
         self.historyFile.close()
+        self.valueTable.close()
 
     # ===================================== PROCESS WORK ==========================================
     def process_work(self):
@@ -255,7 +263,7 @@ if __name__ == "__main__":
     }
     logger = logging.getLogger()
     pipeRecv, pipeSend = Pipe(duplex=False)
-    process = processSerialHandler(queueList, logger, debugg, True)
+    process = processSerialHandler(queueList, logger, debugging=debugg, example=True)
     process.daemon = True
     process.start()
     time.sleep(4)  # modify the value to increase/decrease the time of the example
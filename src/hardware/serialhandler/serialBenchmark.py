@@ -0,0 +1,239 @@
+# Copyright (c) 2019, Bosch Engineering Center Cluj and BFMC organizers
+# All rights reserved.
+
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met:
+
+# 1. Redistributions of source code must retain the above copyright notice, this
+#    list of conditions and the following disclaimer.
+
+# 2. Redistributions in binary form must reproduce the above copyright notice,
+#    this list of conditions and the following disclaimer in the documentation
+#    and/or other materials provided with the distribution.
+
+# 3. Neither the name of the copyright holder nor the names of its
+#    contributors may be used to endorse or promote products derived from
+#    this software without specific prior written permission.
+
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS"
+# AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE
+# IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE
+# DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT HOLDER OR CONTRIBUTORS BE LIABLE
+# FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL
+# DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR
+# SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER
+# CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY,
+# OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE
+# OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE
+
+if __name__ == "__main__":
+    import sys
+    sys.path.insert(0, "../../..")
+
+import os
+import threading
+import time
+import logging
+from multiprocessing import Queue, Event
+from multiprocessing.connection import wait
+
+import psutil
+
+from src.gateway.processGateway import processGateway
+from src.hardware.serialhandler.processSerialHandler import processSerialHandler
+from src.hardware.serialhandler.processAsyncSerialHandler import processAsyncSerialHandler
+from src.templates.threadwithstop import ThreadWithStop
+from src.utils.messages.allMessages import CurrentSpeed, SpeedMotor, Klem
+from src.utils.histogram import Histogram
+from src.utils.messages.messageHandlerSender import messageHandlerSender
+from src.utils.messages.messageHandlerSubscriber import messageHandlerSubscriber
+
+# the handlers compared, each one is started on its own pseudo terminal
+HANDLERS = {"threads": processSerialHandler, "async": processAsyncSerialHandler}
+
+
+class FakeNucleo(ThreadWithStop):
+    """The NUCLEO end of a pseudo terminal, the serial handler opening the other end as its device.\n
+    Args:
+        rate (float): The speed replies sent per second.
+
+    The replies are numbered, the time each one was written is kept for the latency of the replies. The commands are read
+    by a thread of their own, blocked on the terminal, and the time the first command with a given speed came is kept.
+    """
+
+    def __init__(self, rate):
+        super(FakeNucleo, self).__init__(period=1 / rate)
+        self.master, self.slave = os.openpty()
+        self.device = os.ttyname(self.slave)
+        self.counter = 0
+        # {reply number: monotonic time written}
+        self.sent = {}
+        # {speed: monotonic time of the first command with it}
+        self.commands = {}
+        self.reader = threading.Thread(target=self._read_commands, daemon=True)
+
+    def start(self):
+        self.reader.start()
+        super(FakeNucleo, self).start()
+
+    def thread_work(self):
+        self.counter += 1
+        self.sent[self.counter] = time.monotonic()
+        os.write(self.master, b"@speed:%d;;" % self.counter)
+
+    def _read_commands(self):
+        buffer = b""
+        while True:
+            try:
+                data = os.read(self.master, 4096)
+            except OSError:
+                return
+            now = time.monotonic()
+            buffer += data
+            while b";;\r\n" in buffer:
+                command, buffer = buffer.split(b";;\r\n", 1)
+                if command.startswith(b"#speed:"):
+                    self.commands.setdefault(int(command[7:].rstrip(b";")), now)
+
+    def stop(self):
+        super(FakeNucleo, self).stop()
+        self.join(1)
+        os.close(self.master)
+        os.close(self.slave)
+
+
+def benchmark(name, queueList, duration, replyRate, commandRate):
+    """Runs one handler against a FakeNucleo: the speed replies go through the handler and the gateway to a subscriber here,
+    the SpeedMotor commands sent from here go through the handler to the terminal.
+
+    Returns:
+        dict: The measurements of the handler.
+    """
+    nucleo = FakeNucleo(replyRate)
+    nucleo.start()
+    ready = Event()
+    handler = HANDLERS[name](queueList, logging.getLogger(), ready_event=ready, device=nucleo.device)
+    handler.start()
+    ready.wait(5)
+
+    speedSubscriber = messageHandlerSubscriber(queueList, CurrentSpeed, "fifo", True)
+    speedMotorSender = messageHandlerSender(queueList, SpeedMotor)
+    messageHandlerSender(queueList, Klem).send("30")
+    # the Klem and its sensor toggles reach NUCLEO, the direct SpeedMotor channel reaches the sender
+    time.sleep(1)
+    speedSubscriber.empty()
+
+    process = psutil.Process(handler.pid)
+    cpuBefore = sum(process.cpu_times()[:2])
+    switchesBefore = sum(process.num_ctx_switches())
+    replyLatency = Histogram()
+    commandLatency = Histogram()
+    replies = 0
+    # {speed: monotonic time sent}
+    commandsSent = {}
+    interval = 1 / commandRate
+    start = nextCommand = time.monotonic()
+    end = start + duration
+
+    while True:
+        now = time.monotonic()
+        if now >= end:
+            break
+        if now >= nextCommand:
+            # the speeds take 3 digits, a speed is sent again only after the other ones
+            speed = len(commandsSent) % 499 + 1
+            if speed in commandsSent:
+                break
+            commandsSent[speed] = time.monotonic()
+            speedMotorSender.send(str(speed))
+            nextCommand += interval
+        if wait([speedSubscriber], max(0.0, min(nextCommand, end) - time.monotonic())):
+            value = speedSubscriber.receive()
+            received = time.monotonic()
+            sent = nucleo.sent.get(int(value)) if value is not None else None
+            if sent is not None:
+                replyLatency.add(received - sent)
+                replies += 1
+    elapsed = time.monotonic() - start
+
+    time.sleep(0.2)
+    cpu = sum(process.cpu_times()[:2]) - cpuBefore
+    switches = sum(process.num_ctx_switches()) - switchesBefore
+    threads = process.num_threads()
+    for speed, sent in commandsSent.items():
+        arrived = nucleo.commands.get(speed)
+        if arrived is not None:
+            commandLatency.add(arrived - sent)
+
+    speedSubscriber.unsubscribe()
+    handler.stop()
+    handler.join(3)
+    nucleo.stop()
+
+    return {
+        "handler": name,
+        "replies": replies / elapsed,
+        "replyLatency": replyLatency.summary(),
+        "commands": commandLatency.count / max(1, len(commandsSent)),
+        "commandLatency": commandLatency.summary(),
+        "cpu": cpu / elapsed,
+        "switches": switches / elapsed,
+        "threads": threads,
+    }
+
+
+def render(results):
+    """Returns the table of the measurements, the latencies in milliseconds."""
+    lines = ["%-8s %10s %9s %9s %10s %9s %9s %7s %10s %8s" % (
+        "handler", "replies/s", "rep p50", "rep p99", "commands", "cmd p50", "cmd p99", "CPU", "switches/s", "threads"
+    )]
+    for result in results:
+        lines.append("%-8s %10.1f %9.3f %9.3f %9.1f%% %9.3f %9.3f %6.1f%% %10.0f %8d" % (
+            result["handler"],
+            result["replies"],
+            result["replyLatency"]["p50"],
+            result["replyLatency"]["p99"],
+            result["commands"] * 100,
+            result["commandLatency"]["p50"],
+            result["commandLatency"]["p99"],
+            result["cpu"] * 100,
+            result["switches"],
+            result["threads"],
+        ))
+    return "\n".join(lines)
+
+
+# =================================== EXAMPLE =========================================
+#             ++    THIS WILL RUN ONLY IF YOU RUN THE CODE FROM HERE  ++
+#                  in terminal:    python3 serialBenchmark.py
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Compares processSerialHandler and processAsyncSerialHandler on a pseudo terminal.")
+    parser.add_argument("--duration", type=float, default=5.0, help="seconds measured per handler")
+    parser.add_argument("--replies", type=float, default=200.0, help="speed replies sent by the fake NUCLEO per second")
+    parser.add_argument("--commands", type=float, default=50.0, help="SpeedMotor commands sent per second")
+    parser.add_argument("--handlers", nargs="+", choices=list(HANDLERS), default=list(HANDLERS), help="the handlers measured")
+    arguments = parser.parse_args()
+
+    # the handlers read their configuration relative to the root of the repository
+    os.chdir("../../..")
+    queueList = {
+        "Critical": Queue(),
+        "Warning": Queue(),
+        "General": Queue(),
+        "Config": Queue(),
+    }
+    gateway = processGateway(queueList, logging.getLogger())
+    gateway.start()
+    time.sleep(0.5)
+
+    results = []
+    try:
+        for name in arguments.handlers:
+            results.append(benchmark(name, queueList, arguments.duration, arguments.replies, arguments.commands))
+    finally:
+        gateway.stop()
+        gateway.join(3)
+    print(render(results))
@@ -0,0 +1,141 @@
+# Copyright (c) 2019, Bosch Engineering Center Cluj and BFMC organizers
+# All rights reserved.
+
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met:
+
+# 1. Redistributions of source code must retain the above copyright notice, this
+#    list of conditions and the following disclaimer.
+
+# 2. Redistributions in binary form must reproduce the above copyright notice,
+#    this list of conditions and the following disclaimer in the documentation
+#    and/or other materials provided with the distribution.
+
+# 3. Neither the name of the copyright holder nor the names of its
+#    contributors may be used to endorse or promote products derived from
+#    this software without specific prior written permission.
+
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS"
+# AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE
+# IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE
+# DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT HOLDER OR CONTRIBUTORS BE LIABLE
+# FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL
+# DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR
+# SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER
+# CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY,
+# OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE
+# OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE
+import json
+
+from src.utils.messages.allMessages import (
+    Klem,
+    Control,
+    SteerMotor,
+    SpeedMotor,
+    Brake,
+    ToggleBatteryLvl,
+    ToggleImuData,
+    ToggleInstant,
+    ToggleResourceMonitor,
+    ControlCalib,
+    IsAlive,
+    RequestSteerLimits
+)
+
+# the messages read in each state of the car, in the order they are read; a message not read in the current state waits in its pipe
+STOPPED_MESSAGES = (Klem, IsAlive, RequestSteerLimits)
+RUNNING_MESSAGES = STOPPED_MESSAGES + (ToggleInstant, ToggleBatteryLvl, ToggleResourceMonitor, ToggleImuData)
+ENGINE_MESSAGES = STOPPED_MESSAGES + (Brake, SpeedMotor, SteerMotor, Control, ControlCalib) + RUNNING_MESSAGES[len(STOPPED_MESSAGES):]
+
+# the pause, in seconds, between the commands sent for one message, so NUCLEO applies the sensor toggles one by one
+COMMAND_GAP = 0.05
+
+_COMMANDS = {
+    IsAlive: lambda value: {"action": "alive", "activate": 0},
+    RequestSteerLimits: lambda value: {"action": "steerLimits", "request": 0},
+    Brake: lambda value: {"action": "brake", "steerAngle": int(value)},
+    SpeedMotor: lambda value: {"action": "speed", "speed": int(value)},
+    SteerMotor: lambda value: {"action": "steer", "steerAngle": int(value)},
+    Control: lambda value: {"action": "vcd", "time": int(value["Time"]), "speed": int(value["Speed"]), "steer": int(value["Steer"])},
+    ControlCalib: lambda value: {"action": "vcdCalib", "time": int(value["Time"]), "speed": int(value["Speed"]), "steer": int(value["Steer"])},
+    ToggleInstant: lambda value: {"action": "instant", "activate": int(value)},
+    ToggleBatteryLvl: lambda value: {"action": "battery", "activate": int(value)},
+    ToggleResourceMonitor: lambda value: {"action": "resourceMonitor", "activate": int(value)},
+    ToggleImuData: lambda value: {"action": "imu", "activate": int(value)},
+}
+
+
+class CommandHandler:
+    """This class turn the messages for NUCLEO into its commands and keep the state of the car (the Klem) they lead to.
+    It is used by threadWrite and by processAsyncSerialHandler, which send the commands to the serial port.\n
+
+    Args:
+        configPath (str, optional): The table with the state of the sensors, sent to NUCLEO. Defaults to "src/utils/table_state.json".
+    """
+
+    def __init__(self, configPath="src/utils/table_state.json"):
+        self.configPath = configPath
+        self.running = False
+        self.engineEnabled = False
+
+    def messages(self):
+        """Returns the messages read in the current state of the car."""
+        if not self.running:
+            return STOPPED_MESSAGES
+        if not self.engineEnabled:
+            return RUNNING_MESSAGES
+        return ENGINE_MESSAGES
+
+    def reads(self, message):
+        """Checks if a message is read in the current state of the car."""
+        return message in self.messages()
+
+    def commands(self, message, value):
+        """Returns the commands for a message received, a Klem also changes the state of the car.
+
+        Args:
+            message (enum): The message, one of ENGINE_MESSAGES.
+            value: The value received.
+
+        Returns:
+            list(dict): The commands, as MessageConverter.get_command takes them, sent COMMAND_GAP seconds apart.
+        """
+        if message is not Klem:
+            return [_COMMANDS[message](value)]
+
+        if value == "30":
+            self.running = True
+            self.engineEnabled = True
+            return [{"action": "kl", "mode": 30}] + self.load_config("sensors")
+        elif value == "15":
+            self.running = True
+            self.engineEnabled = False
+            return [{"action": "kl", "mode": 15}] + self.load_config("sensors")
+        elif value == "0":
+            self.running = False
+            self.engineEnabled = False
+            return [{"action": "kl", "mode": 0}]
+        return []
+
+    def load_config(self, configType):
+        """Returns the commands of the battery capacity ("init") or of the sensor toggles (any other configType)."""
+        with open(self.configPath, "r") as file:
+            data = json.load(file)
+
+        if configType == "init":
+            capacity = data["init"]["batteryCapacity"]["capacity"]
+            return [{"action": "batteryCapacity", "capacity": capacity}]
+
+        commands = []
+        toggle_keys = [
+            "ToggleInstant",
+            "ToggleBatteryLvl",
+            "ToggleImuData",
+            "ToggleResourceMonitor",
+        ]
+        for key in toggle_keys:
+            toggle = data[key]
+            value_str = toggle["value"]
+            value = 0 if str(value_str) == "False" else 1
+            commands.append({"action": toggle["command"], "activate": value})
+        return commands
@@ -0,0 +1,221 @@
+# Copyright (c) 2019, Bosch Engineering Center Cluj and BFMC organizers
+# All rights reserved.
+
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met:
+
+# 1. Redistributions of source code must retain the above copyright notice, this
+#    list of conditions and the following disclaimer.
+
+# 2. Redistributions in binary form must reproduce the above copyright notice,
+#    this list of conditions and the following disclaimer in the documentation
+#    and/or other materials provided with the distribution.
+
+# 3. Neither the name of the copyright holder nor the names of its
+#    contributors may be used to endorse or promote products derived from
+#    this software without specific prior written permission.
+
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS"
+# AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE
+# IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE
+# DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT HOLDER OR CONTRIBUTORS BE LIABLE
+# FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL
+# DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR
+# SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER
+# CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY,
+# OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE
+# OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE
+import os
+import re
+import time
+
+from src.utils.messages.allMessages import (
+    BatteryLvl,
+    ImuData,
+    ImuAck,
+    InstantConsumption,
+    EnableButton,
+    ResourceMonitor,
+    CurrentSpeed,
+    CurrentSteer,
+    ShutDownSignal,
+    SerialConnectionState,
+    CalibPWMData,
+    CalibRunDone,
+    SteeringLimits,
+    AliveSignal
+)
+from src.utils.messages.messageHandlerSender import messageHandlerSender
+
+
+class ReplyHandler:
+    """This class turn the replies that NUCLEO send to Raspberry PI into messages. It is used by threadRead and by
+    processAsyncSerialHandler.\n
+
+    Args:
+        queueList (dictionar of multiprocessing.queues.Queue): Dictionar of queues where the ID is the type of messages.
+        valueTable (ValueTable): The telemetry table of the process, where the current state is also written.
+        logger (logging object): Made for debugging.
+        debugger (bool, optional): A flag for debugging. Defaults to False.
+        callLater (function, optional): call_later of the process, calls callback() in delay seconds without blocking the
+            reader, used for the shutdown asked by NUCLEO. Defaults to None, the reader waits itself.
+    """
+
+    def __init__(self, queueList, valueTable, logger, debugger=False, callLater=None):
+        self.queuesList = queueList
+        self.logger = logger
+        self.debugger = debugger
+        self.buffer = ""
+        self.callLater = callLater
+        self._init_senders(valueTable)
+
+        self.expectedValues = {"kl": "0, 15 or 30", "instant": "1 or 0", "battery": "1 or 0",
+                               "resourceMonitor": "1 or 0", "imu": "1 or 0", "steer" : "between -25 and 25",
+                               "speed": "between -500 and 500", "break": "between -250 and 250"}
+
+        self.warningPattern = r'^(-?[0-9]+)H(-?[0-5]?[0-9])M(-?[0-5]?[0-9])S$'
+        self.resourceMonitorPattern = r'Heap \((\d+\.\d+)\);Stack \((\d+\.\d+)\)'
+
+    def _init_senders(self, valueTable):
+        self.enableButtonSender = messageHandlerSender(self.queuesList, EnableButton)
+        self.batteryLvlSender = messageHandlerSender(self.queuesList, BatteryLvl, valueTable=valueTable)
+        self.instantConsumptionSender = messageHandlerSender(self.queuesList, InstantConsumption, valueTable=valueTable)
+        self.imuDataSender = messageHandlerSender(self.queuesList, ImuData)
+        self.imuAckSender = messageHandlerSender(self.queuesList, ImuAck)
+        self.resourceMonitorSender = messageHandlerSender(self.queuesList, ResourceMonitor)
+        self.currentSpeedSender = messageHandlerSender(self.queuesList, CurrentSpeed, valueTable=valueTable)
+        self.currentSteerSender = messageHandlerSender(self.queuesList, CurrentSteer, valueTable=valueTable)
+        self.warningSender = messageHandlerSender(self.queuesList, ShutDownSignal)
+        self.serialConnectionStateSender = messageHandlerSender(self.queuesList, SerialConnectionState, valueTable=valueTable)
+        self.calibPWMDataSender = messageHandlerSender(self.queuesList, CalibPWMData)
+        self.calibRunDoneSender = messageHandlerSender(self.queuesList, CalibRunDone)
+        self.steeringLimitsSender = messageHandlerSender(self.queuesList, SteeringLimits)
+        self.aliveSignalSender = messageHandlerSender(self.queuesList, AliveSignal)
+
+    # ==================================== SENDING =======================================
+    def feed(self, data):
+        """Adds the data read from the serial port to the buffer and sends the replies completed by it."""
+        self.buffer += data
+
+        while ";;" in self.buffer:
+            msg, self.buffer = self.buffer.split(";;", 1)
+
+            if msg.strip():
+                try:
+                    self.send_queue(msg.strip())
+                except Exception as e:
+                    print(f"\033[1;97m[ Serial Handler ] :\033[0m \033[1;91mERROR\033[0m - Processing message \033[94m{msg.strip()}\033[0m ({e})")
+
+    def send_queue(self, buff):
+        """This function select which type of message we receive from NUCLEO and send the data further."""
+
+        if '@' in buff and ':' in buff:
+            action, value = buff.split(":")
+            action = re.sub(r'[^a-zA-Z0-9]', '', action)
+            if self.debugger:
+                self.logger.info(buff)
+
+            if action == "imu":
+                splittedValue = value.split(";")
+                if(len(buff)>20):
+                    data = {
+                        "roll": splittedValue[0],
+                        "pitch": splittedValue[1],
+                        "yaw": splittedValue[2],
+                        "accelx": splittedValue[3],
+                        "accely": splittedValue[4],
+                        "accelz": splittedValue[5],
+                    }
+                    self.imuDataSender.send(str(data))
+                else:
+                    self.imuAckSender.send(splittedValue[0])
+
+            elif action == "brake":
+                self.currentSpeedSender.send(0.0)
+                self.currentSteerSender.send(0.0)
+
+            elif action == "speed":
+                speed = value.split(",")[0]
+                if (lambda v: (lambda: float(v), True)[1] if isinstance(v, str) else False)(speed):
+                    self.currentSpeedSender.send(float(speed))
+
+            elif action == "steer":
+                steer = value.split(",")[0]
+                if (lambda v: (lambda: float(v), True)[1] if isinstance(v, str) else False)(steer):
+                    self.currentSteerSender.send(float(steer))
+
+            elif action == "vcdCalib":
+                splittedValue = value.split(";")
+                speedPWM = splittedValue[0]
+                steerPWM = splittedValue[1]
+                
+                if speedPWM == "0" and steerPWM == "0":
+                    self.calibRunDoneSender.send(True)
+                else:
+                    self.calibPWMDataSender.send({"speedPWM": speedPWM, "steerPWM": steerPWM})
+
+            elif action == "alive":
+                self.aliveSignalSender.send(True)
+
+            elif action == "steerLimits":
+                splittedValue = value.split(";")
+                lowerLimit = splittedValue[0]
+                upperLimit = splittedValue[1]
+                self.steeringLimitsSender.send({"lowerLimit": lowerLimit, "upperLimit": upperLimit})
+                
+            elif action == "instant":
+                if self.check_valid_value(action, value):
+                    self.instantConsumptionSender.send(float(value))
+
+            elif action == "battery":
+                if self.check_valid_value(action, value):
+                    percentage = (int(value)-7000)/14
+                    percentage = max(0, min(100, round(percentage)))
+
+                    self.batteryLvlSender.send(percentage)
+
+            elif action == "resourceMonitor":
+                if self.check_valid_value(action, value):
+                    data = re.match(self.resourceMonitorPattern, value)
+                    if data:
+                        message = {"heap": data.group(1), "stack": data.group(2)}
+                        self.resourceMonitorSender.send(message)
+
+            elif action == "warning":
+                data = re.match(self.warningPattern, value)
+                if data:
+                    print(f"\033[1;97m[ Serial Handler ] :\033[0m \033[1;93mWARNING\033[0m - Shutdown in \033[94m{data.group(1)}h {data.group(2)}m {data.group(3)}s\033[0m")
+                    self.warningSender.send(data)
+                    
+            elif action == "shutdown":
+                print(f"\033[1;97m[ Serial Handler ] :\033[0m \033[1;93mWARNING\033[0m - \033[94mShutting down now!\033[0m")
+                if self.callLater is not None:
+                    self.callLater(3, self.shutdown)
+                else:
+                    time.sleep(3)
+                    self.shutdown()
+
+    def shutdown(self):
+        """Shuts the Raspberry PI down, as asked by NUCLEO."""
+        os.system("sudo shutdown -h now")
+            
+    def check_valid_value(self, action, message):
+        if message == "syntax error":
+            print(f"\033[1;97m[ Serial Handler ] :\033[0m \033[1;93mWARNING\033[0m - Invalid \033[94m{action.upper()}\033[0m value (expected {self.expectedValues[action]})")
+            return False
+    
+        if message == "kl 15/30 is required!!":
+            print(f"\033[1;97m[ Serial Handler ] :\033[0m \033[1;93mWARNING\033[0m - KL 15/30 required for \033[94m{action.upper()}\033[0m")
+            return False
+        
+        if message == "ack":
+            return False
+        return True
+    
+    def is_float(self, string):
+        try:
+            float(string)
+        except ValueError:
+            return False
+
+        return True
@@ -26,29 +26,26 @@
 # OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE
 # OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE
 
-import json
-import threading
 import time
 from datetime import datetime, timedelta
 
 from src.hardware.serialhandler.threads.messageconverter import MessageConverter
+from src.hardware.serialhandler.threads.commandhandler import (
+    CommandHandler,
+    COMMAND_GAP,
+    STOPPED_MESSAGES,
+    RUNNING_MESSAGES,
+    ENGINE_MESSAGES,
+)
 from src.templates.threadwithstop import ThreadWithStop
+from src.templates.placement import apply_io_policy
 from src.utils.messages.allMessages import (
-    Klem,
-    Control,
     SteerMotor,
     SpeedMotor,
-    Brake,
-    ToggleBatteryLvl,
-    ToggleImuData,
-    ToggleInstant,
-    ToggleResourceMonitor,
     SerialConnectionState,
-    ControlCalib,
-    IsAlive,
-    RequestSteerLimits
 )
 from src.utils.messages.messageHandlerSubscriber import messageHandlerSubscriber
+from src.utils.messages.subscriberGroup import SubscriberGroup
 from src.utils.messages.messageHandlerSender import messageHandlerSender
 
 
@@ -64,7 +61,8 @@ class threadWrite(ThreadWithStop):
 
     # ===================================== INIT =========================================
     def __init__(self, process, logFile, queues, logger, debugger = False, example=False):
-        super(threadWrite, self).__init__(pause=0.001)
+        # the thread blocks inside thread_work until a subscriber has a message, so there is no pause between the cycles
+        super(threadWrite, self).__init__(pause=0)
         self.process = process
         self.queuesList = queues
         self.logFile = logFile
@@ -72,18 +70,17 @@ class threadWrite(ThreadWithStop):
         self.logger = logger
         self.debugger = debugger
 
-        self.running = False
-        self.engineEnabled = False
+        # the commands and the state of the car are kept by a handler shared with processAsyncSerialHandler
+        self.commandHandler = CommandHandler()
         self.messageConverter = MessageConverter()
         self.steerMotorSender = messageHandlerSender(self.queuesList, SteerMotor)
         self.speedMotorSender = messageHandlerSender(self.queuesList, SpeedMotor)
-        self.configPath = "src/utils/table_state.json"
 
         # error rate limiting
         self.last_error_time = None
         self.error_cooldown = timedelta(seconds=3)
 
-        self.load_config("init")
+        self.write_commands(self.commandHandler.load_config("init"))
         self._init_subscribers()
         self._init_senders()
 
@@ -92,24 +89,22 @@ class threadWrite(ThreadWithStop):
             self.j = -1.0
             self.s = 0.0
             self.example()
+            self.call_every(0.01, self.example)
 
     def _init_subscribers(self):
-        """Subscribe function. In this function we make all the required subscribe to process gateway"""
-        self.klSubscriber = messageHandlerSubscriber(self.queuesList, Klem, "lastOnly", True)
-        self.controlSubscriber = messageHandlerSubscriber(self.queuesList, Control, "lastOnly", True)
-        self.steerMotorSubscriber = messageHandlerSubscriber(self.queuesList, SteerMotor, "lastOnly", True)
-        self.speedMotorSubscriber = messageHandlerSubscriber(self.queuesList, SpeedMotor, "lastOnly", True)
-        self.brakeSubscriber = messageHandlerSubscriber(self.queuesList, Brake, "lastOnly", True)
-        self.instantSubscriber = messageHandlerSubscriber(self.queuesList, ToggleInstant, "lastOnly", True)
-        self.batterySubscriber = messageHandlerSubscriber(self.queuesList, ToggleBatteryLvl, "lastOnly", True)
-        self.resourceMonitorSubscriber = messageHandlerSubscriber(self.queuesList, ToggleResourceMonitor, "lastOnly", True)
-        self.imuSubscriber = messageHandlerSubscriber(self.queuesList, ToggleImuData, "lastOnly", True)
-        self.controlCalibSubscriber = messageHandlerSubscriber(self.queuesList, ControlCalib, "lastOnly", True)
-        self.isAliveSubscriber = messageHandlerSubscriber(self.queuesList, IsAlive, "lastOnly", True)
-        self.requestSteerLimitsSubscriber = messageHandlerSubscriber(self.queuesList, RequestSteerLimits, "lastOnly", True)
-        
+        """Subscribe function. In this function we make all the required subscribe to process gateway.
+        They share the inbox of the process, the direct topics (SteerMotor, SpeedMotor, Brake) keep a pipe of their own."""
+        self.subscribers = {}
+        for message in ENGINE_MESSAGES:
+            self.subscribers[message] = messageHandlerSubscriber(self.queuesList, message, "lastOnly", True, inbox=True)
+
+        # the subscribers read in each state, a message of a subscriber not read in the current state waits in its pipe
+        self.groups = {}
+        for messages in (STOPPED_MESSAGES, RUNNING_MESSAGES, ENGINE_MESSAGES):
+            self.groups[messages] = SubscriberGroup([self.subscribers[message] for message in messages])
+
     def _init_senders(self):
-        self.serialConnectionStateSender = messageHandlerSender(self.queuesList, SerialConnectionState)
+        self.serialConnectionStateSender = messageHandlerSender(self.queuesList, SerialConnectionState, valueTable=self.process.valueTable)
 
     # ==================================== SENDING =======================================
 
@@ -128,29 +123,12 @@ class threadWrite(ThreadWithStop):
                     self.serialConnectionStateSender.send(False)
                     print(f"\033[1;97m[ Serial Handler ] :\033[0m \033[1;91mERROR\033[0m - Failed to write to serial ({e})")
 
-    def load_config(self, configType):
-        with open(self.configPath, "r") as file:
-            data = json.load(file)
-
-        if configType == "init":
-            capacity = data["init"]["batteryCapacity"]["capacity"]
-            command = {"action": "batteryCapacity", "capacity": capacity}
+    def write_commands(self, commands):
+        """Sends the commands for one message, COMMAND_GAP seconds apart."""
+        for index, command in enumerate(commands):
+            if index:
+                time.sleep(COMMAND_GAP)
             self.send_to_serial(command)
-        else:
-            toggle_keys = [
-                "ToggleInstant",
-                "ToggleBatteryLvl",
-                "ToggleImuData",
-                "ToggleResourceMonitor",
-            ]
-            for key in toggle_keys:
-                toggle = data[key]
-                value_str = toggle["value"]
-                value = 0 if str(value_str) == "False" else 1
-                command_name = toggle["command"]
-                command = {"action": command_name, "activate": value}
-                self.send_to_serial(command)
-                time.sleep(0.05)
 
     def convert_fc(self,instantRecv):
         if instantRecv =="True":
@@ -160,118 +138,23 @@ class threadWrite(ThreadWithStop):
         
     # ===================================== RUN ==========================================
     def thread_work(self):
-        """In this function we check if we got the enable engine signal. After we got it we will start getting messages from raspberry PI. It will transform them into NUCLEO commands and send them."""
-        try:
-            klRecv = self.klSubscriber.receive()
-            if klRecv is not None:
-                if self.debugger:
-                    self.logger.info(klRecv)
-                if klRecv == "30":
-                    self.running = True
-                    self.engineEnabled = True
-                    command = {"action": "kl", "mode": 30}
-                    self.send_to_serial(command)
-                    self.load_config("sensors")
-                elif klRecv == "15":
-                    self.running = True
-                    self.engineEnabled = False
-                    command = {"action": "kl", "mode": 15}
-                    self.send_to_serial(command)
-                    self.load_config("sensors")
-                elif klRecv == "0":
-                    self.running = False
-                    self.engineEnabled = False
-                    command = {"action": "kl", "mode": 0}
-                    self.send_to_serial(command)
-
-            isAliveRecv = self.isAliveSubscriber.receive()
-            if isAliveRecv is not None:
-                if self.debugger:
-                    self.logger.info(isAliveRecv)
-                command = {"action": "alive", "activate": 0}
-                self.send_to_serial(command)
-
-            requestSteerLimitsRecv = self.requestSteerLimitsSubscriber.receive()
-            if requestSteerLimitsRecv is not None:
-                if self.debugger:
-                    self.logger.info(requestSteerLimitsRecv)
-                command = {"action": "steerLimits", "request": 0}
-                self.send_to_serial(command)
-
-            if self.running:
-                if self.engineEnabled:
-                    brakeRecv = self.brakeSubscriber.receive()
-                    if brakeRecv is not None:
-                        if self.debugger:
-                            self.logger.info(brakeRecv)
-                        command = {"action": "brake", "steerAngle": int(brakeRecv)}
-                        self.send_to_serial(command)
-
-                    speedRecv = self.speedMotorSubscriber.receive()
-                    if speedRecv is not None: 
-                        if self.debugger:
-                            self.logger.info(speedRecv)
-                        command = {"action": "speed", "speed": int(speedRecv)}
-                        self.send_to_serial(command)
-
-                    steerRecv = self.steerMotorSubscriber.receive()
-                    if steerRecv is not None:
-                        if self.debugger:
-                            self.logger.info(steerRecv) 
-                        command = {"action": "steer", "steerAngle": int(steerRecv)}
-                        self.send_to_serial(command)
+        """In this function we check if we got the enable engine signal. After we got it we will start getting messages from raspberry PI. It will transform them into NUCLEO commands and send them.
+        It blocks until a subscriber read in the current state has a message, at most 0.1 s so the stop flag is checked."""
+        ready = frozenset(self.groups[self.commandHandler.messages()].wait(0.1))
+        if not ready:
+            return
 
-                    controlRecv = self.controlSubscriber.receive()
-                    if controlRecv is not None:
-                        if self.debugger:
-                            self.logger.info(controlRecv) 
-                        command = {
-                            "action": "vcd",
-                            "time": int(controlRecv["Time"]),
-                            "speed": int(controlRecv["Speed"]),
-                            "steer": int(controlRecv["Steer"]),
-                        }
-                        self.send_to_serial(command)
-
-                    controlCalibRecv = self.controlCalibSubscriber.receive()
-                    if controlCalibRecv is not None:
-                        if self.debugger:
-                            self.logger.info(controlCalibRecv) 
-                        command = {
-                            "action": "vcdCalib",
-                            "time": int(controlCalibRecv["Time"]),
-                            "speed": int(controlCalibRecv["Speed"]),
-                            "steer": int(controlCalibRecv["Steer"]),
-                        }
-                        self.send_to_serial(command)
-
-                instantRecv = self.instantSubscriber.receive()
-                if instantRecv is not None: 
-                    if self.debugger:
-                        self.logger.info(instantRecv) 
-                    command = {"action": "instant", "activate": int(instantRecv)}
-                    self.send_to_serial(command)
-
-                batteryRecv = self.batterySubscriber.receive()
-                if batteryRecv is not None: 
-                    if self.debugger:
-                        self.logger.info(batteryRecv)
-                    command = {"action": "battery", "activate": int(batteryRecv)}
-                    self.send_to_serial(command)
-
-                resourceMonitorRecv = self.resourceMonitorSubscriber.receive()
-                if resourceMonitorRecv is not None: 
-                    if self.debugger:
-                        self.logger.info(resourceMonitorRecv)
-                    command = {"action": "resourceMonitor", "activate": int(resourceMonitorRecv)}
-                    self.send_to_serial(command)
-
-                imuRecv = self.imuSubscriber.receive()
-                if imuRecv is not None: 
+        try:
+            # a Klem read first changes the messages read after it
+            for message in ENGINE_MESSAGES:
+                subscriber = self.subscribers[message]
+                if subscriber not in ready or not self.commandHandler.reads(message):
+                    continue
+                value = subscriber.receive()
+                if value is not None:
                     if self.debugger:
-                        self.logger.info(imuRecv)
-                    command = {"action": "imu", "activate": int(imuRecv)}
-                    self.send_to_serial(command)
+                        self.logger.info(value)
+                    self.write_commands(self.commandHandler.commands(message, value))
 
         except Exception as e:
             print(f"\033[1;97m[ Serial Handler ] :\033[0m \033[1;91mERROR\033[0m - {e}")
@@ -281,6 +164,11 @@ class threadWrite(ThreadWithStop):
     def start(self):
         super(threadWrite, self).start()
 
+    def run(self):
+        # the commands to the NUCLEO are the I/O the real time class of the placement is for, if any
+        apply_io_policy(self.process.placement, "threadWrite")
+        super(threadWrite, self).run()
+
     # ==================================== STOP ==========================================
     def stop(self):
         """This function will close the thread and will stop the car."""
@@ -305,7 +193,6 @@ class threadWrite(ThreadWithStop):
                 self.i = -21.0
                 self.s = self.i / 7
                 self.j *= -1.0
-            threading.Timer(0.01, self.example).start()
 
     def _should_send_error(self):
         """Check if we should send an error message (rate limiting)."""
@@ -0,0 +1,209 @@
+# Copyright (c) 2019, Bosch Engineering Center Cluj and BFMC organizers
+# All rights reserved.
+
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met:
+
+# 1. Redistributions of source code must retain the above copyright notice, this
+#    list of conditions and the following disclaimer.
+
+# 2. Redistributions in binary form must reproduce the above copyright notice,
+#    this list of conditions and the following disclaimer in the documentation
+#    and/or other materials provided with the distribution.
+
+# 3. Neither the name of the copyright holder nor the names of its
+#    contributors may be used to endorse or promote products derived from
+#    this software without specific prior written permission.
+
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS"
+# AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE
+# IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE
+# DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT HOLDER OR CONTRIBUTORS BE LIABLE
+# FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL
+# DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR
+# SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER
+# CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY,
+# OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE
+# OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE
+
+import bisect
+import glob
+import os
+import struct
+import time
+
+# A bus log is a directory of segments, each one an append-only file of records with a time index next to it:
+#       segment-000000.bfml     header, then the records
+#       segment-000000.idx      one entry every indexInterval seconds of records: time, offset of the record in the segment
+#
+# Segment header (little endian):
+#       magic (4 bytes) | version (uint16) | schema fingerprint (uint32) | wall time (float64) | monotonic time (float64)
+# The wall time and the monotonic time are taken together when the segment is created, to tell when the records happened.
+#
+# Record:
+#       monotonic time (float64) | topic ID (uint16) | frame length (uint32) | data length (uint32) | frame | data
+# The frame is the schema frame as it was sent (see messageSchema), the data is the content of the frame ring slot the frame
+# describes, for the topics recorded with it, else empty.
+_HEADER = struct.Struct("<4sHIdd")
+_MAGIC = b"BFML"
+_VERSION = 1
+_RECORD = struct.Struct("<dHII")
+_INDEX = struct.Struct("<dQ")
+
+
+def _segment_path(directory, number, extension):
+    return os.path.join(directory, "segment-%06d.%s" % (number, extension))
+
+
+class BusLogWriter:
+    """Appends the records of a bus log, starting a new segment past segmentSize bytes.\n
+    Every run records a log of its own: the monotonic times of two runs don't compare, so a directory already holding a log
+    is refused.
+
+    Args:
+        directory (str): The directory of the log, created if missing. Raises FileExistsError if it holds a log already.
+        fingerprint (int): The schema fingerprint of the recorded frames, see messageSchema.schema_fingerprint.
+        segmentSize (int, optional): The size, in bytes, a segment is closed at. Defaults to 64 MiB.
+        indexInterval (float, optional): The time, in seconds, between two entries of the index. Defaults to 1.
+    """
+
+    def __init__(self, directory, fingerprint, segmentSize=64 << 20, indexInterval=1.0):
+        if glob.glob(os.path.join(directory, "segment-*.bfml")):
+            raise FileExistsError("%s already holds a bus log, every run records into a new directory" % directory)
+        os.makedirs(directory, exist_ok=True)
+        self.directory = directory
+        self.fingerprint = fingerprint
+        self.segmentSize = segmentSize
+        self.indexInterval = indexInterval
+        self.records = 0
+        self._segmentNumber = 0
+        self._segment = None
+        self._index = None
+        self._offset = 0
+        self._nextIndex = 0.0
+        self._open_segment()
+
+    def _open_segment(self):
+        if self._segment is not None:
+            self._segment.close()
+            self._index.close() # type: ignore
+        self._segment = open(_segment_path(self.directory, self._segmentNumber, "bfml"), "wb", buffering=1 << 20)
+        self._index = open(_segment_path(self.directory, self._segmentNumber, "idx"), "wb")
+        self._segmentNumber += 1
+        self._segment.write(_HEADER.pack(_MAGIC, _VERSION, self.fingerprint, time.time(), time.monotonic()))
+        self._offset = _HEADER.size
+        # the first record of a segment is always indexed
+        self._nextIndex = 0.0
+
+    def append(self, stamp, frame, data=b""):
+        """Appends a record.
+
+        Args:
+            stamp (float): The time.monotonic() time the frame was sent at.
+            frame (bytes): The schema frame.
+            data (bytes, optional): The content of the frame ring slot the frame describes. Defaults to empty.
+        """
+        if self._offset >= self.segmentSize:
+            self._open_segment()
+        if stamp >= self._nextIndex:
+            self._index.write(_INDEX.pack(stamp, self._offset)) # type: ignore
+            self._nextIndex = stamp + self.indexInterval
+        header = _RECORD.pack(stamp, struct.unpack_from("<H", frame)[0], len(frame), len(data))
+        self._segment.write(header) # type: ignore
+        self._segment.write(frame) # type: ignore
+        if data:
+            self._segment.write(data) # type: ignore
+        self._offset += len(header) + len(frame) + len(data)
+        self.records += 1
+
+    def flush(self):
+        """Writes the buffered records to the files."""
+        self._segment.flush() # type: ignore
+        self._index.flush() # type: ignore
+
+    def close(self):
+        self._segment.close() # type: ignore
+        self._index.close() # type: ignore
+
+
+class BusLogReader:
+    """Reads the records of a bus log, in the order they were written.\n
+    The time index finds the first record of a time range without reading the records before it. A record cut by a crash
+    of the recorder ends its segment.
+
+    Args:
+        directory (str): The directory of the log.
+    """
+
+    def __init__(self, directory):
+        self.directory = directory
+        self.segments = sorted(glob.glob(os.path.join(directory, "segment-*.bfml")))
+        if not self.segments:
+            raise FileNotFoundError("No bus log segments in %s" % directory)
+        # [(times, offsets)] of every segment
+        self._indexes = [self._read_index(path[:-len("bfml")] + "idx") for path in self.segments]
+        with open(self.segments[0], "rb") as segment:
+            magic, version, self.fingerprint, self.wallTime, self.monotonicTime = _HEADER.unpack(segment.read(_HEADER.size))
+        if magic != _MAGIC or version != _VERSION:
+            raise ValueError("%s is not a bus log of version %d" % (directory, _VERSION))
+
+    @staticmethod
+    def _read_index(path):
+        times, offsets = [], []
+        try:
+            with open(path, "rb") as index:
+                data = index.read()
+        except FileNotFoundError:
+            data = b""
+        for stamp, offset in _INDEX.iter_unpack(data[:len(data) - len(data) % _INDEX.size]):
+            times.append(stamp)
+            offsets.append(offset)
+        return times, offsets
+
+    @property
+    def start(self):
+        """The time of the first record, None for an empty log."""
+        for times, _ in self._indexes:
+            if times:
+                return times[0]
+        return None
+
+    def records(self, start=None, end=None, topics=None):
+        """Yields the records of a time range.
+
+        Args:
+            start (float, optional): The monotonic time of the first record. Defaults to the start of the log.
+            end (float, optional): The monotonic time the records stop at. Defaults to the end of the log.
+            topics (set of int, optional): The topic IDs of the records read, None for all of them. Defaults to None.
+
+        Yields:
+            tuple: (monotonic time, topic ID, frame, data)
+        """
+        for number, (path, (times, offsets)) in enumerate(zip(self.segments, self._indexes)):
+            if start is not None and number + 1 < len(self.segments):
+                nextTimes = self._indexes[number + 1][0]
+                if nextTimes and nextTimes[0] <= start:
+                    # the whole segment is earlier than the next one, which starts before start
+                    continue
+            offset = _HEADER.size
+            if start is not None and times:
+                position = bisect.bisect_right(times, start) - 1
+                if position >= 0:
+                    offset = offsets[position]
+            with open(path, "rb", buffering=1 << 20) as segment:
+                segment.seek(offset)
+                while True:
+                    header = segment.read(_RECORD.size)
+                    if len(header) < _RECORD.size:
+                        break
+                    stamp, topicId, frameLength, dataLength = _RECORD.unpack(header)
+                    if end is not None and stamp >= end:
+                        return
+                    if (start is not None and stamp < start) or (topics is not None and topicId not in topics):
+                        segment.seek(frameLength + dataLength, os.SEEK_CUR)
+                        continue
+                    frame = segment.read(frameLength)
+                    data = segment.read(dataLength)
+                    if len(frame) < frameLength or len(data) < dataLength:
+                        break
+                    yield stamp, topicId, frame, data
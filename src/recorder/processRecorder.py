@@ -0,0 +1,117 @@
+# Copyright (c) 2019, Bosch Engineering Center Cluj and BFMC organizers
+# All rights reserved.
+
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met:
+
+# 1. Redistributions of source code must retain the above copyright notice, this
+#    list of conditions and the following disclaimer.
+
+# 2. Redistributions in binary form must reproduce the above copyright notice,
+#    this list of conditions and the following disclaimer in the documentation
+#    and/or other materials provided with the distribution.
+
+# 3. Neither the name of the copyright holder nor the names of its
+#    contributors may be used to endorse or promote products derived from
+#    this software without specific prior written permission.
+
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS"
+# AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE
+# IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE
+# DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT HOLDER OR CONTRIBUTORS BE LIABLE
+# FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL
+# DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR
+# SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER
+# CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY,
+# OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE
+# OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE
+
+if __name__ == "__main__":
+    import sys
+    sys.path.insert(0, "../..")
+
+import os
+import time
+
+from src.templates.workerprocess import WorkerProcess
+from src.recorder.threads.threadRecorder import threadRecorder
+
+
+class processRecorder(WorkerProcess):
+    """This process records every schema frame of the bus into a bus log, which replayer.py sends again on a bus.\n
+    Args:
+        queueList (dictionar of multiprocessing.queues.Queue): Dictionar of queues where the ID is the type of messages.
+        logging (logging object): Made for debugging.
+        directory (str, optional): The directory of the log, which must not hold a log yet. Defaults to a new directory under
+            temp/bus, named by the start time and the pid.
+        rings (list, optional): The topics carrying frame ring descriptors recorded with their frame. Defaults to serialCamera.
+        debugging (bool, optional): A flag for debugging. Defaults to False.
+
+    The raw frames of mainCamera aren't recorded by default, they would fill a disk in minutes.
+    """
+
+    # ====================================== INIT ==========================================
+    def __init__(self, queueList, logging, directory=None, rings=("serialCamera",), ready_event=None, debugging=False):
+        self.queuesList = queueList
+        self.logging = logging
+        # a new directory for every run, see BusLogWriter
+        self.directory = directory or os.path.join("temp", "bus", "%s-%d" % (time.strftime("%Y%m%d-%H%M%S"), os.getpid()))
+        self.rings = list(rings)
+        self.debugging = debugging
+        super(processRecorder, self).__init__(self.queuesList, ready_event)
+
+    # ===================================== INIT TH ======================================
+    def _init_threads(self):
+        """Create the recorder thread and add to the list of threads."""
+        recorderTh = threadRecorder(self.queuesList, self.logging, self.debugging, self.directory, self.rings)
+        self.threads.append(recorderTh)
+
+
+# =================================== EXAMPLE =========================================
+#             ++    THIS WILL RUN ONLY IF YOU RUN THE CODE FROM HERE  ++
+#                  in terminal:    python3 processRecorder.py
+#
+# Records a few messages and reads the log back.
+
+if __name__ == "__main__":
+    from multiprocessing import Queue
+    import logging
+
+    from src.gateway.processGateway import processGateway
+    from src.recorder.busLog import BusLogReader
+    from src.utils.messages.allMessages import CurrentSpeed, SteerMotor
+    from src.utils.messages.messageHandlerSender import messageHandlerSender
+    from src.utils.messages.messageSchema import decode
+
+    queueList = {
+        "Critical": Queue(),
+        "Warning": Queue(),
+        "General": Queue(),
+        "Config": Queue(),
+    }
+    logger = logging.getLogger()
+    directory = os.path.join("temp", "bus", "example")
+    gateway = processGateway(queueList, logger)
+    recorder = processRecorder(queueList, logger, directory)
+    gateway.start()
+    recorder.start()
+    time.sleep(1)
+
+    speedSender = messageHandlerSender(queueList, CurrentSpeed)
+    steerSender = messageHandlerSender(queueList, SteerMotor)
+    for i in range(5):
+        speedSender.send(float(i))
+        steerSender.send(str(i * 10))
+        time.sleep(0.1)
+    time.sleep(1.5)
+
+    # ===================================== STAYING ALIVE ====================================
+
+    recorder.stop()
+    recorder.join(2)
+    gateway.stop()
+    gateway.join(2)
+
+    for stamp, topicId, frame, data in BusLogReader(directory).records():
+        topic, value = decode(frame)
+        print("%.3f %s %r" % (stamp, topic.name, value))
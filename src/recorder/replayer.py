@@ -0,0 +1,155 @@
+# Copyright (c) 2019, Bosch Engineering Center Cluj and BFMC organizers
+# All rights reserved.
+
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met:
+
+# 1. Redistributions of source code must retain the above copyright notice, this
+#    list of conditions and the following disclaimer.
+
+# 2. Redistributions in binary form must reproduce the above copyright notice,
+#    this list of conditions and the following disclaimer in the documentation
+#    and/or other materials provided with the distribution.
+
+# 3. Neither the name of the copyright holder nor the names of its
+#    contributors may be used to endorse or promote products derived from
+#    this software without specific prior written permission.
+
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS"
+# AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE
+# IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE
+# DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT HOLDER OR CONTRIBUTORS BE LIABLE
+# FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL
+# DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR
+# SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER
+# CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY,
+# OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE
+# OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE
+
+if __name__ == "__main__":
+    import sys
+    sys.path.insert(0, "../..")
+
+import time
+
+from src.recorder.busLog import BusLogReader
+from src.utils.messages.messageSchema import TOPICS_BY_ID, queue_key, decode_value, restamp, to_blob, schema_fingerprint
+from src.utils.sharedmemory.frameRing import FrameRing
+
+
+def replay(queuesList, directory, speed=1.0, start=None, end=None, topics=None, stop=None, linger=1.0):
+    """Sends the frames of a bus log again on a bus, through its gateway, as their senders did.\n
+    The frames keep the time between them, divided by speed, and the stamped ones get the current time as their send time,
+    so the deadlines of the gateway still hold. A frame recorded with the content of its frame ring slot is written into a
+    local ring named "replay_<ring>" and sent with the descriptor of the copy. The rings are closed once the gateway took
+    the last frames from the queues and linger more seconds passed, so the subscribers can still read the last descriptors.
+
+    Args:
+        queuesList (dictionary of multiprocessing.queues.Queue): Dictionary of queues where the ID is the type of messages.
+        directory (str): The directory of the bus log.
+        speed (float, optional): 1 replays in real time, 2 twice as fast, None or 0 as fast as the queues take the frames. Defaults to 1.
+        start (float, optional): The monotonic time of the first record replayed, see BusLogReader.records. Defaults to None.
+        end (float, optional): The monotonic time the replay stops at. Defaults to None.
+        topics (list of str, optional): The names of the topics replayed, None for all of them. Defaults to None.
+        stop (threading.Event, optional): Stops the replay once set. Defaults to None.
+        linger (float, optional): The seconds the rings stay open after the gateway took the last frame. Defaults to 1.
+
+    Returns:
+        int: The number of frames sent.
+    """
+    reader = BusLogReader(directory)
+    if reader.fingerprint != schema_fingerprint():
+        print(f"\033[1;97m[ Replayer ] :\033[0m \033[1;93mWARNING\033[0m - The log was recorded with another allMessages, the topics may not match")
+    topicIds = None
+    if topics is not None:
+        topicIds = {topic.topicId for topic in TOPICS_BY_ID.values() if topic.name in set(topics)}
+    queues = {
+        topicId: queuesList[queue_key(queuesList, topic.queue, topic.owner)] for topicId, topic in TOPICS_BY_ID.items()
+    }
+    rings = {}
+
+    sent = 0
+    first = None
+    began = time.monotonic()
+    try:
+        for stamp, topicId, frame, data in reader.records(start, end, topicIds):
+            if stop is not None and stop.is_set():
+                break
+            if speed:
+                if first is None:
+                    first = stamp
+                delay = began + (stamp - first) / speed - time.monotonic()
+                if delay > 0:
+                    time.sleep(delay)
+            if data:
+                frame = TOPICS_BY_ID[topicId].encode(_copy_to_ring(rings, decode_value(frame), data))
+            queues[topicId].put(to_blob(restamp(frame, time.monotonic())))
+            sent += 1
+    finally:
+        if rings:
+            _wait_drained(queues.values(), 5.0)
+            time.sleep(linger)
+        for ring in rings.values():
+            ring.close()
+    return sent
+
+
+def _wait_drained(queues, timeout):
+    """Waits, at most timeout seconds, until the gateway took every frame from the queues."""
+    deadline = time.monotonic() + timeout
+    while any(not queue.empty() for queue in queues) and time.monotonic() < deadline:
+        time.sleep(0.01)
+
+
+def _copy_to_ring(rings, descriptor, data):
+    """Writes a recorded frame into the local ring of its ring and returns the descriptor of the copy."""
+    name = descriptor["ring"]
+    ring = rings.get(name)
+    if ring is None or ring.slotSize < len(data):
+        if ring is not None:
+            ring.close()
+        ring = rings[name] = FrameRing.create("replay_" + name, len(data) * 3 // 2, 4)
+    return ring.write(data)
+
+
+# =================================== EXAMPLE =========================================
+#             ++    THIS WILL RUN ONLY IF YOU RUN THE CODE FROM HERE  ++
+#                  in terminal:    python3 replayer.py <log directory> [--speed N | --max] [--topics A,B]
+#
+# Replays a log into a fresh gateway and reports how long it took. Start the processes to benchmark on the same queues
+# before calling replay, as below.
+
+if __name__ == "__main__":
+    from multiprocessing import Queue
+    import argparse
+    import logging
+
+    from src.gateway.processGateway import processGateway
+
+    parser = argparse.ArgumentParser(description="Replays a bus log into a fresh gateway.")
+    parser.add_argument("directory")
+    parser.add_argument("--speed", type=float, default=1.0, help="1 replays in real time, 2 twice as fast")
+    parser.add_argument("--max", action="store_true", help="replays as fast as the gateway takes the frames")
+    parser.add_argument("--topics", help="comma separated names of the topics to replay")
+    arguments = parser.parse_args()
+
+    queueList = {
+        "Critical": Queue(),
+        "Warning": Queue(),
+        "General": Queue(),
+        "Config": Queue(),
+    }
+    gateway = processGateway(queueList, logging.getLogger())
+    gateway.start()
+    time.sleep(1)
+
+    began = time.monotonic()
+    count = replay(
+        queueList, arguments.directory, None if arguments.max else arguments.speed,
+        topics=arguments.topics.split(",") if arguments.topics else None,
+    )
+    elapsed = time.monotonic() - began
+    print(f"\033[1;97m[ Replayer ] :\033[0m \033[1;92mINFO\033[0m - Replayed {count} frames in {elapsed:.2f} s ({count / max(elapsed, 1e-9):.0f} frames/s)")
+
+    gateway.stop()
+    gateway.join(2)
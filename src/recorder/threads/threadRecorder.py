@@ -0,0 +1,99 @@
+# Copyright (c) 2019, Bosch Engineering Center Cluj and BFMC organizers
+# All rights reserved.
+
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met:
+
+# 1. Redistributions of source code must retain the above copyright notice, this
+#    list of conditions and the following disclaimer.
+
+# 2. Redistributions in binary form must reproduce the above copyright notice,
+#    this list of conditions and the following disclaimer in the documentation
+#    and/or other materials provided with the distribution.
+
+# 3. Neither the name of the copyright holder nor the names of its
+#    contributors may be used to endorse or promote products derived from
+#    this software without specific prior written permission.
+
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS"
+# AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE
+# IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE
+# DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT HOLDER OR CONTRIBUTORS BE LIABLE
+# FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL
+# DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR
+# SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER
+# CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY,
+# OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE
+# OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE
+
+import time
+
+from src.templates.threadwithstop import ThreadWithStop
+from src.utils.messages.messageHandlerTap import messageHandlerTap
+from src.utils.messages.messageSchema import TOPICS_BY_ID, decode_value, frame_topic_id, schema_fingerprint
+from src.utils.sharedmemory.frameRing import get_frame_ring
+from src.recorder.busLog import BusLogWriter
+
+
+class threadRecorder(ThreadWithStop):
+    """Thread which will handle processRecorder functionalities.\n
+    Args:
+        queueList (dictionary of multiprocessing.queues.Queue): Dictionary of queues where the ID is the type of messages.
+        logger (logging object): Made for debugging.
+        debugging (bool): A flag for debugging.
+        directory (str): The directory of the bus log, see busLog.
+        rings (list, optional): The names of the topics carrying frame ring descriptors whose frames are recorded as well.
+        batchSize (int, optional): The most frames recorded before the thread checks its stop flag. Defaults to 1024.
+
+    Every frame is recorded with the time.monotonic() time it was read from the tap, the log is flushed every second.
+    """
+
+    # ===================================== INIT =========================================
+    def __init__(self, queueList, logger, debugging, directory, rings=(), batchSize=1024):
+        # the thread blocks inside thread_work until there is a frame, so there is no pause between the cycles
+        super(threadRecorder, self).__init__(pause=0)
+        self.queuesList = queueList
+        self.logger = logger
+        self.debugging = debugging
+        self.batchSize = batchSize
+        self.ringTopics = {topic.topicId for topic in TOPICS_BY_ID.values() if topic.name in set(rings)}
+        self.writer = BusLogWriter(directory, schema_fingerprint())
+        self.tap = messageHandlerTap(self.queuesList, True)
+        self._nextFlush = time.monotonic() + 1
+        print(f"\033[1;97m[ Recorder ] :\033[0m \033[1;92mINFO\033[0m - Recording the bus into \033[94m{directory}\033[0m")
+
+    # ===================================== RUN ==========================================
+    def thread_work(self):
+        frame = self.tap.receive(0.1)
+        handled = 0
+        while frame is not None:
+            self.writer.append(time.monotonic(), frame, self._ring_data(frame))
+            if self.debugging:
+                self.logger.info(TOPICS_BY_ID[frame_topic_id(frame)].name)
+            handled += 1
+            if handled == self.batchSize:
+                break
+            frame = self.tap.receive()
+
+        now = time.monotonic()
+        if now >= self._nextFlush:
+            self.writer.flush()
+            self._nextFlush = now + 1
+
+    def _ring_data(self, frame):
+        """Returns the content of the frame ring slot a frame describes, for the topics recorded with it, else empty."""
+        if frame_topic_id(frame) not in self.ringTopics:
+            return b""
+        descriptor = decode_value(frame)
+        try:
+            data = get_frame_ring(descriptor).read(descriptor)
+        except FileNotFoundError:
+            data = None
+        # a slot overwritten before it was read is recorded without its frame
+        return data or b""
+
+    def run(self):
+        super(threadRecorder, self).run()
+        self.tap.untap()
+        self.writer.close()
+        print(f"\033[1;97m[ Recorder ] :\033[0m \033[1;92mINFO\033[0m - Recorded {self.writer.records} frames, {self.tap.missedBlobs} blobs freed before they were read")
@@ -30,7 +30,12 @@ from enum import Enum
 
 
 class SystemMode(Enum):
-    """Enum defining the system modes."""
+    """Enum defining the system modes.
+
+    The "resources" of a mode are the budgets of the processes, by class name: their "cores" and "nice" value, over their
+    placement (see src/templates/placement.py). main.py re-applies them to the running processes on every StateChange,
+    and threadCamera takes the "fps" of the camera thread, so the resources follow the mode without restarting a process.
+    """
     DEFAULT = {
         "mode": "default",
         "camera": {
@@ -39,6 +44,7 @@ class SystemMode(Enum):
             },
             "thread": {
                 "resolution": "720p",
+                "fps": 30,
             }
         },
         "serial_handler": {
@@ -55,7 +61,8 @@ class SystemMode(Enum):
             "process": {
                 "enabled": False,
             }
-        }
+        },
+        "resources": {},
     }
 
     AUTO = {
@@ -66,6 +73,7 @@ class SystemMode(Enum):
             },
             "thread": {
                 "resolution": "480p",
+                "fps": 30,
             }
         },
         "serial_handler": {
@@ -82,7 +90,12 @@ class SystemMode(Enum):
             "process": {
                 "enabled": False,
             }
-        }
+        },
+        "resources": {
+            "processCamera": {"cores": [2, 3], "nice": -5},
+            "processRecorder": {"cores": [0], "nice": 10},
+            "processDashboard": {"cores": [0], "nice": 10},
+        },
     }
 
     MANUAL = {
@@ -93,6 +106,7 @@ class SystemMode(Enum):
             },
             "thread": {
                 "resolution": "1080p",
+                "fps": 20,
             }
         },
         "serial_handler": {
@@ -109,7 +123,12 @@ class SystemMode(Enum):
             "process": {
                 "enabled": False,
             }
-        }
+        },
+        "resources": {
+            "processDashboard": {"cores": [0, 1], "nice": -5},
+            "processCamera": {"cores": [2, 3]},
+            "processRecorder": {"cores": [3], "nice": 10},
+        },
     }
     
     LEGACY = {
@@ -120,6 +139,7 @@ class SystemMode(Enum):
             },
             "thread": {
                 "resolution": "1080p",
+                "fps": 30,
             }
         },
         "serial_handler": {
@@ -136,7 +156,8 @@ class SystemMode(Enum):
             "process": {
                 "enabled": True,
             }
-        }
+        },
+        "resources": {},
     }
 
     STOP = {
@@ -147,6 +168,7 @@ class SystemMode(Enum):
             },
             "thread": {
                 "resolution": "240p",
+                "fps": 5,
             }
         },
         "serial_handler": {
@@ -163,5 +185,6 @@ class SystemMode(Enum):
             "process": {
                 "enabled": False,
             }
-        }
+        },
+        "resources": {},
     }
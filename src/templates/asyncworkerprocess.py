@@ -0,0 +1,217 @@
+# Copyright (c) 2019, Bosch Engineering Center Cluj and BFMC organizers
+# All rights reserved.
+
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met:
+
+# 1. Redistributions of source code must retain the above copyright notice, this
+#    list of conditions and the following disclaimer.
+
+# 2. Redistributions in binary form must reproduce the above copyright notice,
+#    this list of conditions and the following disclaimer in the documentation
+#    and/or other materials provided with the distribution.
+
+# 3. Neither the name of the copyright holder nor the names of its
+#    contributors may be used to endorse or promote products derived from
+#    this software without specific prior written permission.
+
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS"
+# AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE
+# IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE
+# DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT HOLDER OR CONTRIBUTORS BE LIABLE
+# FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL
+# DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR
+# SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER
+# CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY,
+# OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE
+# OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE
+
+import asyncio
+import time
+import weakref
+
+from src.templates.workerprocess import WorkerProcess
+from src.templates.scheduler import Timer
+
+# {event loop: {file descriptor: [futures waiting for it]}}
+_readers = weakref.WeakKeyDictionary()
+
+
+async def wait_readable(fileobj):
+    """Waits until a file object, or a file descriptor, is readable, on the running event loop.
+
+    Args:
+        fileobj (int or object with fileno): A pipe, a subscriber, a serial port or a file descriptor.
+
+    The waiters of one descriptor share one reader of the loop and all wake up together: the subscribers of an inbox wait on
+    the same pipe, and the one reading it moves the messages of the other ones into their mailboxes.
+    """
+    loop = asyncio.get_running_loop()
+    fd = fileobj if isinstance(fileobj, int) else fileobj.fileno()
+    descriptors = _readers.setdefault(loop, {})
+    waiters = descriptors.get(fd)
+    if waiters is None:
+        waiters = descriptors[fd] = []
+        loop.add_reader(fd, _wake, loop, fd)
+    future = loop.create_future()
+    waiters.append(future)
+    try:
+        await future
+    finally:
+        # a waiter cancelled before the descriptor got readable
+        if future in waiters:
+            waiters.remove(future)
+            if not waiters:
+                del descriptors[fd]
+                loop.remove_reader(fd)
+
+
+def release_readable(fileobj):
+    """Wakes up the waiters of a file object about to be closed, so the event loop forgets its descriptor before it is reused."""
+    try:
+        loop = asyncio.get_running_loop()
+    except RuntimeError:
+        return
+    fd = fileobj if isinstance(fileobj, int) else fileobj.fileno()
+    if fd in _readers.get(loop, ()):
+        _wake(loop, fd)
+
+
+def _wake(loop, fd):
+    """Wakes up the waiters of a readable descriptor, the ones waiting again register a new reader."""
+    waiters = _readers[loop].pop(fd, [])
+    loop.remove_reader(fd)
+    for future in waiters:
+        if not future.done():
+            future.set_result(None)
+    waiters.clear()
+
+
+class AsyncWorkerProcess(WorkerProcess):
+    def __init__(self, queuesList, ready_event=None, daemon=True):
+        """AsyncWorkerProcess is the WorkerProcess whose work is coroutines on one event loop, instead of threads. The
+        coroutines wait for their subscribers with `await subscriber.receive()` (see messageHandlerAsyncSubscriber), for the
+        file descriptors with wait_readable and for the time with asyncio.sleep, so a process handles many subscriptions
+        without a thread for each of them.
+
+        Parameters
+        ----------
+        queuesList : dict(multiprocessing.Queue)
+            queues of the bus
+        ready_event : multiprocessing.Event, optional
+            event to signal when tasks are ready
+        daemon : bool, optional
+            daemon process flag, by default True
+        """
+        super(AsyncWorkerProcess, self).__init__(queuesList, ready_event, daemon)
+
+        self.tasks = list()
+        self.loop = None
+        # set while the process isn't paused, see wait_resumed
+        self._resumed = None
+
+    def _init_tasks(self):
+        """It initializes the coroutines of the process and adds them to the 'tasks' list, which will be automatically run on the event loop and cancelled in the 'run' method.
+
+        Raises
+        ------
+        NotImplementedError
+            Have to implement the initialization of tasks
+        """
+        raise NotImplementedError
+
+    def run(self):
+        """This method creates the event loop of the process and runs the tasks on it, until an other process use the 'stop' function.
+        The pause, resume and stop commands come through multiprocessing events, which have no file descriptor, so they are checked every 0.1 s.
+        """
+        self._place()
+        self.loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(self.loop)
+        try:
+            self.loop.run_until_complete(self._supervise())
+        finally:
+            self.loop.close()
+
+    async def _supervise(self):
+        self._resumed = asyncio.Event()
+        self._resumed.set()
+        self._init_tasks()
+        tasks = [self.loop.create_task(coroutine) for coroutine in self.tasks]
+        for task in tasks:
+            task.add_done_callback(self._task_done)
+
+        # Signal that tasks are ready
+        if self.ready_event:
+            self.ready_event.set()
+
+        while not self._blocker.is_set():
+            # handle the state change
+            self.state_change_handler()
+
+            # do the actual work
+            self.process_work()
+
+            # check for pause/resume commands
+            if self._pause_event.is_set():
+                self._resumed.clear()
+                self._pause_event.clear()
+
+            if self._resume_event.is_set():
+                self._resumed.set()
+                self._resume_event.clear()
+
+            await asyncio.sleep(0.1)
+
+        # cleanup section
+        for timer in self._scheduled:
+            timer.cancel()
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+    def _task_done(self, task):
+        if not task.cancelled() and task.exception() is not None:
+            print(f"\033[1;97m[ {type(self).__name__} ] :\033[0m \033[1;91mERROR\033[0m - Task {task.get_coro().__qualname__} ended ({task.exception()!r})")
+
+    async def wait_resumed(self):
+        """Waits while the process is paused, the tasks call it before each piece of work they do."""
+        await self._resumed.wait()
+
+    def is_paused(self):
+        """Check if the tasks of the process are paused, from inside the process."""
+        return self._resumed is not None and not self._resumed.is_set()
+
+    def call_later(self, delay, callback, *args):
+        """Calls callback(*args) once in delay seconds, on the event loop of the process, unless the process stopped
+        meanwhile. A coroutine returned by the callback is run as a task. Returns the Timer."""
+        return self._schedule(Timer(time.monotonic() + delay, None, callback, args))
+
+    def call_every(self, period, callback, *args):
+        """Calls callback(*args) every period seconds, on the event loop of the process, until the process stops. The
+        calls keep their rate on absolute times, the ones missed behind a late one are skipped. Returns the Timer."""
+        return self._schedule(Timer(time.monotonic() + period, period, callback, args))
+
+    def _schedule(self, timer):
+        # the clock of the event loop is time.monotonic(), like the due times of the timers
+        self.loop.call_at(timer.due, self._fire, timer)
+        self._scheduled = [scheduled for scheduled in self._scheduled if scheduled.active]
+        self._scheduled.append(timer)
+        return timer
+
+    def _fire(self, timer):
+        if not timer.active:
+            return
+        if timer.period is None:
+            timer.active = False
+        else:
+            timer.due += timer.period
+            now = time.monotonic()
+            if timer.due <= now:
+                timer.due += ((now - timer.due) // timer.period + 1) * timer.period
+            self.loop.call_at(timer.due, self._fire, timer)
+        try:
+            result = timer.callback(*timer.args)
+            if asyncio.iscoroutine(result):
+                self.loop.create_task(result).add_done_callback(self._task_done)
+        except Exception as e:
+            print(f"\033[1;97m[ {type(self).__name__} ] :\033[0m \033[1;91mERROR\033[0m - Timer {timer!r} ({e})")
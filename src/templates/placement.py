@@ -0,0 +1,210 @@
+# Copyright (c) 2019, Bosch Engineering Center Cluj and BFMC organizers
+# All rights reserved.
+
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met:
+
+# 1. Redistributions of source code must retain the above copyright notice, this
+#    list of conditions and the following disclaimer.
+
+# 2. Redistributions in binary form must reproduce the above copyright notice,
+#    this list of conditions and the following disclaimer in the documentation
+#    and/or other materials provided with the distribution.
+
+# 3. Neither the name of the copyright holder nor the names of its
+#    contributors may be used to endorse or promote products derived from
+#    this software without specific prior written permission.
+
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS"
+# AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE
+# IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE
+# DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT HOLDER OR CONTRIBUTORS BE LIABLE
+# FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL
+# DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR
+# SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER
+# CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY,
+# OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE
+# OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE
+
+import os
+
+# Placement modes of the processes, by the class name of the WorkerProcess. A placement may give:
+#   "cores": the CPU cores the process runs on, the ones missing on the machine are left out; otherwise it keeps the inherited ones
+#   "nice": its nice value, a negative one needs root or CAP_SYS_NICE
+#   "policy": "fifo" or "rr", the real time scheduling classes, with "priority" from 1 to 99, only applied when permitted and
+#             only to the I/O thread of the process, see apply_io_policy, never to the whole process
+# The processes missing from a mode, and the keys missing from a placement, keep what they inherit from main.py.
+# "pinned" is made for the 4 cores of the Raspberry Pi: Flask/eventlet and the light processes on core 0, the gateway on core 1,
+# the serial I/O on core 2, the camera and the recorder on core 3, so the control path doesn't compete with the encoder and the
+# gateway and the serial I/O don't wait for each other. It only uses nice values, "realtime" adds the real time class to the
+# thread writing the serial port, a thread of that class spinning would starve its core, so it is opt-in.
+PROCESS_PLACEMENTS = {
+    "inherit": {},
+    "pinned": {
+        "processDashboard": {"cores": [0], "nice": 5},
+        "processSemaphores": {"cores": [0]},
+        "processTrafficCommunication": {"cores": [0]},
+        "processBridge": {"cores": [0]},
+        "processGateway": {"cores": [1], "nice": -5},
+        "processSerialHandler": {"cores": [2], "nice": -10},
+        "processAsyncSerialHandler": {"cores": [2], "nice": -10},
+        "processCamera": {"cores": [3]},
+        "processRecorder": {"cores": [3], "nice": 10},
+    },
+}
+PROCESS_PLACEMENTS["realtime"] = dict(
+    PROCESS_PLACEMENTS["pinned"],
+    processSerialHandler={"cores": [2], "nice": -10, "policy": "fifo", "priority": 10},
+    processAsyncSerialHandler={"cores": [2], "nice": -10, "policy": "fifo", "priority": 10},
+)
+
+_POLICIES = {"fifo": "SCHED_FIFO", "rr": "SCHED_RR"}
+
+# the placements of the processes created from now on, see use_placements
+_placements = PROCESS_PLACEMENTS["inherit"]
+
+
+def use_placements(placements):
+    """Selects the placements of the processes created from now on, one of the PROCESS_PLACEMENTS modes.
+    Must be called before creating the processes, which read theirs when they are created."""
+    global _placements
+    _placements = placements
+
+
+def placement_of(name):
+    """Returns the placement of the process with the given class name, None if it keeps what it inherits."""
+    return _placements.get(name)
+
+
+def apply_placement(placement, name, pid=0):
+    """Applies the cores and the nice value of a placement to every thread of a process, the threads started later inherit
+    them from the thread starting them. The scheduling class is left to apply_io_policy. A setting not permitted or not
+    supported is reported and skipped, the process keeps running.
+
+    Args:
+        placement (dict): A placement of PROCESS_PLACEMENTS.
+        name (str): The name of the process, for the log.
+        pid (int, optional): The process, 0 for the calling one. Defaults to 0.
+
+    Returns:
+        dict: The settings of the process after the placement, as logged: "cores", "nice" and "policy".
+    """
+    if not hasattr(os, "sched_setaffinity"):
+        print(f"\033[1;97m[ Placement ] :\033[0m \033[1;93mWARNING\033[0m - {name}: the placement is only supported on Linux")
+        return {}
+
+    # the affinity, the nice value and the scheduling class belong to each thread on Linux
+    try:
+        threads = [int(tid) for tid in os.listdir("/proc/%s/task" % (pid or "self"))]
+    except FileNotFoundError:
+        # the process ended meanwhile
+        return {}
+
+    cores = placement.get("cores")
+    if cores is not None:
+        cores = sorted(set(cores) & set(range(os.cpu_count() or 1)))
+        if cores:
+            _for_threads(threads, name, "cores", lambda tid: os.sched_setaffinity(tid, cores))
+        else:
+            print(f"\033[1;97m[ Placement ] :\033[0m \033[1;93mWARNING\033[0m - {name}: none of the cores {placement['cores']} is available, the affinity is kept")
+
+    nice = placement.get("nice")
+    if nice is not None:
+        _for_threads(threads, name, "nice", lambda tid: os.setpriority(os.PRIO_PROCESS, tid, nice))
+
+    try:
+        applied = {
+            "cores": sorted(os.sched_getaffinity(pid)),
+            "nice": os.getpriority(os.PRIO_PROCESS, pid),
+            "policy": _policy_name(os.sched_getscheduler(pid)),
+        }
+    except ProcessLookupError:
+        return {}
+    print(f"\033[1;97m[ Placement ] :\033[0m \033[1;92mINFO\033[0m - {name}: cores {applied['cores']}, nice {applied['nice']}, {applied['policy']}")
+    return applied
+
+
+def apply_io_policy(placement, name):
+    """Applies the scheduling class of a placement to the calling thread only, the I/O thread of the process, at its start.
+    The threads it starts later inherit the class, so it must not start any. A class not permitted or not supported is
+    reported and skipped.
+
+    Args:
+        placement (dict or None): The placement of the process, see WorkerProcess.placement.
+        name (str): The name of the thread, for the log.
+    """
+    policy = (placement or {}).get("policy")
+    if policy is None:
+        return
+    if policy not in _POLICIES or not hasattr(os, "sched_setscheduler"):
+        print(f"\033[1;97m[ Placement ] :\033[0m \033[1;93mWARNING\033[0m - {name}: policy {policy} not supported, expected one of {list(_POLICIES)} on Linux")
+        return
+    # 0 is the calling thread
+    try:
+        os.sched_setscheduler(0, getattr(os, _POLICIES[policy]), os.sched_param(placement.get("priority", 1)))
+    except (PermissionError, OSError) as e:
+        print(f"\033[1;97m[ Placement ] :\033[0m \033[1;93mWARNING\033[0m - {name}: {policy} not permitted, kept ({e})")
+        return
+    print(f"\033[1;97m[ Placement ] :\033[0m \033[1;92mINFO\033[0m - {name}: {_policy_name(os.sched_getscheduler(0))}, priority {placement.get('priority', 1)}")
+
+
+def mode_placement(placement, budget):
+    """Returns the placement of a process under the budget of a SystemMode: the budget of the process over its own
+    placement, over all the cores and a nice value of 0, so a process left out of a mode gets back what the previous one
+    changed. The scheduling class isn't part of the budgets, it stays the one set when the process started.
+
+    Args:
+        placement (dict or None): The placement of the process, see WorkerProcess.placement.
+        budget (dict or None): The "cores" and "nice" of the process in the "resources" of the mode.
+    """
+    merged = {"cores": list(range(os.cpu_count() or 1)), "nice": 0}
+    merged.update({key: value for key, value in (placement or {}).items() if key in merged})
+    merged.update(budget or {})
+    return merged
+
+
+class ModeBudgets:
+    """Re-applies the resources of the SystemMode to the running processes, from the main process, on every StateChange.
+    The settings of the threads of another process are changed through its pid, so no process is restarted. A process
+    is only placed again when its placement changes with the mode."""
+
+    def __init__(self):
+        # {pid: placement applied}
+        self._applied = {}
+
+    def apply(self, resources, processes):
+        """Applies the budgets of a mode.
+
+        Args:
+            resources (dict): The "resources" of the mode, see SystemMode.
+            processes (list(multiprocessing.Process)): The processes, the ones not running are skipped.
+        """
+        for process in processes:
+            if process.pid is None or not process.is_alive():
+                continue
+            name = type(process).__name__
+            placement = mode_placement(getattr(process, "placement", None), resources.get(name))
+            if self._applied.get(process.pid) == placement:
+                continue
+            self._applied[process.pid] = placement
+            apply_placement(placement, name, process.pid)
+
+
+def _for_threads(threads, name, setting, apply):
+    """Applies one setting to the threads, stops at the first refusal, the other threads would be refused as well."""
+    for tid in threads:
+        try:
+            apply(tid)
+        except ProcessLookupError:
+            # the thread ended meanwhile
+            continue
+        except (PermissionError, OSError) as e:
+            print(f"\033[1;97m[ Placement ] :\033[0m \033[1;93mWARNING\033[0m - {name}: {setting} not permitted, kept ({e})")
+            return
+
+
+def _policy_name(policy):
+    for name in ("SCHED_OTHER", "SCHED_BATCH", "SCHED_IDLE", "SCHED_FIFO", "SCHED_RR"):
+        if getattr(os, name, None) == policy:
+            return name
+    return str(policy)
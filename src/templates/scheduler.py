@@ -0,0 +1,203 @@
+# Copyright (c) 2019, Bosch Engineering Center Cluj and BFMC organizers
+# All rights reserved.
+
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met:
+
+# 1. Redistributions of source code must retain the above copyright notice, this
+#    list of conditions and the following disclaimer.
+
+# 2. Redistributions in binary form must reproduce the above copyright notice,
+#    this list of conditions and the following disclaimer in the documentation
+#    and/or other materials provided with the distribution.
+
+# 3. Neither the name of the copyright holder nor the names of its
+#    contributors may be used to endorse or promote products derived from
+#    this software without specific prior written permission.
+
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS"
+# AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE
+# IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE
+# DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT HOLDER OR CONTRIBUTORS BE LIABLE
+# FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL
+# DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR
+# SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER
+# CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY,
+# OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE
+# OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE
+
+import heapq
+import itertools
+import os
+import threading
+import time
+
+from src.templates.threadwithstop import ThreadWithStop
+from src.utils.histogram import Histogram
+
+
+class Timer:
+    """A call scheduled on the Scheduler of the process, returned by call_later and call_every.
+
+    Args:
+        due (float): The time.monotonic() of the next call.
+        period (float or None): The period of a repeated call, None for a single call.
+        callback (callable): The function called.
+        args (tuple): The arguments of the call.
+    """
+
+    __slots__ = ("due", "period", "callback", "args", "active")
+
+    def __init__(self, due, period, callback, args):
+        self.due = due
+        self.period = period
+        self.callback = callback
+        self.args = args
+        self.active = True
+
+    def cancel(self):
+        """Cancels the next calls, a call already running completes."""
+        self.active = False
+
+    def __repr__(self):
+        return "Timer(%s, period=%s, active=%s)" % (getattr(self.callback, "__qualname__", self.callback), self.period, self.active)
+
+
+class Scheduler(ThreadWithStop):
+    """Thread which runs the timers of a process, one per process, so a call every 10 ms costs no new thread.\n
+    Args:
+        lateWarning (float, optional): The lateness, in seconds, past which a call is reported as late. Defaults to 0.05.
+
+    The timers wait in a heap ordered by their due time. The calls run on this thread, one after the other, so they must be
+    short: a long call delays the ones due after it, which the scheduler reports. A repeated call keeps its rate on absolute
+    times, the calls missed behind a late one are skipped. The threads and the processes use it through their call_later
+    and call_every, which cancel their timers when they stop.
+    """
+
+    _instances = {}
+    _lock = threading.Lock()
+
+    @classmethod
+    def of(cls):
+        """Returns the scheduler of the process, started on first use."""
+        key = os.getpid()
+        with cls._lock:
+            scheduler = cls._instances.get(key)
+            if scheduler is None:
+                scheduler = cls._instances[key] = cls()
+                scheduler.daemon = True
+                scheduler.start()
+        return scheduler
+
+    @classmethod
+    def shutdown(cls):
+        """Stops the scheduler of the process, if it was started, its pending timers are cancelled."""
+        with cls._lock:
+            scheduler = cls._instances.pop(os.getpid(), None)
+        if scheduler is not None:
+            scheduler.stop()
+            scheduler.join(1)
+
+    # ===================================== INIT =========================================
+    def __init__(self, lateWarning=0.05):
+        super(Scheduler, self).__init__(pause=0)
+        self.lateWarning = lateWarning
+        self._condition = threading.Condition()
+        # (due time, counter, Timer)
+        self._heap = []
+        self._counter = itertools.count()
+        self.fired = 0
+        self.late = 0
+        self._lateness = Histogram()
+        self._unreportedLate = 0
+        self._worstLate = (0.0, None)
+        self._lastLateReport = 0.0
+
+    # ==================================== SCHEDULE ======================================
+    def call_later(self, delay, callback, *args):
+        """Calls callback(*args) once, in delay seconds.
+
+        Returns:
+            Timer: The timer, to cancel the call.
+        """
+        return self._push(Timer(time.monotonic() + delay, None, callback, args))
+
+    def call_every(self, period, callback, *args):
+        """Calls callback(*args) every period seconds, the first time in period seconds.
+
+        Returns:
+            Timer: The timer, to cancel the calls.
+        """
+        return self._push(Timer(time.monotonic() + period, period, callback, args))
+
+    def _push(self, timer):
+        with self._condition:
+            heapq.heappush(self._heap, (timer.due, next(self._counter), timer))
+            if self._heap[0][2] is timer:
+                # the thread may be waiting for a later timer
+                self._condition.notify()
+        return timer
+
+    # ====================================== RUN =========================================
+    def thread_work(self):
+        with self._condition:
+            delay = self._heap[0][0] - time.monotonic() if self._heap else 0.5
+            if delay > 0:
+                self._condition.wait(min(delay, 0.5))
+                return
+            _, _, timer = heapq.heappop(self._heap)
+        self._fire(timer)
+
+    def _fire(self, timer):
+        if not timer.active:
+            return
+        now = time.monotonic()
+        lateness = now - timer.due
+        self._lateness.add(lateness)
+        if lateness > self.lateWarning:
+            self._count_late(timer, lateness, now)
+        self.fired += 1
+        try:
+            timer.callback(*timer.args)
+        except Exception as e:
+            print(f"\033[1;97m[ Scheduler ] :\033[0m \033[1;91mERROR\033[0m - {getattr(timer.callback, '__qualname__', timer.callback)} ({e})")
+        if timer.period is None or not timer.active:
+            timer.active = False
+            return
+        timer.due += timer.period
+        now = time.monotonic()
+        if timer.due < now:
+            # the calls missed meanwhile are skipped, the next one keeps the rate
+            timer.due += (int((now - timer.due) / timer.period) + 1) * timer.period
+        self._push(timer)
+
+    def _count_late(self, timer, lateness, now):
+        """Counts a late call and prints the late calls, at most once every 5 seconds."""
+        self.late += 1
+        self._unreportedLate += 1
+        if lateness > self._worstLate[0]:
+            self._worstLate = (lateness, timer)
+        if now - self._lastLateReport < 5:
+            return
+        worst, worstTimer = self._worstLate
+        print(f"\033[1;97m[ Scheduler ] :\033[0m \033[1;93mWARNING\033[0m - {self._unreportedLate} calls late by more than "
+              f"{self.lateWarning * 1000:.0f} ms (up to {worst * 1000:.1f} ms, {getattr(worstTimer.callback, '__qualname__', '')})")
+        self._unreportedLate = 0
+        self._worstLate = (0.0, None)
+        self._lastLateReport = now
+
+    def lateness_stats(self):
+        """Returns {"timers": pending timers, "fired", "late", "lateness": {"p50", "p99", "max"} in ms}."""
+        with self._condition:
+            pending = sum(1 for _, _, timer in self._heap if timer.active)
+        return {"timers": pending, "fired": self.fired, "late": self.late, "lateness": self._lateness.summary()}
+
+    # ===================================== STOP =========================================
+    def stop(self):
+        """Cancels the pending timers and stops the thread."""
+        with self._condition:
+            for _, _, timer in self._heap:
+                timer.active = False
+            self._heap.clear()
+            super(Scheduler, self).stop()
+            self._condition.notify()
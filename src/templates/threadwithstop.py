@@ -26,12 +26,18 @@
 # OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE
 # OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE
 
+import time
 from threading import Thread, Event
 from functools import partial
 
+from src.utils.histogram import Histogram
+
+# What a fixed-rate thread does with the cycles it missed after an overrun, see ThreadWithStop.
+OVERRUN_POLICIES = ("skip", "catchUp")
+
 
 class ThreadWithStop(Thread):
-    def __init__(self, pause=0.001, *args, **kwargs):
+    def __init__(self, pause=0.001, *args, period=None, overrun="skip", **kwargs):
         """An extended version of the thread superclass, it contains a new attribute (_event) and a new method (stop).
         The '_event' flag can be used to control the state of the 'run' method and the 'stop' method can stop the running by changing its value.
 
@@ -39,6 +45,14 @@ class ThreadWithStop(Thread):
         ----------
         pause : float, optional
             The pause duration in seconds between thread work cycles (default is 0.01)
+        period : float, optional
+            The period in seconds of the fixed-rate mode, None for the pause between the cycles (default is None).
+            A cycle starts every period, at absolute times, whatever the time thread_work took, so the rate doesn't drift
+            with the load.
+        overrun : str, optional
+            What follows a cycle which ended after the start of the next one (default is "skip"):
+            "skip" drops the cycles already missed and starts again on the next start time,
+            "catchUp" runs the missed cycles back to back, e.g. for a loop counting its cycles.
 
         Raises
         ------
@@ -71,6 +85,10 @@ class ThreadWithStop(Thread):
             th1.stop()
             th1.join()
 
+        A thread running at 100 Hz, its timing is read with rate_stats:
+
+            th1 = AThread(period=0.01)
+
         """
 
         # Check the target parameter definition. If it isn't a bounded method, then we have to give like the first parameter the new object. Thus the run method can access the object's field, (like self._running).
@@ -86,7 +104,26 @@ class ThreadWithStop(Thread):
         self._pause_event.set()  # start in running state
         self._pause = pause 
 
+        if overrun not in OVERRUN_POLICIES:
+            raise ValueError("overrun must be one of %s" % (OVERRUN_POLICIES,))
+        self._period = period
+        self._overrun = overrun
+        # fixed-rate mode: lateness of the start of every cycle, time of every thread_work, seconds
+        self._jitter = Histogram()
+        self._workTime = Histogram()
+        self._cycles = 0
+        self._overruns = 0
+        self._skipped = 0
+        self._unreportedOverruns = 0
+        self._worstOverrun = 0.0
+        self._lastOverrunReport = 0.0
+        # timers of the scheduler of the process, cancelled with the thread
+        self._scheduled = []
+
     def run(self):
+        if self._period is not None:
+            self._run_fixed_rate()
+            return
         while not self._blocker.is_set():
             # wait for pause event
             self._pause_event.wait()
@@ -105,6 +142,93 @@ class ThreadWithStop(Thread):
             if self._pause_event.is_set():
                 self._blocker.wait(self._pause)
 
+    def _run_fixed_rate(self):
+        """Runs a cycle every period, sleeping until the absolute start time of the next one."""
+        start = time.monotonic()
+        while not self._blocker.is_set():
+            if not self._pause_event.is_set():
+                self._pause_event.wait()
+                # a resumed thread starts a new schedule instead of catching up with the time it was paused
+                start = time.monotonic()
+            if self._blocker.is_set():
+                break
+
+            began = time.monotonic()
+            self._jitter.add(began - start)
+            self.state_change_handler()
+            self.thread_work()
+            end = time.monotonic()
+            self._workTime.add(end - began)
+            self._cycles += 1
+
+            # read on every cycle, set_period may have changed it
+            period = self._period
+            start += period
+            if end > start:
+                self._count_overrun(end - began, end)
+                if self._overrun == "skip":
+                    missed = int((end - start) / period) + 1
+                    self._skipped += missed
+                    start += missed * period
+            self._blocker.wait(start - time.monotonic())
+
+    def set_period(self, period):
+        """Changes the period of the fixed-rate mode, from the start of the next cycle on, e.g. from state_change_handler.
+
+        Raises
+        ------
+        ValueError
+            the thread runs in the pause mode
+        """
+        if self._period is None:
+            raise ValueError("set_period needs a thread created with a period")
+        self._period = period
+
+    def _count_overrun(self, workTime, now):
+        """Counts a cycle longer than the period and prints the overruns, at most once every 5 seconds."""
+        self._overruns += 1
+        self._unreportedOverruns += 1
+        self._worstOverrun = max(self._worstOverrun, workTime)
+        if now - self._lastOverrunReport < 5:
+            return
+        print(f"\033[1;97m[ {self.__class__.__name__} ] :\033[0m \033[1;93mWARNING\033[0m - {self._unreportedOverruns} cycles longer than "
+              f"the {self._period * 1000:.1f} ms period (up to {self._worstOverrun * 1000:.1f} ms)")
+        self._unreportedOverruns = 0
+        self._worstOverrun = 0.0
+        self._lastOverrunReport = now
+
+    def rate_stats(self):
+        """Returns the timing of the fixed-rate mode, None in the pause mode: {"period", "cycles", "overruns", "skipped",
+        "jitter": lateness of the cycle starts, "work": time of thread_work}, the last two as {"p50", "p99", "max"} in ms."""
+        if self._period is None:
+            return None
+        return {
+            "period": self._period,
+            "cycles": self._cycles,
+            "overruns": self._overruns,
+            "skipped": self._skipped,
+            "jitter": self._jitter.summary(),
+            "work": self._workTime.summary(),
+        }
+
+    def call_later(self, delay, callback, *args):
+        """Calls callback(*args) once in delay seconds, on the scheduler of the process (see Scheduler), unless the thread
+        stopped meanwhile. Returns the Timer."""
+        # imported here, the scheduler is a thread of this class
+        from src.templates.scheduler import Scheduler
+        return self._keep_timer(Scheduler.of().call_later(delay, callback, *args))
+
+    def call_every(self, period, callback, *args):
+        """Calls callback(*args) every period seconds, on the scheduler of the process (see Scheduler), until the thread
+        stops. Returns the Timer."""
+        from src.templates.scheduler import Scheduler
+        return self._keep_timer(Scheduler.of().call_every(period, callback, *args))
+
+    def _keep_timer(self, timer):
+        self._scheduled = [scheduled for scheduled in self._scheduled if scheduled.active]
+        self._scheduled.append(timer)
+        return timer
+
     def thread_work(self):
         """This method is called to do the actual work of the thread. It will be overridden by the child thread."""
         pass
@@ -130,4 +254,6 @@ class ThreadWithStop(Thread):
         # resume first in case it's paused so it can process the stop signal
         if self.is_paused():
             self.resume()
+        for timer in self._scheduled:
+            timer.cancel()
         self._blocker.set()
@@ -28,6 +28,9 @@
 
 from multiprocessing import Process, Event
 
+from src.templates.scheduler import Scheduler
+from src.templates.placement import placement_of, apply_placement
+
 
 class WorkerProcess(Process):
     def __init__(self, queuesList, ready_event=None, daemon=True):
@@ -58,6 +61,10 @@ class WorkerProcess(Process):
         
         # Intra-process coordination
         self._blocker = Event()
+        # timers of the scheduler of the process, cancelled once it stops
+        self._scheduled = []
+        # the cores and nice value of the process, and the scheduling class of its I/O thread, see placement.py; None keeps the inherited ones
+        self.placement = placement_of(type(self).__name__)
 
     def _init_threads(self):
         """It initializes the threads of the process and adds the thread to the 'threads' list, which will be automatically started and stopped in the 'run' method.
@@ -73,6 +80,7 @@ class WorkerProcess(Process):
         """This method applies the initialization of the theards and starts all of them. The process ignores the keyboardInterruption signal and can terminate by applying the 'stop' method.
         The process will be blocked, until an other process use the 'stop' function. After appling the function it terminates all subthread.
         """
+        self._place()
         self._init_threads()
         for th in self.threads:
             th.daemon = self.daemon
@@ -107,7 +115,15 @@ class WorkerProcess(Process):
                 print(e)
                 
         # cleanup section
+        for timer in self._scheduled:
+            timer.cancel()
         self.stop_threads()
+        Scheduler.shutdown()
+
+    def _place(self):
+        """Applies the placement of the process, before its threads start so they inherit it."""
+        if self.placement is not None:
+            apply_placement(self.placement, type(self).__name__)
 
     def stop_threads(self):
         for th in self.threads:
@@ -130,6 +146,22 @@ class WorkerProcess(Process):
 
             del th
 
+    def call_later(self, delay, callback, *args):
+        """Calls callback(*args) once in delay seconds, on the scheduler of the process (see Scheduler), unless the process
+        stopped meanwhile. Returns the Timer."""
+        timer = Scheduler.of().call_later(delay, callback, *args)
+        self._scheduled = [scheduled for scheduled in self._scheduled if scheduled.active]
+        self._scheduled.append(timer)
+        return timer
+
+    def call_every(self, period, callback, *args):
+        """Calls callback(*args) every period seconds, on the scheduler of the process (see Scheduler), until the process
+        stops. Returns the Timer."""
+        timer = Scheduler.of().call_every(period, callback, *args)
+        self._scheduled = [scheduled for scheduled in self._scheduled if scheduled.active]
+        self._scheduled.append(timer)
+        return timer
+
     def state_change_handler(self):
         """This method is called to handle the state change of the process. It will be overridden by the child process."""
         pass
@@ -0,0 +1,72 @@
+# Copyright (c) 2019, Bosch Engineering Center Cluj and BFMC organizers
+# All rights reserved.
+
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met:
+
+# 1. Redistributions of source code must retain the above copyright notice, this
+#    list of conditions and the following disclaimer.
+
+# 2. Redistributions in binary form must reproduce the above copyright notice,
+#    this list of conditions and the following disclaimer in the documentation
+#    and/or other materials provided with the distribution.
+
+# 3. Neither the name of the copyright holder nor the names of its
+#    contributors may be used to endorse or promote products derived from
+#    this software without specific prior written permission.
+
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS"
+# AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE
+# IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE
+# DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT HOLDER OR CONTRIBUTORS BE LIABLE
+# FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL
+# DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR
+# SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER
+# CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY,
+# OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE
+# OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE
+
+import math
+
+# the histograms have 8 buckets per doubling of the latency, from 1 us up to 2^24 us (about 16 s)
+_BUCKETS_PER_OCTAVE = 8
+_BUCKETS = 24 * _BUCKETS_PER_OCTAVE
+
+
+class Histogram:
+    """A histogram of latencies with logarithmic buckets, the percentiles are exact within 9%, the maximum is exact."""
+
+    __slots__ = ("counts", "count", "max")
+
+    def __init__(self):
+        self.counts = [0] * _BUCKETS
+        self.count = 0
+        self.max = 0.0
+
+    def add(self, seconds):
+        if seconds > 1e-6:
+            bucket = int(math.log2(seconds * 1e6) * _BUCKETS_PER_OCTAVE)
+            self.counts[bucket if bucket < _BUCKETS else _BUCKETS - 1] += 1
+        else:
+            self.counts[0] += 1
+        self.count += 1
+        if seconds > self.max:
+            self.max = seconds
+
+    def percentile(self, fraction):
+        """Returns the upper edge, in seconds, of the bucket holding the given fraction of the latencies."""
+        rank = fraction * self.count
+        seen = 0
+        for bucket, count in enumerate(self.counts):
+            seen += count
+            if count and seen >= rank:
+                return min(2 ** ((bucket + 1) / _BUCKETS_PER_OCTAVE) * 1e-6, self.max)
+        return self.max
+
+    def summary(self):
+        """Returns {"p50", "p99", "max"}, in milliseconds."""
+        return {
+            "p50": round(self.percentile(0.5) * 1000, 3),
+            "p99": round(self.percentile(0.99) * 1000, 3),
+            "max": round(self.max * 1000, 3),
+        }
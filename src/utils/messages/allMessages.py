@@ -31,21 +31,24 @@ from enum import Enum
 ####################################### processCamera #######################################
 class mainCamera(Enum):
     Queue = "General"
-    Owner = "threadCamera"
+    Owner = "threadCamera" # descriptor of a raw RGB frame from the "mainCamera" frame ring, see src/utils/sharedmemory/frameRing.py
     msgID = 1
-    msgType = "str"
+    msgType = "dict"
+    DropPolicy = "dropOldest" # a stalled gateway only costs the oldest frames
 
 class serialCamera(Enum):
     Queue = "General"
-    Owner = "threadCamera"
+    Owner = "threadCamera" # descriptor of a JPEG frame from the "serialCamera" frame ring
     msgID = 2
-    msgType = "str"
+    msgType = "dict"
+    DropPolicy = "dropOldest"
 
 class Recording(Enum):
     Queue = "General"
     Owner = "threadCamera"
     msgID = 3
     msgType = "bool"
+    Retention = "latched" # the gateway replays the last value to every new subscriber
 
 class Signal(Enum):
     Queue = "General"
@@ -78,24 +81,30 @@ class SpeedMotor(Enum):
     Owner = "Dashboard"
     msgID = 1
     msgType = "str"
+    Routing = "direct" # delivered straight from the sender to the subscribers, see messageHandlerSender
 
 class SteerMotor(Enum):
     Queue = "General"
     Owner = "Dashboard"
     msgID = 2
     msgType = "str"
+    Routing = "direct" # delivered straight from the sender to the subscribers, see messageHandlerSender
 
 class Control(Enum):
     Queue = "General"
     Owner = "Dashboard"
     msgID = 3
     msgType = "dict"
+    Priority = "control"
+    Deadline = 0.05 # seconds
 
 class Brake(Enum):
     Queue = "General"
     Owner = "Dashboard"
     msgID = 4
     msgType = "str"
+    Routing = "direct" # delivered straight from the sender to the subscribers, see messageHandlerSender
+    DropPolicy = "never"
 
 class Record(Enum):
     Queue = "General"
@@ -281,6 +290,7 @@ class EnableButton(Enum):
     Owner = "threadWrite"
     msgID = 1
     msgType = "bool"
+    Retention = "latched" # the gateway replays the last value to every new subscriber
 
 class WarningSignal(Enum):
     Queue = "General"
@@ -293,6 +303,7 @@ class SerialConnectionState(Enum):
     Owner = "processSerialHandler"
     msgID = 3
     msgType = "bool"
+    Retention = "latched" # the gateway replays the last value to every new subscriber
 
 ################################# From StateMachine ##################################
 class StateChange(Enum):
@@ -300,5 +311,21 @@ class StateChange(Enum):
     Owner = "stateMachine"
     msgID = 1
     msgType = "str"
+    DropPolicy = "never"
+    Deadline = 0.1 # seconds
 
 ### It will have this format: {"WarningName":"name1", "WarningID": 1}
+
+################################# From Gateway ##################################
+class GatewayBacklog(Enum):
+    Queue = "General"
+    Owner = "threadGateway" # every second: {"receiver/topic": {"backlog": bytes waiting in the gateway, "dropped": messages}}
+    msgID = 1
+    msgType = "dict"
+
+################################# From latencyTracer ##################################
+class LatencyReport(Enum):
+    Queue = "General"
+    Owner = "latencyTracer" # every second, from every process tracing: {"process": name, "pid": pid, "topics": {topic: {"count": n, "total": {"p50": ms, "p99": ms, "max": ms}, ...}}}
+    msgID = 1
+    msgType = "dict"
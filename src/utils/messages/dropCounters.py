@@ -0,0 +1,65 @@
+# Copyright (c) 2019, Bosch Engineering Center Cluj and BFMC organizers
+# All rights reserved.
+
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met:
+
+# 1. Redistributions of source code must retain the above copyright notice, this
+#    list of conditions and the following disclaimer.
+
+# 2. Redistributions in binary form must reproduce the above copyright notice,
+#    this list of conditions and the following disclaimer in the documentation
+#    and/or other materials provided with the distribution.
+
+# 3. Neither the name of the copyright holder nor the names of its
+#    contributors may be used to endorse or promote products derived from
+#    this software without specific prior written permission.
+
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS"
+# AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE
+# IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE
+# DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT HOLDER OR CONTRIBUTORS BE LIABLE
+# FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL
+# DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR
+# SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER
+# CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY,
+# OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE
+# OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE
+
+from multiprocessing import Array
+
+from src.utils.messages.messageSchema import TOPICS_BY_ID
+
+# The counters live in shared memory and travel with the queue list, under this key, to every process.
+# Index 0 counts the messages outside the schema, index N the topic with the ID N.
+DROPS_KEY = "Drops"
+
+
+def create_drop_counters(queueList):
+    """Adds the shared drop counters to the queue list. Must be called before creating any sender or process.
+
+    Args:
+        queueList (dictionary of multiprocessing.queues.Queue): Dictionary of queues where the ID is the type of messages.
+    """
+    queueList[DROPS_KEY] = Array("Q", len(TOPICS_BY_ID) + 1)
+
+
+def count_drop(queuesList, topicId=0):
+    """Counts a message dropped by a sender, if the queue list carries drop counters."""
+    counters = queuesList.get(DROPS_KEY)
+    if counters is not None:
+        with counters.get_lock():
+            counters[topicId] += 1
+
+
+def read_drops(queuesList):
+    """Returns the number of dropped messages of every topic that lost any: {topic name: count}."""
+    counters = queuesList.get(DROPS_KEY)
+    if counters is None:
+        return {}
+    with counters.get_lock():
+        values = counters[:]
+    drops = {TOPICS_BY_ID[topicId].name: count for topicId, count in enumerate(values) if topicId and count}
+    if values[0]:
+        drops["other"] = values[0]
+    return drops
@@ -0,0 +1,170 @@
+# Copyright (c) 2019, Bosch Engineering Center Cluj and BFMC organizers
+# All rights reserved.
+
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met:
+
+# 1. Redistributions of source code must retain the above copyright notice, this
+#    list of conditions and the following disclaimer.
+
+# 2. Redistributions in binary form must reproduce the above copyright notice,
+#    this list of conditions and the following disclaimer in the documentation
+#    and/or other materials provided with the distribution.
+
+# 3. Neither the name of the copyright holder nor the names of its
+#    contributors may be used to endorse or promote products derived from
+#    this software without specific prior written permission.
+
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS"
+# AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE
+# IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE
+# DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT HOLDER OR CONTRIBUTORS BE LIABLE
+# FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL
+# DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR
+# SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER
+# CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY,
+# OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE
+# OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE
+
+import json
+import os
+import threading
+from multiprocessing import current_process
+
+from src.templates.scheduler import Scheduler
+from src.utils.histogram import Histogram
+from src.utils.messages.allMessages import LatencyReport
+from src.utils.messages.messageSchema import TOPICS_BY_ID, frame_topic_id, frame_trace
+
+# Tracing is switched on for the whole bus by putting its settings into the queue list, under this key, before creating any
+# sender or process, so every process finds them in the queue list it gets.
+TRACING_KEY = "Tracing"
+
+# the stages of a message through the gateway, the messages of a direct topic only have the total
+STAGES = ("total", "queue", "gateway", "pipe")
+
+
+def enable_latency_tracing(queueList, dumpDirectory=None, interval=1.0):
+    """Switches the latency tracing on. Must be called before creating any sender or process.
+
+    Args:
+        queueList (dictionary of multiprocessing.queues.Queue): Dictionary of queues where the ID is the type of messages.
+        dumpDirectory (str, optional): The directory every process writes its latency_<process>_<pid>.json into. Defaults to None, no file.
+        interval (float, optional): The seconds between the reports of a process. Defaults to 1.0.
+    """
+    queueList[TRACING_KEY] = {"dumpDirectory": dumpDirectory, "interval": interval}
+
+
+def tracing_enabled(queuesList):
+    """Returns True if the senders must trace the messages they send."""
+    return TRACING_KEY in queuesList
+
+
+class latencyTracer:
+    """The latency histograms of the messages received by the subscribers of one process, one per topic and stage.\n
+    Args:
+        queuesList (dictionary of multiprocessing.queues.Queue): Dictionary of queues where the ID is the type of messages.
+
+    A sender of a process tracing the bus stamps every frame with its send time (see messageSchema), the gateway stamps the
+    time it took the frame from its queue and the time it wrote the frame into the pipe of the subscriber. The subscriber
+    records the time it read the frame, which splits the latency in stages:
+
+    - queue: from the sender to the gateway, the time in the multiprocessing queue.
+    - gateway: in the gateway, the wait of a subscription with a QoS policy included.
+    - pipe: from the gateway to the subscriber, the time until the subscriber reads it.
+
+    All the times come from time.monotonic(), the same clock in every process of the machine. The messages outside the schema
+    are not traced.
+
+    Every interval the report of the process is sent on the LatencyReport topic and written into latency_<process>_<pid>.json
+    in the dump directory: {"process": name, "pid": pid, "topics": {topic name: {"count": n, "total": {"p50", "p99", "max"},
+    "queue": ...}}}, in milliseconds. The reports are made by the Scheduler of the process, never on the receiving path. The
+    histograms cover the whole life of the process. Recording is lock free, a count lost to a race between two threads of the
+    process is within the precision of the histogram.
+
+    A tracer belongs to the process which recorded into it first: a subscriber created in a parent process and used in a
+    child, like the ones created in the constructor of a process, records into the tracer of the child, see of.
+    """
+
+    _instances = {}
+    _lock = threading.Lock()
+
+    @classmethod
+    def of(cls, queuesList):
+        """Returns the tracer of the calling process, created on first use, None if the tracing is off. Called when recording,
+        not when the subscriber is created, so a forked process never records into the tracer of its parent."""
+        settings = queuesList.get(TRACING_KEY)
+        if settings is None:
+            return None
+        key = os.getpid()
+        tracer = cls._instances.get(key)
+        if tracer is not None:
+            return tracer
+        with cls._lock:
+            tracer = cls._instances.get(key)
+            if tracer is None:
+                tracer = cls._instances[key] = cls(queuesList, **settings)
+        return tracer
+
+    def __init__(self, queuesList, dumpDirectory=None, interval=1.0):
+        self.queuesList = queuesList
+        self.dumpDirectory = dumpDirectory
+        self.interval = interval
+        # {topic ID: {stage: Histogram}}
+        self.histograms = {}
+        self._sender = None
+        self._reporting = threading.Lock()
+        self._timer = Scheduler.of().call_every(interval, self.report)
+
+    def record(self, frame, now):
+        """Records the latency of a traced frame read at the time now, a frame which isn't traced is ignored."""
+        trace = frame_trace(frame)
+        if trace is None:
+            return
+        sent, gatewayIn, gatewayOut = trace
+        topicId = frame_topic_id(frame)
+        stages = self.histograms.get(topicId)
+        if stages is None:
+            stages = self.histograms.setdefault(topicId, {stage: Histogram() for stage in STAGES})
+        stages["total"].add(now - sent)
+        if gatewayOut:
+            stages["queue"].add(gatewayIn - sent)
+            stages["gateway"].add(gatewayOut - gatewayIn)
+            stages["pipe"].add(now - gatewayOut)
+
+    def summary(self):
+        """Returns the report of the process."""
+        topics = {}
+        for topicId, stages in list(self.histograms.items()):
+            entry = {"count": stages["total"].count}
+            for stage in STAGES:
+                if stages[stage].count:
+                    entry[stage] = stages[stage].summary()
+            topics[TOPICS_BY_ID[topicId].name] = entry
+        return {"process": current_process().name, "pid": os.getpid(), "topics": topics}
+
+    def report(self):
+        """Sends the report on the bus and writes it into the dump file, from one thread of the process at a time."""
+        if not self._reporting.acquire(blocking=False):
+            return
+        try:
+            summary = self.summary()
+            if self._sender is None:
+                # imported here, the sender imports this module
+                from src.utils.messages.messageHandlerSender import messageHandlerSender
+                self._sender = messageHandlerSender(self.queuesList, LatencyReport)
+            self._sender.send(summary)
+            if self.dumpDirectory is not None:
+                self.dump(summary)
+        finally:
+            self._reporting.release()
+
+    def dump(self, summary=None):
+        """Writes the report into latency_<process>_<pid>.json, replaced at once so a reader never sees it half written. The
+        pid keeps apart the processes with the same name."""
+        summary = summary or self.summary()
+        os.makedirs(self.dumpDirectory, exist_ok=True) # type: ignore
+        path = os.path.join(self.dumpDirectory, "latency_%s_%d.json" % (summary["process"], summary["pid"])) # type: ignore
+        with open(path + ".tmp", "w") as file:
+            json.dump(summary, file, indent=2)
+        os.replace(path + ".tmp", path)
@@ -0,0 +1,89 @@
+# Copyright (c) 2019, Bosch Engineering Center Cluj and BFMC organizers
+# All rights reserved.
+
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met:
+
+# 1. Redistributions of source code must retain the above copyright notice, this
+#    list of conditions and the following disclaimer.
+
+# 2. Redistributions in binary form must reproduce the above copyright notice,
+#    this list of conditions and the following disclaimer in the documentation
+#    and/or other materials provided with the distribution.
+
+# 3. Neither the name of the copyright holder nor the names of its
+#    contributors may be used to endorse or promote products derived from
+#    this software without specific prior written permission.
+
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS"
+# AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE
+# IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE
+# DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT HOLDER OR CONTRIBUTORS BE LIABLE
+# FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL
+# DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR
+# SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER
+# CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY,
+# OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE
+# OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE
+
+import asyncio
+import time
+
+from src.templates.asyncworkerprocess import wait_readable
+from src.utils.messages.messageHandlerSubscriber import messageHandlerSubscriber
+
+
+class messageHandlerAsyncSubscriber(messageHandlerSubscriber):
+    """Class which will handle subscriber functionalities inside a coroutine, see AsyncWorkerProcess.\n
+    Args:
+        queuesList (dictionar of multiprocessing.queues.Queue): Dictionar of queues where the ID is the type of messages.
+        message (enum): A specific message
+        deliveryMode (string): Determines how messages are delivered from the queue. ("FIFO" or "LastOnly").
+        subscribe (bool): A flag to automatically subscribe the message.
+        maxRate (float, optional): The most messages per second the gateway delivers, the ones in between are conflated. Defaults to None.
+        depth (int, optional): The most unread messages of a FIFO subscription, the gateway drops the oldest beyond it. Defaults to None.
+        inbox (bool or messageInbox, optional): True reads the messages from the inbox of the process instead of a pipe of its own,
+            an inbox reads them from that inbox. Defaults to False.
+
+    `await subscriber.receive()` suspends the coroutine until a message comes: the pipe of the subscriber is registered with
+    the event loop meanwhile, so the other coroutines of the process run. The subscribers of an inbox wait on its shared
+    pipe and wake up together, each one checking its own mailbox. receive_nowait reads like receive of messageHandlerSubscriber,
+    without ever sleeping on the event loop: until the messages the gateway sends after a MARK_NEWER came, it returns None.
+    """
+
+    # the pipe is only polled once for the messages following a MARK_NEWER, a retry would sleep on the event loop
+    _syncRetries = 0
+
+    async def receive(self):
+        """
+        Waits, without blocking the event loop, until there is a message in the pipe
+
+        Returns:
+            message's data type: The received message, None if its blob was already freed.
+        """
+        await self.wait()
+        return self.receive_with_block()
+
+    async def wait(self):
+        """
+        Waits, without blocking the event loop, until there is a message in the pipe, the marks of the gateway are skipped.
+        """
+        while not self._ready():
+            if self._syncDeadline is None:
+                await wait_readable(self._pipeRecv)
+                continue
+            # the messages answering an ACK_SYNC are awaited, the ones read before them are returned once it expires
+            try:
+                await asyncio.wait_for(wait_readable(self._pipeRecv), self._syncDeadline - time.monotonic())
+            except asyncio.TimeoutError:
+                pass
+
+    def receive_nowait(self):
+        """
+        Receives values from a pipe, skipping the marks of the gateway, without blocking
+
+        Returns None if there no data in the Pipe
+        """
+        if not self._ready():
+            return None
+        return self.receive_with_block()
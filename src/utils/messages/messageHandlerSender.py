@@ -26,16 +26,75 @@
 # OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE
 # OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE
 
+import inspect
+import queue
+import select
+from multiprocessing import Pipe
+
+from src.utils.messages.messageSchema import TOPICS_BY_ID, topic_of, queue_key, to_blob, blob_of, frame_topic_id
+from src.utils.messages.dropCounters import count_drop
+from src.utils.messages.latencyTracer import tracing_enabled
+from src.utils.sharedmemory.blobStore import release_blob
+
+# the messages a "dropOldest" sender evicts from the head of a full queue before dropping its own, the gateway may be
+# taking them meanwhile, and the longest wait for the head, still in the feeder thread of its sender, in seconds
+_EVICTIONS = 3
+_EVICT_WAIT = 0.005
+
 class messageHandlerSender:
     """Class which will handle sender functionalities.\n
     Args:
         queuesList (dictionary of multiprocessing.queues.Queue): Dictionary of queues where the ID is the type of messages.
         message (enum): A specific message
+        valueTable (ValueTable, optional): A shared memory table every value sent is also written into, for the readers
+            which only need the latest one. Defaults to None.
+
+    The messages declared in allMessages travel as compact frames encoded by the schema (see messageSchema), the queue and
+    the codec of the message are looked up once, here. Any other message travels as a dictionary.
+
+    The frames of a "direct" topic (Routing = "direct" in allMessages) skip the gateway: the sender registers itself as a
+    publisher on the config queue and the gateway hands it the pipes of the subscribers, which the sender then writes into.
+    Until the gateway answers, the frames go through the gateway like any other. A frame of a direct topic must fit in
+    PIPE_BUF bytes, so a write into a pipe shared with the gateway is never partial, a longer one raises ValueError.
+
+    When the queue is full, the DropPolicy of the topic applies: "never" waits for room, "dropNewest" drops the message being
+    sent and "dropOldest" evicts the oldest message of the queue to make room for it. A message of the "never" DropPolicy
+    evicted that way is put back behind the others. Every drop is counted in the shared drop counters, see dropCounters. A full pipe of a direct subscriber drops the frame, except with "never", which
+    waits for room until the subscriber reads or is gone.
+
+    A value whose frame is longer than BLOB_THRESHOLD is copied into a shared memory blob and the frame only references it,
+    the subscribers read it back transparently (see blobStore).
+
+    When the latency tracing is on (see latencyTracer) every frame carries its send time and the times of the gateway.
     """
         
-    def __init__(self, queuesList, message):
+    def __init__(self, queuesList, message, valueTable=None):
         self.queuesList = queuesList
         self.message = message
+        self._valueTable = valueTable
+        self._topic = topic_of(message)
+        # the queue of a topic in the schema follows its priority class
+        queueName = self._topic.queue if self._topic is not None else message.Queue.value
+        self._queue = queuesList[queue_key(queuesList, queueName, message.Owner.value)]
+        # the dictionaries of the queue, not described by a topic, are never dropped on the Critical queue
+        self._queueCritical = queueName == "Critical"
+        if self._topic is not None:
+            self._dropPolicy = self._topic.dropPolicy
+            self._topicId = self._topic.topicId
+            self._traced = tracing_enabled(queuesList)
+        else:
+            self._dropPolicy = "never" if message.Queue.value == "Critical" else "dropNewest"
+            self._topicId = 0
+        # direct channels: {receiver: pipe}, None until the gateway sends them
+        self._channels = None
+        self._controlRecv, self._controlSend = None, None
+        if self._topic is not None and self._topic.direct:
+            frame = inspect.currentframe().f_back # type: ignore
+            if 'self' in frame.f_locals: # type: ignore
+                publisher = frame.f_locals['self'].__class__.__name__ # type: ignore
+            else:
+                publisher = frame.f_globals.get('__name__', None) # type: ignore
+            self.publish(publisher)
 
     def send(self, value):
         """
@@ -44,11 +103,161 @@ class messageHandlerSender:
         Args:
             value (any type): The value to be put into the queue. This can be of any type
         """
-        self.queuesList[self.message.Queue.value].put(
+        if self._valueTable is not None:
+            self._valueTable.write(self.message, value)
+        if self._topic is not None:
+            frame = self._topic.encode(value, self._traced)
+            if self._topic.direct and len(frame) > select.PIPE_BUF:
+                raise ValueError("%s: a frame of %d bytes doesn't fit in a direct pipe, at most %d" % (self._topic.name, len(frame), select.PIPE_BUF))
+            if self._controlRecv is not None:
+                self._update_channels()
+                if self._channels is not None:
+                    self._send_direct(frame)
+                    return
+            self._put(to_blob(frame))
+            return
+
+        self._put(
             {
                 "Owner": self.message.Owner.value,
                 "msgID": self.message.msgID.value,
                 "msgType": self.message.msgType.value,
                 "msgValue": value
             }
-        )
\ No newline at end of file
+        )
+
+    def _put(self, item):
+        """
+        Puts a message into the queue, applying the drop policy if the queue is full.
+        """
+        if self._dropPolicy == "never":
+            self._queue.put(item)
+            return
+        try:
+            self._queue.put_nowait(item)
+            return
+        except queue.Full:
+            pass
+        if self._dropPolicy == "dropOldest":
+            for _ in range(_EVICTIONS):
+                self._evict()
+                try:
+                    self._queue.put_nowait(item)
+                    return
+                except queue.Full:
+                    # another sender took the room first
+                    continue
+        self._discard(item)
+        count_drop(self.queuesList, self._topicId)
+
+    def _evict(self):
+        """
+        Drops the oldest message of the queue, counted on its own topic. A message which must never be dropped is put back.
+        """
+        try:
+            oldest = self._queue.get(timeout=_EVICT_WAIT)
+        except queue.Empty:
+            # the gateway took it
+            return
+        if oldest.__class__ is bytes:
+            topicId = frame_topic_id(oldest)
+            never = TOPICS_BY_ID[topicId].dropPolicy == "never"
+        else:
+            topicId = 0
+            never = self._queueCritical
+        if never:
+            self._queue.put(oldest)
+            return
+        self._discard(oldest)
+        count_drop(self.queuesList, topicId)
+
+    def _discard(self, item):
+        """
+        Frees the blob of a frame which will never reach the gateway.
+        """
+        if item.__class__ is bytes:
+            name = blob_of(item)
+            if name is not None:
+                release_blob(name)
+
+    def publish(self, publisher):
+        """
+        Asks the gateway for direct channels to the subscribers of the topic.
+
+        Args:
+            publisher (string): The name of the sender, made for debugging.
+        """
+        self._controlRecv, self._controlSend = Pipe(duplex=False)
+        self.queuesList["Config"].put(
+            {
+                "Subscribe/Unsubscribe": "publish",
+                "Owner": self.message.Owner.value,
+                "msgID": self.message.msgID.value,
+                "To": {"receiver": publisher, "pipe": self._controlSend},
+            }
+        )
+
+    def _update_channels(self):
+        """
+        Applies the changes of the subscribers sent by the gateway: ("channels", {receiver: pipe}) once, then
+        ("subscribe", receiver, pipe) and ("unsubscribe", receiver, None).
+        """
+        while self._controlRecv.poll(): # type: ignore
+            update = self._controlRecv.recv() # type: ignore
+            if update[0] == "channels":
+                self._channels = update[1]
+                continue
+            _, receiver, pipe = update
+            previous = self._channels.pop(receiver, None) # type: ignore
+            if previous is not None:
+                previous.close()
+            if pipe is not None:
+                self._channels[receiver] = pipe # type: ignore
+
+    def _send_direct(self, frame):
+        """
+        Writes the frame into the pipe of every subscriber, a closed pipe is dropped.
+        The gateway keeps the pipes non-blocking, a frame that doesn't fit in a full pipe is dropped and counted, except
+        with the "never" DropPolicy, which waits for room.
+        """
+        for receiver, pipe in list(self._channels.items()): # type: ignore
+            try:
+                self._write_direct(pipe, frame)
+            except BlockingIOError:
+                count_drop(self.queuesList, self._topicId)
+            except OSError:
+                # the subscriber is gone, the gateway sends the unsubscribe when it notices it too
+                pipe.close()
+                del self._channels[receiver] # type: ignore
+
+    def _write_direct(self, pipe, frame):
+        """
+        Writes a frame into the pipe of a direct subscriber, raises BlockingIOError if the pipe is full, except with "never",
+        which blocks until the pipe has room, or raises OSError once the subscriber is gone. The frames of the direct topics
+        are shorter than PIPE_BUF, so a full pipe takes none of the frame.
+        """
+        try:
+            pipe.send_bytes(frame)
+            return
+        except BlockingIOError:
+            if self._dropPolicy != "never":
+                raise
+        # the pipe is shared with the gateway, so it stays non-blocking and the sender waits for room itself; a pipe
+        # whose reader is gone selects as writable and the write raises BrokenPipeError
+        while True:
+            select.select([], [pipe.fileno()], [])
+            try:
+                pipe.send_bytes(frame)
+                return
+            except BlockingIOError:
+                pass
+
+    def __del__(self):
+        """
+        Cleans up by closing the direct channels.
+        """
+        if self._controlRecv is not None:
+            self._controlRecv.close()
+            self._controlSend.close() # type: ignore
+        for pipe in (self._channels or {}).values():
+            pipe.close()
@@ -27,8 +27,22 @@
 # OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE
 
 import inspect
+import pickle
+import time
+from collections import deque
 from multiprocessing import Pipe
 
+from src.utils.messages.messageSchema import topic_of, decode_value, blob_of, MARK_NEWER, MARK_SYNCED, ACK_SYNC
+from src.utils.messages.messageInbox import messageInbox
+from src.utils.messages.latencyTracer import latencyTracer, tracing_enabled
+
+# the messages the gateway sends for an acknowledgement with ACK_SYNC are polled for _SYNC_RETRIES more times, _SYNC_RETRY
+# seconds apart, the ones coming later are read with the next messages; until they came, at most _SYNC_TIMEOUT seconds,
+# the messages read before them are not returned
+_SYNC_RETRIES = 5
+_SYNC_RETRY = 0.001
+_SYNC_TIMEOUT = 1.0
+
 class messageHandlerSubscriber: 
     """Class which will handle subscriber functionalities.\n
     Args:
@@ -36,26 +50,67 @@ class messageHandlerSubscriber:
         message (enum): A specific message
         deliveryMode (string): Determines how messages are delivered from the queue. ("FIFO" or "LastOnly").
         subscribe (bool): A flag to automatically subscribe the message.
+        maxRate (float, optional): The most messages per second the gateway delivers, the ones in between are conflated. Defaults to None.
+        depth (int, optional): The most unread messages of a FIFO subscription, the gateway drops the oldest beyond it. Defaults to None.
+        inbox (bool or messageInbox, optional): True reads the messages from the inbox of the process instead of a pipe of its own,
+            an inbox reads them from that inbox. Defaults to False.
+
+    The QoS policy is declared when subscribing and enforced by the gateway: a "LastOnly" subscriber gets at most one unread
+    message in its pipe, the gateway keeps only the latest one until the subscriber reads it. When the gateway marks that
+    newer messages wait, the subscriber asks for them and returns nothing until they came, so LastOnly returns the latest
+    value and a FIFO with a depth the depth latest messages, see Subscription. receive never blocks, also when the pipe only
+    holds the marks of the gateway. The frames of a "direct" topic
+    don't pass through the gateway, their QoS policy is left to the reading side: LastOnly still returns only the latest one.
+    A message whose value was moved into a shared memory blob by the sender is read back from the blob, which is then
+    released to the gateway, also when the message is skipped or emptied without being read.
+    With inbox=True all such subscribers of a process share one pipe from the gateway, see messageInbox. Direct topics and
+    topics outside the schema always get a pipe of their own.
+    When the latency tracing is on, the latency of every message read is recorded in the histograms of the process, see latencyTracer.
     """
+
+    # the polls of the pipe, _SYNC_RETRY seconds apart, for the messages the gateway sends after a MARK_NEWER
+    _syncRetries = _SYNC_RETRIES
         
-    def __init__(self, queuesList, message, deliveryMode="fifo", subscribe=False):
+    def __init__(self, queuesList, message, deliveryMode="fifo", subscribe=False, maxRate=None, depth=None, inbox=False):
         self._queuesList = queuesList
         self._message = message
         self._deliveryMode = str.lower(deliveryMode)
-        self._pipeRecv, self._pipeSend = Pipe(duplex=False)
+        self._maxRate = maxRate
+        self._depth = depth
+        # messages declared in allMessages are delivered as schema frames, any other as pickled dictionaries
+        self._topic = topic_of(message)
+        # the tracer is looked up when recording, the subscriber may be created in the parent of the reading process
+        self._tracing = self._topic is not None and tracing_enabled(queuesList)
+        self._mailbox = None
+        if inbox and self._topic is not None and not self._topic.direct:
+            if inbox is True:
+                inbox = messageInbox.of(queuesList)
+            # the mailbox reads like the receiving end of a pipe
+            self._mailbox = inbox.mailbox(self._topic)
+            self._pipeRecv, self._pipeSend = self._mailbox, None
+        else:
+            self._pipeRecv, self._pipeSend = Pipe(duplex=False)
+        # acknowledgements of the read messages, only created for a subscription with a QoS policy
+        self._ackRecv, self._ackSend = None, None
+        self._managed = False
+        # the messages read from the pipe of a subscription with a QoS policy and not returned yet
+        self._pending = deque()
+        # until when the MARK_SYNCED answering an ACK_SYNC is awaited, None when no answer is
+        self._syncDeadline = None
+        self._subscribed = False
         frame = inspect.currentframe().f_back # type: ignore
         if 'self' in frame.f_locals: # type: ignore
             self._receiver = frame.f_locals['self'].__class__.__name__ # type: ignore
         else:
             self._receiver = frame.f_globals.get('__name__', None) # type: ignore
-        
-        if subscribe == True:
-            self.subscribe()
 
         if self._deliveryMode not in ["fifo", "lastonly"]:
             print("WARNING! Wrong delivery mode supplied.", deliveryMode, "instead of FIFO or LastOnly.", self._message, self._receiver)
             print("WARNING! Switching to FIFO")
             self._deliveryMode = "fifo"
+        
+        if subscribe == True:
+            self.subscribe()
 
     def receive(self):
         """
@@ -63,10 +118,29 @@ class messageHandlerSubscriber:
 
         Returns None if there no data in the Pipe
         """
-        if not self._pipeRecv.poll():
+        if not self._ready():
             return None
         else:
             return self.receive_with_block()
+
+    def _ready(self):
+        """
+        Reads the pipe without blocking, the marks of the gateway included, and returns True if a message can be returned
+        without blocking.
+        """
+        if self._managed:
+            self._fill(False)
+            synced = self._synced()
+            return bool(self._pending) and synced
+        return bool(self._pending) or self._pipeRecv.poll()
+
+    def _synced(self):
+        """
+        Returns True unless the messages the gateway sends for an ACK_SYNC are still awaited, for at most _SYNC_TIMEOUT.
+        """
+        if self._syncDeadline is not None and time.monotonic() >= self._syncDeadline:
+            self._syncDeadline = None
+        return self._syncDeadline is None
         
     def receive_with_block(self):
         """
@@ -76,39 +150,173 @@ class messageHandlerSubscriber:
             message's data type: The received message.
         """
         
-        message = self._pipeRecv.recv()
-        messageType = type(message["value"]).__name__
-        
-        if self._deliveryMode == "fifo":
-            if messageType != self._message.msgType.value:
-                print("WARNING! Message type and value type are not matching.", self._message, "received:", messageType, "expected:", self._message.msgType.value)
-            return message["value"]
-        
-        elif self._deliveryMode == "lastonly":
-            while (self._pipeRecv.poll()):
-                message = self._pipeRecv.recv()
+        if self._managed:
+            self._fill(not self._pending)
+            while not self._pending:
+                self._fill(True)
+            while not self._synced() and self._pipeRecv.poll(self._syncDeadline - time.monotonic()):
+                self._fill(False)
+            payload = self._pending.pop() if self._deliveryMode == "lastonly" else self._pending.popleft()
+        else:
+            payload = self._pipeRecv.recv_bytes()
+            if self._deliveryMode == "lastonly":
+                # the stale messages are skipped as raw bytes, only the last one is unpickled
+                while (self._pipeRecv.poll()):
+                    self._discard(payload)
+                    payload = self._pipeRecv.recv_bytes()
 
-            if messageType != self._message.msgType.value:
-                print("WARNING! Message type and value type are not matching.", self._message, "received:", messageType, "expected:", self._message.msgType.value)
-            return message["value"]
+        if self._topic is not None:
+            if self._tracing:
+                latencyTracer.of(self._queuesList).record(payload, time.monotonic())
+            try:
+                value = decode_value(payload)
+            except FileNotFoundError:
+                print("WARNING! The blob of the message was already freed.", self._message, self._receiver)
+                return None
+            finally:
+                self._discard(payload)
+        else:
+            value = pickle.loads(payload)["value"]
+        messageType = type(value).__name__
+        if messageType != self._message.msgType.value:
+            print("WARNING! Message type and value type are not matching.", self._message, "received:", messageType, "expected:", self._message.msgType.value)
+        return value
         
     def empty(self):
         """
         Empties the receiving pipe of any existing data.
         """
+        while self._pending:
+            self._discard(self._pending.popleft())
+        count = 0
         while self._pipeRecv.poll():
-            self._pipeRecv.recv()
+            payload = self._pipeRecv.recv_bytes()
+            if payload != MARK_NEWER and payload != MARK_SYNCED:
+                self._discard(payload)
+                count += 1
+        self._syncDeadline = None
+        self._acknowledge(count)
+
+    def _fill(self, block):
+        """
+        Moves the messages of the pipe into the pending ones, reading at least one if block is set, and acknowledges them.
+        When the gateway marked that newer messages wait, asks for them and polls _syncRetries more times for them.
+        """
+        count = 0
+        while block or self._pipeRecv.poll():
+            block = False
+            payload = self._pipeRecv.recv_bytes()
+            if payload == MARK_NEWER:
+                self._acknowledge(count | ACK_SYNC)
+                count = 0
+                self._sync()
+            elif payload == MARK_SYNCED:
+                # the answer to an ACK_SYNC, later than _sync polled for it
+                self._syncDeadline = None
+            else:
+                self._keep(payload)
+                count += 1
+        self._acknowledge(count)
+
+    def _sync(self):
+        """
+        Reads the messages the gateway sends for an acknowledgement with ACK_SYNC, up to MARK_SYNCED, without blocking:
+        the pipe is polled again _syncRetries times, _SYNC_RETRY seconds apart, then the answer is awaited by _fill.
+        """
+        count = 0
+        for attempt in range(self._syncRetries + 1):
+            if attempt:
+                time.sleep(_SYNC_RETRY)
+            while self._pipeRecv.poll():
+                payload = self._pipeRecv.recv_bytes()
+                if payload == MARK_SYNCED:
+                    self._syncDeadline = None
+                    self._acknowledge(count)
+                    return
+                if payload != MARK_NEWER:
+                    self._keep(payload)
+                    count += 1
+        self._syncDeadline = time.monotonic() + _SYNC_TIMEOUT
+        self._acknowledge(count)
+
+    def _keep(self, payload):
+        """
+        Adds a message to the pending ones, the oldest one is dropped beyond the depth, one for LastOnly.
+        """
+        depth = 1 if self._deliveryMode == "lastonly" else self._depth
+        if depth is not None and len(self._pending) >= depth:
+            self._discard(self._pending.popleft())
+        self._pending.append(payload)
+
+    def _discard(self, payload):
+        """
+        Releases the blob referenced by a frame once it was read or skipped.
+        """
+        if self._topic is None:
+            return
+        name = blob_of(payload)
+        if name is not None:
+            self._queuesList["Config"].put(
+                {
+                    "Subscribe/Unsubscribe": "release",
+                    "Owner": self._message.Owner.value,
+                    "msgID": self._message.msgID.value,
+                    "Blob": name,
+                }
+            )
+
+    def _acknowledge(self, count):
+        """
+        Tells the gateway how many messages were read, so it can deliver the ones it holds back.
+        """
+        if self._managed and count:
+            try:
+                if self._mailbox is not None:
+                    self._mailbox.acknowledge(count)
+                else:
+                    self._ackSend.send_bytes(count.to_bytes(4, "little")) # type: ignore
+            except OSError:
+                # the gateway is gone
+                pass
+
+    def _qos(self):
+        """
+        Returns the QoS policy declared to the gateway, None for a plain FIFO subscription or a direct topic.
+        """
+        if self._topic is not None and self._topic.direct:
+            return None
+        depth = 1 if self._deliveryMode == "lastonly" else self._depth
+        if depth is None and self._maxRate is None:
+            return None
+        return {"depth": depth, "maxRate": self._maxRate}
 
     def subscribe(self):
         """
-        Subscribes to messages.
+        Subscribes to messages. Subscribing again replaces the previous subscription, with the current QoS policy.
         """
+        qos = self._qos()
+        self._managed = qos is not None
+        self._subscribed = True
+        if self._mailbox is not None:
+            To = {
+                "receiver": self._receiver,
+                "pipe": self._mailbox.pipe,
+                "ack": self._mailbox.ack if self._managed else None,
+                "inbox": self._mailbox.inbox,
+                "token": self._mailbox.token,
+            }
+        else:
+            if self._managed and self._ackSend is None:
+                self._ackRecv, self._ackSend = Pipe(duplex=False)
+            To = {"receiver": self._receiver, "pipe": self._pipeSend, "ack": self._ackRecv if self._managed else None}
         self._queuesList["Config"].put(
             {
                 "Subscribe/Unsubscribe": "subscribe",
                 "Owner": self._message.Owner.value,
                 "msgID": self._message.msgID.value,
-                "To": {"receiver": self._receiver, "pipe": self._pipeSend},
+                "To": To,
+                "QoS": qos,
+                "Codec": "schema" if self._topic is not None else "pickle",
             }
         )
 
@@ -116,6 +324,7 @@ class messageHandlerSubscriber:
         """
         Unsubscribes from messages.
         """
+        self._subscribed = False
         self._queuesList["Config"].put(
             {
                 "Subscribe/Unsubscribe": "unsubscribe",
@@ -132,23 +341,38 @@ class messageHandlerSubscriber:
         Returns:
             bool: True if data is available, False otherwise.
         """
-        return self._pipeRecv.poll()
+        return bool(self._pending) or self._pipeRecv.poll()
+
+    def fileno(self):
+        """
+        Returns the file descriptor of the receiving pipe, readable when a message is waiting, for selectors and connection.wait.
+        The messages already read from the pipe and not returned yet are only seen by is_data_in_pipe. The pipe of an inbox is shared by the subscribers of the process, readable when a message is waiting for any of them.
+        """
+        return self._pipeRecv.fileno()
 
     def set_delivery_mode_to_fifo(self):
         """
-        Sets delivery mode to FIFO.
+        Sets delivery mode to FIFO. An active subscription is renewed with the new QoS policy.
         """
         self._deliveryMode = "fifo"
+        if self._subscribed:
+            self.subscribe()
 
     def set_delivery_mode_to_last_only(self):
         """
-        Sets delivery mode to LastOnly.
+        Sets delivery mode to LastOnly. An active subscription is renewed with the new QoS policy.
         """
         self._deliveryMode = "lastonly"
+        if self._subscribed:
+            self.subscribe()
 
     def __del__(self): 
         """
         Cleans up by closing the pipes.
         """
         self._pipeRecv.close()
-        self._pipeSend.close()
+        if self._pipeSend is not None:
+            self._pipeSend.close()
+        if self._ackSend is not None:
+            self._ackRecv.close() # type: ignore
+            self._ackSend.close()
@@ -0,0 +1,124 @@
+# Copyright (c) 2019, Bosch Engineering Center Cluj and BFMC organizers
+# All rights reserved.
+
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met:
+
+# 1. Redistributions of source code must retain the above copyright notice, this
+#    list of conditions and the following disclaimer.
+
+# 2. Redistributions in binary form must reproduce the above copyright notice,
+#    this list of conditions and the following disclaimer in the documentation
+#    and/or other materials provided with the distribution.
+
+# 3. Neither the name of the copyright holder nor the names of its
+#    contributors may be used to endorse or promote products derived from
+#    this software without specific prior written permission.
+
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS"
+# AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE
+# IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE
+# DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT HOLDER OR CONTRIBUTORS BE LIABLE
+# FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL
+# DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR
+# SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER
+# CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY,
+# OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE
+# OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE
+
+import inspect
+from multiprocessing import Pipe
+from multiprocessing.connection import wait
+
+from src.utils.messages.messageSchema import TOPICS_BY_ID, FRAME_HEADER, FLAG_BLOB, frame_topic_id, blob_of, from_blob
+
+
+class messageHandlerTap:
+    """Class which will handle a tap of the bus: every schema frame sent on the bus, whatever its topic.\n
+    Args:
+        queuesList (dictionary of multiprocessing.queues.Queue): Dictionary of queues where the ID is the type of messages.
+        tap (bool, optional): A flag to automatically start the tap. Defaults to False.
+
+    Every gateway partition writes into a pipe of its own, so the tap sends a "tap" message with a pipe to the config queue of
+    every partition. The frames of the direct topics are written by their senders into one more pipe. The frames come as
+    they are sent, a frame referencing a shared memory blob is returned with its payload read back from the blob, which is
+    then released. The messages outside the schema aren't tapped.
+    """
+
+    def __init__(self, queuesList, tap=False):
+        self._queuesList = queuesList
+        # the config queue of every gateway partition, see gateway/partitions.py
+        self._configQueues = [name for name in queuesList if name.split(":")[0] == "Config"]
+        self._pipes = {name: Pipe(duplex=False) for name in self._configQueues}
+        self._directRecv, self._directSend = Pipe(duplex=False)
+        self._receivers = [pipeRecv for pipeRecv, _ in self._pipes.values()] + [self._directRecv]
+        self._ready = []
+        self.missedBlobs = 0
+        frame = inspect.currentframe().f_back # type: ignore
+        if 'self' in frame.f_locals: # type: ignore
+            self._receiver = frame.f_locals['self'].__class__.__name__ # type: ignore
+        else:
+            self._receiver = frame.f_globals.get('__name__', None) # type: ignore
+
+        if tap == True:
+            self.tap()
+
+    def tap(self):
+        """Starts the tap on every gateway partition."""
+        for name, (_, pipeSend) in self._pipes.items():
+            self._queuesList[name].put(
+                {
+                    "Subscribe/Unsubscribe": "tap",
+                    "To": {"receiver": self._receiver, "pipe": pipeSend, "direct": self._directSend},
+                }
+            )
+
+    def untap(self):
+        """Stops the tap on every gateway partition."""
+        for name in self._configQueues:
+            self._queuesList[name].put({"Subscribe/Unsubscribe": "untap", "To": {"receiver": self._receiver}})
+
+    def receive(self, timeout=0):
+        """Returns the next frame of the bus, None if there is none within timeout seconds (None waits until one arrives)."""
+        while True:
+            if not self._ready:
+                self._ready = wait(self._receivers, timeout)
+                if not self._ready:
+                    return None
+            pipeRecv = self._ready.pop()
+            if not pipeRecv.poll():
+                continue
+            frame = pipeRecv.recv_bytes()
+            if FRAME_HEADER.unpack_from(frame)[2] & FLAG_BLOB:
+                frame = self._inline(frame)
+                if frame is None:
+                    continue
+            # the pipe may hold more frames, it is checked again after the other ready ones
+            self._ready.insert(0, pipeRecv)
+            return frame
+
+    def _inline(self, frame):
+        """Reads the payload of a frame back from its blob and releases the blob to the gateway."""
+        name = blob_of(frame)
+        try:
+            return from_blob(frame)
+        except FileNotFoundError:
+            self.missedBlobs += 1
+            return None
+        finally:
+            topic = TOPICS_BY_ID[frame_topic_id(frame)]
+            self._queuesList["Config"].put({"Subscribe/Unsubscribe": "release", "Owner": topic.owner, "msgID": topic.msgID, "Blob": name})
+
+    def filenos(self):
+        """Returns the file descriptors of the pipes of the tap, for selectors and connection.wait."""
+        return [pipeRecv.fileno() for pipeRecv in self._receivers]
+
+    def __del__(self):
+        """
+        Cleans up by closing the pipes.
+        """
+        for pipeRecv, pipeSend in self._pipes.values():
+            pipeRecv.close()
+            pipeSend.close()
+        self._directRecv.close()
+        self._directSend.close()
@@ -0,0 +1,228 @@
+# Copyright (c) 2019, Bosch Engineering Center Cluj and BFMC organizers
+# All rights reserved.
+
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met:
+
+# 1. Redistributions of source code must retain the above copyright notice, this
+#    list of conditions and the following disclaimer.
+
+# 2. Redistributions in binary form must reproduce the above copyright notice,
+#    this list of conditions and the following disclaimer in the documentation
+#    and/or other materials provided with the distribution.
+
+# 3. Neither the name of the copyright holder nor the names of its
+#    contributors may be used to endorse or promote products derived from
+#    this software without specific prior written permission.
+
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS"
+# AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE
+# IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE
+# DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT HOLDER OR CONTRIBUTORS BE LIABLE
+# FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL
+# DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR
+# SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER
+# CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY,
+# OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE
+# OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE
+
+import itertools
+import os
+import struct
+import threading
+import time
+from collections import deque
+from multiprocessing import Pipe
+from multiprocessing.connection import wait
+
+from src.utils.messages.messageSchema import TOPICS_BY_ID, FRAME_HEADER, queue_key, frame_topic_id, blob_of
+
+# the token of the subscriber put by the gateway before every message of an inbox, see gateway/threads/subscription.py
+_TOKEN = struct.Struct("<I")
+
+
+class messageInbox:
+    """The inbox of a process: one pipe from the gateway shared by all the subscribers of the process which ask for it,
+    instead of one pipe per subscriber. The gateway puts the token of the subscriber before every message and the
+    subscribers demultiplex the pipe locally, each reading its own mailbox.\n
+    There is one inbox per process, created by the first subscriber asking for it. A process forked after that gets its
+    own. The subscribers created in a parent process for a child, like the ones of processDashboard which subscribes in its
+    constructor, must be given an inbox of their own, created for the child, since only one process may read an inbox. Since every data queue may be served by another gateway partition, and two gateways can't write the same pipe,
+    an inbox holds one pipe per data queue its subscribers read from: one with the "single" gateway, per priority queue.
+
+    Args:
+        queuesList (dictionary of multiprocessing.queues.Queue): Dictionary of queues where the ID is the type of messages.
+    """
+
+    _inboxes = {}
+    _inboxesLock = threading.Lock()
+
+    @classmethod
+    def of(cls, queuesList):
+        """Returns the inbox of the calling process for the queues, creating it the first time."""
+        key = (os.getpid(), id(queuesList["Config"]))
+        with cls._inboxesLock:
+            inbox = cls._inboxes.get(key)
+            if inbox is None:
+                inbox = cls._inboxes[key] = cls(queuesList)
+            return inbox
+
+    def __init__(self, queuesList):
+        self._queuesList = queuesList
+        self._name = "inbox:%d:%x" % (os.getpid(), id(self))
+        # {data queue: _InboxChannel}
+        self._channels = {}
+        self._tokens = itertools.count(1)
+        self._lock = threading.Lock()
+
+    def mailbox(self, topic):
+        """Opens the mailbox of a new subscriber of a topic, on the pipe of the data queue the topic is sent on.
+
+        Args:
+            topic (messageSchema.Topic): The topic of the subscriber.
+
+        Returns:
+            _Mailbox: Reads like the receiving end of a pipe: poll, recv_bytes and fileno.
+        """
+        queue = queue_key(self._queuesList, topic.queue, topic.owner)
+        with self._lock:
+            channel = self._channels.get(queue)
+            if channel is None:
+                channel = self._channels[queue] = _InboxChannel(self._name + "/" + queue, self._queuesList)
+            return channel.open(next(self._tokens))
+
+
+class _InboxChannel:
+    """One pipe of an inbox and the mailboxes of its subscribers. The pipe is read by whichever subscriber asks first,
+    under the lock of the channel, and the messages are moved into the mailboxes of their tokens."""
+
+    def __init__(self, name, queuesList):
+        self.name = name
+        self.queuesList = queuesList
+        self.pipeRecv, self.pipeSend = Pipe(duplex=False)
+        self.ackRecv, self.ackSend = Pipe(duplex=False)
+        # {token: _Mailbox}
+        self.mailboxes = {}
+        self.condition = threading.Condition()
+        # True while a thread blocks on the pipe, outside the lock
+        self.reading = False
+
+    def open(self, token):
+        with self.condition:
+            mailbox = self.mailboxes[token] = _Mailbox(self, token)
+            return mailbox
+
+    def close(self, mailbox):
+        with self.condition:
+            if self.mailboxes.get(mailbox.token) is mailbox:
+                del self.mailboxes[mailbox.token]
+
+    def pump(self):
+        """Moves the messages waiting in the pipe into their mailboxes. Called with the lock held, by one thread at a time.
+
+        Returns:
+            bool: True if a message was moved.
+        """
+        if self.reading:
+            # the blocked thread moves them as soon as it wakes up
+            return False
+        moved = False
+        while self.pipeRecv.poll():
+            data = self.pipeRecv.recv_bytes()
+            token, = _TOKEN.unpack_from(data)
+            payload = data[_TOKEN.size:]
+            mailbox = self.mailboxes.get(token)
+            if mailbox is None:
+                self._orphan(payload)
+            else:
+                mailbox.messages.append(payload)
+                moved = True
+        if moved:
+            self.condition.notify_all()
+        return moved
+
+    def _orphan(self, frame):
+        """Releases the blob of a frame sent to a subscriber closed in the meantime."""
+        if len(frame) < FRAME_HEADER.size:
+            # a mark of the gateway, see Subscription
+            return
+        name = blob_of(frame)
+        if name is not None:
+            topic = TOPICS_BY_ID[frame_topic_id(frame)]
+            self.queuesList["Config"].put({"Subscribe/Unsubscribe": "release", "Owner": topic.owner, "msgID": topic.msgID, "Blob": name})
+
+    def wait_for(self, mailbox, timeout=None):
+        """Blocks until the mailbox holds a message, for at most timeout seconds. One thread blocks on the pipe, the other
+        ones on the condition.
+
+        Returns:
+            bool: True if the mailbox holds a message.
+        """
+        deadline = None if timeout is None else time.monotonic() + timeout
+        with self.condition:
+            while not mailbox.messages:
+                remaining = None if deadline is None else deadline - time.monotonic()
+                if remaining is not None and remaining <= 0:
+                    return False
+                if self.reading:
+                    self.condition.wait(remaining)
+                    continue
+                self.reading = True
+                self.condition.release()
+                try:
+                    wait([self.pipeRecv], remaining)
+                finally:
+                    self.condition.acquire()
+                    self.reading = False
+                if not self.pump():
+                    # another thread may be waiting for its turn to block on the pipe
+                    self.condition.notify_all()
+            return True
+
+
+class _Mailbox:
+    """The messages of one subscriber of an inbox, read like the receiving end of a pipe."""
+
+    def __init__(self, channel, token):
+        self.channel = channel
+        self.token = token
+        self.messages = deque()
+
+    @property
+    def inbox(self):
+        return self.channel.name
+
+    @property
+    def pipe(self):
+        """The writing end of the pipe of the inbox, sent to the gateway with every subscription."""
+        return self.channel.pipeSend
+
+    @property
+    def ack(self):
+        """The reading end of the ack pipe of the inbox, sent to the gateway with every subscription with a QoS policy."""
+        return self.channel.ackRecv
+
+    def poll(self, timeout=0):
+        if not self.messages:
+            with self.channel.condition:
+                self.channel.pump()
+            if not self.messages and timeout:
+                return self.channel.wait_for(self, timeout)
+        return bool(self.messages)
+
+    def recv_bytes(self):
+        if not self.messages:
+            self.channel.wait_for(self)
+        return self.messages.popleft()
+
+    def acknowledge(self, count):
+        """Tells the gateway how many messages of this mailbox were read."""
+        self.channel.ackSend.send_bytes(_TOKEN.pack(self.token) + count.to_bytes(4, "little"))
+
+    def fileno(self):
+        """The file descriptor of the pipe of the inbox, readable when a message is waiting for any of its subscribers."""
+        return self.channel.pipeRecv.fileno()
+
+    def close(self):
+        self.channel.close(self)
+        self.messages.clear()
@@ -0,0 +1,365 @@
+# Copyright (c) 2019, Bosch Engineering Center Cluj and BFMC organizers
+# All rights reserved.
+
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met:
+
+# 1. Redistributions of source code must retain the above copyright notice, this
+#    list of conditions and the following disclaimer.
+
+# 2. Redistributions in binary form must reproduce the above copyright notice,
+#    this list of conditions and the following disclaimer in the documentation
+#    and/or other materials provided with the distribution.
+
+# 3. Neither the name of the copyright holder nor the names of its
+#    contributors may be used to endorse or promote products derived from
+#    this software without specific prior written permission.
+
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS"
+# AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE
+# IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE
+# DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT HOLDER OR CONTRIBUTORS BE LIABLE
+# FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL
+# DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR
+# SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER
+# CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY,
+# OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE
+# OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE
+
+# The schema of the bus, compiled from allMessages when this module is imported. Every message class gets a numeric topic ID
+# (its position in allMessages, so all the processes agree on it) and a frame codec.
+#
+# Frame layout (little endian):
+#       topic ID (uint16) | codec (uint8) | flags (uint8) | [send time (float64)] | payload
+#
+# The send time, time.monotonic() of the sender, is only present with the STAMPED flag, set for the topics with a Deadline.
+# A frame traced for latency (see latencyTracer) has the STAMPED and the TRACED flags and the send time is followed by the
+# times the gateway took the frame from its queue and wrote it into the pipe of the subscriber, 0 until then:
+#       topic ID | codec | flags | send time (float64) | gateway in (float64) | gateway out (float64) | payload
+# With the BLOB flag the payload is in a shared memory blob (see blobStore) and the frame ends with a reference to it:
+#       payload size (uint32) | blob name length (uint32) + blob name
+#
+# Payload per codec:
+#       int             int64
+#       float           float64
+#       bool            1 byte
+#       str / bytes     length (uint32) + UTF-8 text / raw bytes
+#       pickle          length (uint32) + pickled value, the fallback for dict and for any value not matching a codec
+
+import pickle
+import struct
+import time
+import zlib
+from enum import Enum
+
+import src.utils.messages.allMessages as allMessages
+from src.utils.sharedmemory.blobStore import BLOB_THRESHOLD, create_blob, read_blob
+
+FRAME_HEADER = struct.Struct("<HBB")
+_LENGTH = struct.Struct("<I")
+_INT = struct.Struct("<q")
+_FLOAT = struct.Struct("<d")
+_BOOL = struct.Struct("<?")
+_STAMP = struct.Struct("<d")
+_TRACE = struct.Struct("<ddd")
+
+FLAG_STAMPED = 0x01
+FLAG_BLOB = 0x02
+FLAG_TRACED = 0x04
+
+# the offsets of the gateway times in a traced frame
+TRACE_IN_OFFSET = FRAME_HEADER.size + _STAMP.size
+TRACE_OUT_OFFSET = TRACE_IN_OFFSET + _STAMP.size
+
+# Besides the frames, the gateway writes two marks into the pipe of a subscription with a depth (see Subscription), both
+# shorter than any frame: MARK_NEWER after the unread messages when newer ones wait in the gateway, and MARK_SYNCED after
+# the messages delivered for an acknowledgement with the ACK_SYNC bit, which asks for them right away.
+MARK_NEWER = b""
+MARK_SYNCED = b"\x00"
+ACK_SYNC = 1 << 31
+
+# the longest frame a process accepts from outside the machine (see threadBridge), the bus moves longer payloads into blobs
+MAX_FRAME_SIZE = 1024 * 1024
+
+CODEC_PICKLE = 0
+CODEC_INT = 1
+CODEC_FLOAT = 2
+CODEC_BOOL = 3
+CODEC_STR = 4
+CODEC_BYTES = 5
+
+DROP_POLICIES = ("never", "dropNewest", "dropOldest")
+
+# The priority classes a topic can declare, with the queue carrying them to the gateway. The gateway serves the queues by
+# priority and, between the messages of the same priority, the earliest deadline first. Both only apply to the topics
+# routed by the gateway: the frames of a direct topic skip its queues, so a direct topic can't declare a Priority nor a
+# Deadline.
+PRIORITY_QUEUES = {
+    "critical": "Critical",
+    "control": "Warning",
+    "normal": "General",
+}
+_PRIORITY_OF_QUEUE = {queue: priority for priority, queue in PRIORITY_QUEUES.items()}
+
+_CODECS_BY_TYPE = {int: CODEC_INT, float: CODEC_FLOAT, bool: CODEC_BOOL, str: CODEC_STR, bytes: CODEC_BYTES}
+
+
+def _encode_payload(codec, value):
+    if codec == CODEC_FLOAT:
+        return _FLOAT.pack(value)
+    if codec == CODEC_INT:
+        return _INT.pack(value)
+    if codec == CODEC_BOOL:
+        return _BOOL.pack(value)
+    if codec == CODEC_STR:
+        value = value.encode("utf-8")
+    elif codec == CODEC_PICKLE:
+        value = pickle.dumps(value, pickle.HIGHEST_PROTOCOL)
+    return _LENGTH.pack(len(value)) + value
+
+
+def decode_payload(codec, frame, offset):
+    """Decodes the payload of a frame starting at offset.
+
+    Returns:
+        tuple: The value and the offset right after the payload.
+    """
+    if codec == CODEC_FLOAT:
+        return _FLOAT.unpack_from(frame, offset)[0], offset + _FLOAT.size
+    if codec == CODEC_INT:
+        return _INT.unpack_from(frame, offset)[0], offset + _INT.size
+    if codec == CODEC_BOOL:
+        return _BOOL.unpack_from(frame, offset)[0], offset + _BOOL.size
+    length = _LENGTH.unpack_from(frame, offset)[0]
+    start = offset + _LENGTH.size
+    end = start + length
+    if codec == CODEC_STR:
+        return str(frame[start:end], "utf-8"), end
+    if codec == CODEC_BYTES:
+        return bytes(frame[start:end]), end
+    return pickle.loads(frame[start:end]), end
+
+
+class Topic:
+    """The compiled schema of one message class.
+
+    Args:
+        topicId (int): The numeric ID of the topic on the bus.
+        message (enum): The message class from allMessages.
+    """
+
+    def __init__(self, topicId, message):
+        self.topicId = topicId
+        self.message = message
+        self.name = message.__name__
+        # a declared priority class decides the queue of the topic
+        if "Priority" in message.__members__:
+            self.priority = message.Priority.value
+            if self.priority not in PRIORITY_QUEUES:
+                raise ValueError("%s: unknown Priority %r" % (message.__name__, self.priority))
+            self.queue = PRIORITY_QUEUES[self.priority]
+        else:
+            self.queue = message.Queue.value
+            self.priority = _PRIORITY_OF_QUEUE.get(self.queue, "normal")
+        # the longest time, in seconds, from the sender to the gateway dispatching a message, None for no deadline
+        self.deadline = float(message.Deadline.value) if "Deadline" in message.__members__ else None
+        self.owner = message.Owner.value
+        self.msgID = message.msgID.value
+        self.msgType = message.msgType.value
+        self.key = (self.owner, self.msgID)
+        # a "direct" topic only uses the gateway to connect its senders to its subscribers
+        self.direct = "Routing" in message.__members__ and message.Routing.value == "direct"
+        if self.direct and ("Priority" in message.__members__ or self.deadline is not None):
+            raise ValueError("%s: a direct topic skips the queues of the gateway, Priority and Deadline don't apply to it" % self.name)
+        # the gateway keeps the last message of a "latched" topic and replays it to every new subscriber
+        self.latched = "Retention" in message.__members__ and message.Retention.value == "latched"
+        # what the sender does when the queue of the topic is full: "never" drops (blocks), "dropNewest" or "dropOldest"
+        if "DropPolicy" in message.__members__:
+            self.dropPolicy = message.DropPolicy.value
+        else:
+            self.dropPolicy = "never" if self.queue == "Critical" else "dropNewest"
+        if self.dropPolicy not in DROP_POLICIES:
+            raise ValueError("%s: unknown DropPolicy %r" % (self.name, self.dropPolicy))
+
+        # the codec matching msgType, the frame headers are built once
+        flags = FLAG_STAMPED if self.deadline is not None else 0
+        self._headers = {codec: FRAME_HEADER.pack(topicId, codec, flags) for codec in range(CODEC_BYTES + 1)}
+        self._tracedHeaders = {codec: FRAME_HEADER.pack(topicId, codec, FLAG_STAMPED | FLAG_TRACED) for codec in range(CODEC_BYTES + 1)}
+        self._type = {"int": int, "float": float, "bool": bool, "str": str, "bytes": bytes}.get(self.msgType)
+        self._codec = _CODECS_BY_TYPE.get(self._type, CODEC_PICKLE) # type: ignore
+        # the frames of a direct topic are written whole into pipes shared with the gateway, see messageHandlerSender
+        if self.direct and self._codec in (CODEC_BYTES, CODEC_PICKLE):
+            raise ValueError("%s: the frames of a direct topic must fit in PIPE_BUF, its msgType is int, float, bool or str, not %r" % (self.name, self.msgType))
+
+    def encode(self, value, traced=False):
+        """Encodes a value of this topic into a frame, a traced frame carries the send time and room for the gateway times."""
+        codec = self._codec if value.__class__ is self._type else _CODECS_BY_TYPE.get(value.__class__, CODEC_PICKLE)
+        try:
+            payload = _encode_payload(codec, value)
+        except (struct.error, OverflowError):
+            # an int too big for int64
+            codec = CODEC_PICKLE
+            payload = _encode_payload(codec, value)
+        if traced:
+            return self._tracedHeaders[codec] + _TRACE.pack(time.monotonic(), 0.0, 0.0) + payload
+        if self.deadline is not None:
+            return self._headers[codec] + _STAMP.pack(time.monotonic()) + payload
+        return self._headers[codec] + payload
+
+    def __repr__(self):
+        return "Topic(%d, %s)" % (self.topicId, self.name)
+
+
+TOPICS_BY_ID = {}
+TOPICS_BY_KEY = {}
+_TOPICS_BY_MESSAGE = {}
+
+
+def _compile():
+    topicId = 0
+    for member in vars(allMessages).values():
+        if isinstance(member, type) and issubclass(member, Enum) and member is not Enum:
+            topicId += 1
+            topic = Topic(topicId, member)
+            TOPICS_BY_ID[topicId] = topic
+            TOPICS_BY_KEY[topic.key] = topic
+            _TOPICS_BY_MESSAGE[member] = topic
+
+
+_compile()
+
+
+def schema_fingerprint():
+    """Returns a checksum of the schema, two processes agree on the topic IDs and the codecs only if their checksums match."""
+    return zlib.crc32("\n".join("%d %s %s" % (topic.topicId, topic.name, topic.msgType) for topic in TOPICS_BY_ID.values()).encode("utf-8"))
+
+
+def topic_of(message):
+    """Returns the topic of a message class, None for a message class that is not declared in allMessages."""
+    return _TOPICS_BY_MESSAGE.get(message)
+
+
+def route_key(owner, msgID):
+    """Returns the key the gateway routes a topic by: its topic ID, or (Owner, msgID) for a topic outside the schema."""
+    topic = TOPICS_BY_KEY.get((owner, msgID))
+    return topic.topicId if topic is not None else (owner, msgID)
+
+
+def queue_key(queuesList, queue, owner):
+    """Returns the key of the queue a topic is sent on: the "Queue:Owner" queue a partitioned gateway dedicates to the owner,
+    if there is one, else the queue declared by the message."""
+    key = queue + ":" + owner
+    return key if key in queuesList else queue
+
+
+def frame_topic_id(frame):
+    """Returns the topic ID of a frame without decoding it."""
+    return FRAME_HEADER.unpack_from(frame)[0]
+
+
+def frame_stamp(frame):
+    """Returns the send time of a stamped frame, None for a frame without it."""
+    if FRAME_HEADER.unpack_from(frame)[2] & FLAG_STAMPED:
+        return _STAMP.unpack_from(frame, FRAME_HEADER.size)[0]
+    return None
+
+
+def frame_trace(frame):
+    """Returns the (send, gateway in, gateway out) times of a traced frame, None for a frame without them."""
+    if frame[3] & FLAG_TRACED:
+        return _TRACE.unpack_from(frame, FRAME_HEADER.size)
+    return None
+
+
+def trace_gateway_in(frame, now):
+    """Returns a traced frame with the time the gateway took it from its queue."""
+    return frame[:TRACE_IN_OFFSET] + _STAMP.pack(now) + frame[TRACE_OUT_OFFSET:]
+
+
+def _payload_offset(flags):
+    if flags & FLAG_TRACED:
+        return FRAME_HEADER.size + _TRACE.size
+    return FRAME_HEADER.size + _STAMP.size if flags & FLAG_STAMPED else FRAME_HEADER.size
+
+
+def payload_size(frame):
+    """Returns the size of the payload of a frame, the size of its blob for a frame referencing one."""
+    flags = FRAME_HEADER.unpack_from(frame)[2]
+    offset = _payload_offset(flags)
+    if flags & FLAG_BLOB:
+        return _LENGTH.unpack_from(frame, offset)[0]
+    return len(frame) - offset
+
+
+def to_blob(frame):
+    """Moves the payload of a frame longer than BLOB_THRESHOLD into a blob.
+
+    Returns:
+        bytes: The frame referencing the blob, or the frame itself if it is short enough.
+    """
+    if len(frame) <= BLOB_THRESHOLD:
+        return frame
+    topicId, codec, flags = FRAME_HEADER.unpack_from(frame)
+    offset = _payload_offset(flags)
+    payload = memoryview(frame)[offset:]
+    name = create_blob(payload).encode("utf-8")
+    return (FRAME_HEADER.pack(topicId, codec, flags | FLAG_BLOB) + frame[FRAME_HEADER.size:offset]
+            + _LENGTH.pack(len(payload)) + _LENGTH.pack(len(name)) + name)
+
+
+def blob_of(frame):
+    """Returns the name of the blob a frame references, None for a frame carrying its payload."""
+    flags = FRAME_HEADER.unpack_from(frame)[2]
+    if not flags & FLAG_BLOB:
+        return None
+    offset = _payload_offset(flags) + _LENGTH.size
+    return decode_payload(CODEC_STR, frame, offset)[0]
+
+
+def from_blob(frame):
+    """Returns a frame carrying its payload again, read from the blob the frame references. Raises FileNotFoundError if
+    the blob was already freed.
+
+    Returns:
+        bytes: The frame with its payload, or the frame itself if it doesn't reference a blob.
+    """
+    topicId, codec, flags = FRAME_HEADER.unpack_from(frame)
+    if not flags & FLAG_BLOB:
+        return frame
+    offset = _payload_offset(flags)
+    size = _LENGTH.unpack_from(frame, offset)[0]
+    name = decode_payload(CODEC_STR, frame, offset + _LENGTH.size)[0]
+    return FRAME_HEADER.pack(topicId, codec, flags & ~FLAG_BLOB) + frame[FRAME_HEADER.size:offset] + read_blob(name, size)
+
+
+def restamp(frame, stamp):
+    """Returns a stamped frame with another send time, e.g. a recorded frame sent again. A frame without it is returned as it is."""
+    if not FRAME_HEADER.unpack_from(frame)[2] & FLAG_STAMPED:
+        return frame
+    return frame[:FRAME_HEADER.size] + _STAMP.pack(stamp) + frame[FRAME_HEADER.size + _STAMP.size:]
+
+
+def _decode_frame_payload(frame):
+    """Returns the topic ID and the value of a frame, reading the blob of a frame referencing one."""
+    topicId, codec, flags = FRAME_HEADER.unpack_from(frame)
+    offset = _payload_offset(flags)
+    if flags & FLAG_BLOB:
+        size = _LENGTH.unpack_from(frame, offset)[0]
+        name = decode_payload(CODEC_STR, frame, offset + _LENGTH.size)[0]
+        return topicId, decode_payload(codec, read_blob(name, size), 0)[0]
+    return topicId, decode_payload(codec, frame, offset)[0]
+
+
+def decode_value(frame):
+    """Decodes only the value of a frame."""
+    return _decode_frame_payload(frame)[1]
+
+
+def decode(frame):
+    """Decodes a frame.
+
+    Returns:
+        tuple: The Topic and the value.
+    """
+    topicId, value = _decode_frame_payload(frame)
+    return TOPICS_BY_ID[topicId], value
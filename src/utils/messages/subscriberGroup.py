@@ -0,0 +1,113 @@
+# Copyright (c) 2019, Bosch Engineering Center Cluj and BFMC organizers
+# All rights reserved.
+
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met:
+
+# 1. Redistributions of source code must retain the above copyright notice, this
+#    list of conditions and the following disclaimer.
+
+# 2. Redistributions in binary form must reproduce the above copyright notice,
+#    this list of conditions and the following disclaimer in the documentation
+#    and/or other materials provided with the distribution.
+
+# 3. Neither the name of the copyright holder nor the names of its
+#    contributors may be used to endorse or promote products derived from
+#    this software without specific prior written permission.
+
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS"
+# AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE
+# IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE
+# DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT HOLDER OR CONTRIBUTORS BE LIABLE
+# FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL
+# DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR
+# SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER
+# CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY,
+# OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE
+# OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE
+
+import time
+from multiprocessing.connection import wait
+
+
+class SubscriberGroup:
+    """Waits on many subscribers at once, instead of polling every one of them in turn.\n
+    wait blocks until at least one subscriber of the group has a message and returns only those, so an idle reader
+    doesn't spend a syscall per subscriber per cycle and wakes up as soon as a message arrives. The subscribers of an inbox
+    share its pipe: the group waits on it once and pumps it once per wake up, see messageInbox.
+
+    Args:
+        subscribers (list of messageHandlerSubscriber, optional): The subscribers of the group.
+        waiter (function, optional): Waits on a list of file descriptors with a timeout and returns the readable ones, like
+            multiprocessing.connection.wait, which is the default. An eventlet process passes a green one, so only its
+            greenlet blocks.
+    """
+
+    def __init__(self, subscribers=(), waiter=wait):
+        self._subscribers = list(subscribers)
+        self._waiter = waiter
+        self._build()
+
+    def add(self, subscriber):
+        """Adds a subscriber to the group."""
+        self._subscribers.append(subscriber)
+        self._build()
+
+    def remove(self, subscriber):
+        """Removes a subscriber from the group."""
+        self._subscribers.remove(subscriber)
+        self._build()
+
+    def _build(self):
+        # subscribers with a pipe of their own: {fd: subscriber}
+        self._pipes = {}
+        # subscribers of an inbox: {fd: (inbox channel, [subscriber, ...])}
+        self._inboxes = {}
+        for subscriber in self._subscribers:
+            mailbox = subscriber._mailbox
+            if mailbox is None:
+                self._pipes[subscriber.fileno()] = subscriber
+            else:
+                self._inboxes.setdefault(mailbox.fileno(), (mailbox.channel, []))[1].append(subscriber)
+        self._fds = list(self._pipes) + list(self._inboxes)
+
+    def wait(self, timeout=None):
+        """Blocks until at least one subscriber of the group has a message, for at most timeout seconds.
+
+        Args:
+            timeout (float, optional): The longest time to wait, in seconds. None waits until a message arrives. Defaults to None.
+
+        Returns:
+            list: The subscribers with a message, in the order they were added to the group. Empty if the timeout expired.
+        """
+        deadline = None if timeout is None else time.monotonic() + timeout
+        ready = self._buffered()
+        while not ready:
+            remaining = None if deadline is None else deadline - time.monotonic()
+            if remaining is not None and remaining <= 0:
+                return []
+            readable = self._waiter(self._fds, remaining)
+            if not readable:
+                return []
+            for fd in readable:
+                subscriber = self._pipes.get(fd)
+                if subscriber is not None:
+                    ready.add(subscriber)
+                else:
+                    channel = self._inboxes[fd][0]
+                    with channel.condition:
+                        channel.pump()
+            # an inbox may have held messages only for subscribers outside the group, then the group waits again
+            ready |= self._buffered()
+        return [subscriber for subscriber in self._subscribers if subscriber in ready]
+
+    def _buffered(self):
+        """Returns the subscribers with messages already read from their pipe or moved into their mailbox, without any syscall."""
+        return {
+            subscriber
+            for subscriber in self._subscribers
+            if subscriber._pending or (subscriber._mailbox is not None and subscriber._mailbox.messages)
+        }
+
+    def __len__(self):
+        return len(self._subscribers)
@@ -1,4 +1,5 @@
 import threading
+from queue import Full
 
 class QueueWriter:
     def __init__(self, queue):
@@ -30,7 +31,11 @@ class QueueWriter:
             line, self.local.buffer = self.local.buffer.split("\n", 1)
             # Only add non-empty messages to avoid clutter
             if line.strip():
-                self.queue.put(line)
+                try:
+                    self.queue.put_nowait(line)
+                except Full:
+                    # nobody reads the logs, printing must not block
+                    pass
 
     def flush(self):
         pass  # Needed for file-like interface
@@ -0,0 +1,75 @@
+# Copyright (c) 2019, Bosch Engineering Center Cluj and BFMC organizers
+# All rights reserved.
+
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met:
+
+# 1. Redistributions of source code must retain the above copyright notice, this
+#    list of conditions and the following disclaimer.
+
+# 2. Redistributions in binary form must reproduce the above copyright notice,
+#    this list of conditions and the following disclaimer in the documentation
+#    and/or other materials provided with the distribution.
+
+# 3. Neither the name of the copyright holder nor the names of its
+#    contributors may be used to endorse or promote products derived from
+#    this software without specific prior written permission.
+
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS"
+# AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE
+# IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE
+# DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT HOLDER OR CONTRIBUTORS BE LIABLE
+# FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL
+# DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR
+# SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER
+# CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY,
+# OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE
+# OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE
+
+# Shared memory store of the values too large to travel through the queues and the pipes of the bus. A blob is created by
+# the sender, in a segment of its own, and only its name travels on the bus (see the BLOB flag in messageSchema).
+# The gateway counts the subscribers it delivers a blob to, every subscriber releases the blob once read and the gateway
+# unlinks it after the last release. The segments aren't tracked by the resource tracker of any process, so a blob
+# outlives the sender and is unlinked by the gateway.
+
+import itertools
+import os
+
+from src.utils.sharedmemory.segments import create_untracked_segment, open_untracked_segment, unlink_untracked_segment
+
+# the values whose encoded payload is longer than this many bytes travel as blobs
+BLOB_THRESHOLD = 64 * 1024
+
+_counter = itertools.count()
+
+
+def create_blob(data):
+    """Copies data into a new blob.
+
+    Args:
+        data (bytes-like): The content of the blob.
+
+    Returns:
+        str: The name of the blob.
+    """
+    name = "blob_%d_%d" % (os.getpid(), next(_counter))
+    segment = create_untracked_segment(name, len(data))
+    try:
+        segment.buf[:len(data)] = data
+    finally:
+        segment.close()
+    return name
+
+
+def read_blob(name, size):
+    """Returns a copy of the first size bytes of a blob. A blob already freed raises FileNotFoundError."""
+    segment = open_untracked_segment(name)
+    try:
+        return bytes(segment.buf[:size])
+    finally:
+        segment.close()
+
+
+def release_blob(name):
+    """Frees a blob."""
+    unlink_untracked_segment(name)
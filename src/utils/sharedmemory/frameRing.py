@@ -0,0 +1,187 @@
+# Copyright (c) 2019, Bosch Engineering Center Cluj and BFMC organizers
+# All rights reserved.
+
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met:
+
+# 1. Redistributions of source code must retain the above copyright notice, this
+#    list of conditions and the following disclaimer.
+
+# 2. Redistributions in binary form must reproduce the above copyright notice,
+#    this list of conditions and the following disclaimer in the documentation
+#    and/or other materials provided with the distribution.
+
+# 3. Neither the name of the copyright holder nor the names of its
+#    contributors may be used to endorse or promote products derived from
+#    this software without specific prior written permission.
+
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS"
+# AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE
+# IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE
+# DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT HOLDER OR CONTRIBUTORS BE LIABLE
+# FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL
+# DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR
+# SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER
+# CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY,
+# OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE
+# OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE
+
+import struct
+import time
+
+from src.utils.sharedmemory.segments import create_segment, attach_segment, release_segment
+
+# ring header: magic, slot count, slot size, generation
+_HEADER = struct.Struct("<4sIIQ")
+# slot header: sequence counter, payload size
+_SLOT_HEADER = struct.Struct("<QQ")
+_MAGIC = b"FRNG"
+
+
+class FrameRing:
+    """Fixed slot ring of frames living in shared memory.\n
+    The producer writes a frame into the next slot and publishes only the returned descriptor on the bus. Consumers attach to the
+    ring by the name found in the descriptor and map the frame bytes without copying them.\n
+    Every slot carries a sequence counter which is odd while the producer writes the slot and even once the frame is complete.
+    A descriptor is valid as long as the counter of its slot still holds the sequence from the descriptor, so a consumer that
+    keeps a view for longer than (slotCount - 1) frames has to check it with is_valid().
+
+    Args:
+        segment (multiprocessing.shared_memory.SharedMemory): The segment holding the ring.
+        name (str): The name of the ring.
+        owner (bool): True for the producer, which is the only process allowed to write and unlink the ring.
+    """
+
+    def __init__(self, segment, name, owner):
+        self._segment = segment
+        self._buffer = segment.buf
+        self.name = name
+        self._owner = owner
+        _, self.slotCount, self.slotSize, self.generation = _HEADER.unpack_from(self._buffer, 0)
+        self._next = 0
+        self._sequences = [0] * self.slotCount
+
+    # ===================================== CREATE / ATTACH ==================================
+    @classmethod
+    def create(cls, name, slotSize, slotCount=4):
+        """Creates the ring in the producer process.
+
+        Args:
+            name (str): The name of the ring, usually the name of the message carrying its descriptors.
+            slotSize (int): The biggest frame, in bytes, which can be written into the ring.
+            slotCount (int, optional): The number of slots. Defaults to 4.
+        """
+        segment = create_segment("ring_" + name, _HEADER.size + slotCount * (_SLOT_HEADER.size + slotSize))
+        _HEADER.pack_into(segment.buf, 0, _MAGIC, slotCount, slotSize, time.time_ns())
+        for slot in range(slotCount):
+            _SLOT_HEADER.pack_into(segment.buf, cls._slot_offset(slotCount, slotSize, slot), 0, 0)
+        return cls(segment, name, True)
+
+    @classmethod
+    def attach(cls, name, reopen=False):
+        """Attaches to a ring created by another process."""
+        segment = attach_segment("ring_" + name, reopen)
+        if _HEADER.unpack_from(segment.buf, 0)[0] != _MAGIC:
+            raise ValueError("Shared memory segment %s is not a frame ring" % name)
+        return cls(segment, name, False)
+
+    @staticmethod
+    def _slot_offset(slotCount, slotSize, slot):
+        return _HEADER.size + slot * (_SLOT_HEADER.size + slotSize)
+
+    # ===================================== WRITE ============================================
+    def write(self, frame):
+        """Copies a frame into the next slot of the ring.
+
+        Args:
+            frame (bytes-like or numpy.ndarray): The frame to be written.
+
+        Returns:
+            dict: The descriptor of the frame, which is the value sent on the bus.
+        """
+        view = memoryview(frame)
+        if not view.c_contiguous:
+            view = memoryview(view.tobytes())
+        data = view.cast("B")
+        size = data.nbytes
+        if size > self.slotSize:
+            raise ValueError("Frame of %d bytes does not fit the %d bytes slots of ring %s" % (size, self.slotSize, self.name))
+
+        slot = self._next
+        self._next = (slot + 1) % self.slotCount
+        offset = self._slot_offset(self.slotCount, self.slotSize, slot)
+        sequence = self._sequences[slot] + 1
+
+        # odd sequence while the slot is being written
+        _SLOT_HEADER.pack_into(self._buffer, offset, sequence, size)
+        start = offset + _SLOT_HEADER.size
+        self._buffer[start:start + size] = data
+        sequence += 1
+        _SLOT_HEADER.pack_into(self._buffer, offset, sequence, size)
+        self._sequences[slot] = sequence
+
+        descriptor = {"ring": self.name, "gen": self.generation, "slot": slot, "seq": sequence, "size": size}
+        if hasattr(frame, "shape") and hasattr(frame, "dtype"):
+            descriptor["shape"] = tuple(frame.shape)
+            descriptor["dtype"] = frame.dtype.str
+        return descriptor
+
+    # ===================================== READ =============================================
+    def is_valid(self, descriptor):
+        """Checks that the slot of the descriptor was not overwritten since the descriptor was published."""
+        offset = self._slot_offset(self.slotCount, self.slotSize, descriptor["slot"])
+        return _SLOT_HEADER.unpack_from(self._buffer, offset)[0] == descriptor["seq"]
+
+    def view(self, descriptor):
+        """Returns a zero-copy memoryview of the frame, or None if the slot was already overwritten."""
+        if not self.is_valid(descriptor):
+            return None
+        start = self._slot_offset(self.slotCount, self.slotSize, descriptor["slot"]) + _SLOT_HEADER.size
+        return self._buffer[start:start + descriptor["size"]]
+
+    def read(self, descriptor):
+        """Returns a copy of the frame as bytes, or None if the slot was overwritten before or while copying it."""
+        view = self.view(descriptor)
+        if view is None:
+            return None
+        data = bytes(view)
+        view.release()
+        if not self.is_valid(descriptor):
+            return None
+        return data
+
+    def array(self, descriptor):
+        """Returns a zero-copy numpy array of the frame, or None if the slot was already overwritten."""
+        import numpy as np
+
+        view = self.view(descriptor)
+        if view is None:
+            return None
+        if "shape" not in descriptor:
+            return np.frombuffer(view, dtype=np.uint8)
+        return np.ndarray(descriptor["shape"], dtype=np.dtype(descriptor["dtype"]), buffer=view)
+
+    # ===================================== CLOSE ============================================
+    def close(self):
+        """Releases the ring. The producer also removes it from the system."""
+        self._buffer = None
+        if self._owner:
+            release_segment(self._segment)
+
+
+_rings = {}
+
+
+def get_frame_ring(descriptor):
+    """Returns the ring of a descriptor received from the bus, attaching to it the first time it is needed in this process.\n
+    A descriptor from a newer generation means the producer was restarted and created the ring again, so the ring is attached again.
+    """
+    name = descriptor["ring"]
+    ring = _rings.get(name)
+    if ring is None:
+        ring = FrameRing.attach(name)
+        _rings[name] = ring
+    elif ring.generation != descriptor["gen"]:
+        ring = FrameRing.attach(name, reopen=True)
+        _rings[name] = ring
+    return ring
@@ -0,0 +1,152 @@
+# Copyright (c) 2019, Bosch Engineering Center Cluj and BFMC organizers
+# All rights reserved.
+
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met:
+
+# 1. Redistributions of source code must retain the above copyright notice, this
+#    list of conditions and the following disclaimer.
+
+# 2. Redistributions in binary form must reproduce the above copyright notice,
+#    this list of conditions and the following disclaimer in the documentation
+#    and/or other materials provided with the distribution.
+
+# 3. Neither the name of the copyright holder nor the names of its
+#    contributors may be used to endorse or promote products derived from
+#    this software without specific prior written permission.
+
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS"
+# AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE
+# IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE
+# DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT HOLDER OR CONTRIBUTORS BE LIABLE
+# FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL
+# DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR
+# SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER
+# CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY,
+# OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE
+# OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE
+
+import sys
+from multiprocessing import shared_memory, resource_tracker
+
+SEGMENT_PREFIX = "bfmc_"
+
+_attached = {}
+
+
+def create_segment(name, size):
+    """Creates a named shared memory segment owned by the calling process.\n
+    A segment left behind by a crashed run is unlinked and created again.
+
+    Args:
+        name (str): The name of the segment, without the system prefix.
+        size (int): The size of the segment in bytes.
+
+    Returns:
+        multiprocessing.shared_memory.SharedMemory: The created segment.
+    """
+    fullName = SEGMENT_PREFIX + name
+    try:
+        return shared_memory.SharedMemory(name=fullName, create=True, size=size)
+    except FileExistsError:
+        stale = shared_memory.SharedMemory(name=fullName)
+        stale.close()
+        stale.unlink()
+        return shared_memory.SharedMemory(name=fullName, create=True, size=size)
+
+
+def attach_segment(name, reopen=False):
+    """Attaches to a segment created by another process. The attachment is cached for the lifetime of the process.\n
+    The segment is not registered with the resource tracker, so a reader exiting never unlinks the segment of the owner.
+
+    Args:
+        name (str): The name of the segment, without the system prefix.
+        reopen (bool, optional): Drops the cached attachment first, used when the owner created the segment again. Defaults to False.
+
+    Returns:
+        multiprocessing.shared_memory.SharedMemory: The attached segment.
+    """
+    segment = _attached.get(name)
+    if segment is not None and reopen:
+        try:
+            segment.close()
+        except BufferError:
+            pass
+        segment = None
+    if segment is None:
+        segment = _open_untracked(SEGMENT_PREFIX + name)
+        _attached[name] = segment
+    return segment
+
+
+def create_untracked_segment(name, size):
+    """Creates a named segment which outlives the calling process, for a segment freed by another process.\n
+    A segment left behind by a crashed run is unlinked and created again.
+
+    Args:
+        name (str): The name of the segment, without the system prefix.
+        size (int): The size of the segment in bytes.
+
+    Returns:
+        multiprocessing.shared_memory.SharedMemory: The created segment.
+    """
+    fullName = SEGMENT_PREFIX + name
+    try:
+        return _untracked(fullName, create=True, size=size)
+    except FileExistsError:
+        unlink_untracked_segment(name)
+        return _untracked(fullName, create=True, size=size)
+
+
+def open_untracked_segment(name):
+    """Opens a segment created by another process, without caching the attachment nor registering it with the resource tracker."""
+    return _open_untracked(SEGMENT_PREFIX + name)
+
+
+def unlink_untracked_segment(name):
+    """Unlinks a segment created with create_untracked_segment, by any process. A missing segment is ignored."""
+    try:
+        segment = _open_untracked(SEGMENT_PREFIX + name)
+    except FileNotFoundError:
+        return
+    segment.close()
+    if sys.version_info >= (3, 13):
+        segment.unlink()
+    else:
+        _without_tracker(segment.unlink)
+
+
+def _open_untracked(fullName):
+    """Opens an existing segment without registering it with the resource tracker."""
+    return _untracked(fullName)
+
+
+def _untracked(fullName, create=False, size=0):
+    if sys.version_info >= (3, 13):
+        return shared_memory.SharedMemory(name=fullName, create=create, size=size, track=False) # type: ignore
+    return _without_tracker(shared_memory.SharedMemory, name=fullName, create=create, size=size)
+
+
+def _without_tracker(function, *args, **kwargs):
+    """Calls function with the resource tracker disabled.\n
+    Older versions always register a segment and unregister it on unlink. With forked children the tracker is shared with
+    the owner, so unregistering afterwards would drop the registration of the owner as well."""
+    register, unregister = resource_tracker.register, resource_tracker.unregister
+    resource_tracker.register = resource_tracker.unregister = lambda name, rtype: None
+    try:
+        return function(*args, **kwargs)
+    finally:
+        resource_tracker.register, resource_tracker.unregister = register, unregister
+
+
+def release_segment(segment):
+    """Closes and unlinks a segment created with create_segment."""
+    try:
+        segment.close()
+    except BufferError:
+        # a view of the segment is still alive, the mapping goes away with the process
+        pass
+    try:
+        segment.unlink()
+    except FileNotFoundError:
+        pass
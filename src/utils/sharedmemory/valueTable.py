@@ -0,0 +1,207 @@
+# Copyright (c) 2019, Bosch Engineering Center Cluj and BFMC organizers
+# All rights reserved.
+
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met:
+
+# 1. Redistributions of source code must retain the above copyright notice, this
+#    list of conditions and the following disclaimer.
+
+# 2. Redistributions in binary form must reproduce the above copyright notice,
+#    this list of conditions and the following disclaimer in the documentation
+#    and/or other materials provided with the distribution.
+
+# 3. Neither the name of the copyright holder nor the names of its
+#    contributors may be used to endorse or promote products derived from
+#    this software without specific prior written permission.
+
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS"
+# AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE
+# IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE
+# DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT HOLDER OR CONTRIBUTORS BE LIABLE
+# FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL
+# DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR
+# SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER
+# CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY,
+# OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE
+# OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE
+
+import struct
+import threading
+import time
+
+from src.utils.sharedmemory.segments import create_segment, attach_segment, release_segment
+
+# the table of the current telemetry of the car, written by the serial handler, see threadRead
+TELEMETRY_TABLE = "telemetry"
+
+# table header: magic, slot count, generation
+_HEADER = struct.Struct("<4sIQ")
+# directory entry of a slot: message name, value type
+_ENTRY = struct.Struct("<31sc")
+# slot header: sequence counter, change counter, monotonic time of the last write
+_SLOT_HEADER = struct.Struct("<QQd")
+_COUNTER = struct.Struct("<Q")
+_CHANGES = struct.Struct("<Qd")
+_SLOT_SIZE = _SLOT_HEADER.size + 8
+_MAGIC = b"LVTB"
+# written over the magic by the owner closing the table, so the readers attach again to the next one
+_CLOSED = b"DEAD"
+# the value types of the slots, by the msgType of the message
+_TYPES = {"float": b"d", "int": b"q", "bool": b"?"}
+# the most times a reader tries again while the writer is writing the slot
+_RETRIES = 1000
+
+
+class ValueTable:
+    """Table of the latest values of some topics, living in shared memory.\n
+    Topics like CurrentSpeed or BatteryLvl are a current state more than a stream of events: a process which only needs the
+    latest value reads it from the table, without a subscription nor any message, instead of draining a pipe.\n
+    The table has a typed slot per message (float, int or bool), named in a directory at the start of the segment, so the
+    readers attach by the name of the table only. Every slot carries a sequence counter which is odd while the owner writes
+    the slot (a seqlock): a reader copies the slot and tries again if the counter was odd or changed meanwhile. A change
+    counter, incremented by every write, tells a reader whether the value was written again since it last looked.
+
+    Args:
+        segment (multiprocessing.shared_memory.SharedMemory): The segment holding the table.
+        name (str): The name of the table.
+        owner (bool): True for the writer, which is the only process allowed to write and unlink the table.
+    """
+
+    def __init__(self, segment, name, owner):
+        self._segment = segment
+        self._buffer = segment.buf
+        self.name = name
+        self._owner = owner
+        _, slotCount, self.generation = _HEADER.unpack_from(self._buffer, 0)
+        # {message name: (offset of the slot, struct of the value)}
+        self._slotsByName = {}
+        for slot in range(slotCount):
+            name, code = _ENTRY.unpack_from(self._buffer, _HEADER.size + slot * _ENTRY.size)
+            self._slotsByName[name.rstrip(b"\0").decode()] = (self._slot_offset(slotCount, slot), struct.Struct("<" + code.decode()))
+        # the same, by message, filled on first use
+        self._slots = {}
+        # the threads of the owner writing the table
+        self._lock = threading.Lock()
+
+    # ===================================== CREATE / ATTACH ==================================
+    @classmethod
+    def create(cls, name, messages):
+        """Creates the table in the writer process.
+
+        Args:
+            name (str): The name of the table.
+            messages (list of enum): The messages of allMessages with a slot in the table, of msgType float, int or bool.
+        """
+        for message in messages:
+            if message.msgType.value not in _TYPES:
+                raise ValueError("Message %s of type %s can't have a slot in value table %s" % (message.__name__, message.msgType.value, name))
+        segment = create_segment("values_" + name, _HEADER.size + len(messages) * (_ENTRY.size + _SLOT_SIZE))
+        _HEADER.pack_into(segment.buf, 0, _MAGIC, len(messages), time.time_ns())
+        for slot, message in enumerate(messages):
+            _ENTRY.pack_into(segment.buf, _HEADER.size + slot * _ENTRY.size, message.__name__.encode(), _TYPES[message.msgType.value])
+            segment.buf[cls._slot_offset(len(messages), slot):cls._slot_offset(len(messages), slot + 1)] = bytes(_SLOT_SIZE)
+        return cls(segment, name, True)
+
+    @classmethod
+    def attach(cls, name, reopen=False):
+        """Attaches to a table created by another process."""
+        segment = attach_segment("values_" + name, reopen)
+        if _HEADER.unpack_from(segment.buf, 0)[0] != _MAGIC:
+            raise ValueError("Shared memory segment %s is not an open value table" % name)
+        return cls(segment, name, False)
+
+    @staticmethod
+    def _slot_offset(slotCount, slot):
+        return _HEADER.size + slotCount * _ENTRY.size + slot * _SLOT_SIZE
+
+    def _slot(self, message):
+        slot = self._slots.get(message)
+        if slot is None:
+            slot = self._slotsByName.get(message.__name__)
+            if slot is None:
+                raise KeyError("Message %s has no slot in value table %s" % (message.__name__, self.name))
+            self._slots[message] = slot
+        return slot
+
+    def is_closed(self):
+        """Checks if the owner closed the table, a reader then has to attach again to read the next one."""
+        return self._buffer is None or _HEADER.unpack_from(self._buffer, 0)[0] != _MAGIC
+
+    # ===================================== WRITE ============================================
+    def write(self, message, value):
+        """Writes the latest value of a message into its slot.
+
+        Args:
+            message (enum): The message of the slot.
+            value (float, int or bool): The value, of the msgType of the message.
+        """
+        offset, valueStruct = self._slot(message)
+        with self._lock:
+            if self._buffer is None:
+                return
+            sequence, count, _ = _SLOT_HEADER.unpack_from(self._buffer, offset)
+            # odd sequence while the slot is being written, the readers try again
+            _COUNTER.pack_into(self._buffer, offset, sequence + 1)
+            _CHANGES.pack_into(self._buffer, offset + _COUNTER.size, count + 1, time.monotonic())
+            valueStruct.pack_into(self._buffer, offset + _SLOT_HEADER.size, value)
+            _COUNTER.pack_into(self._buffer, offset, sequence + 2)
+
+    # ===================================== READ =============================================
+    def read_entry(self, message):
+        """Reads the slot of a message.
+
+        Returns:
+            tuple: (value, change count, monotonic time of the last write). The value is None while the slot was never
+            written, or if the writer stopped in the middle of writing it.
+        """
+        offset, valueStruct = self._slot(message)
+        buffer = self._buffer
+        for attempt in range(_RETRIES):
+            sequence = _COUNTER.unpack_from(buffer, offset)[0]
+            if sequence & 1:
+                # the writer was preempted in the middle of the slot, lets it finish
+                time.sleep(0)
+                continue
+            _, count, stamp = _SLOT_HEADER.unpack_from(buffer, offset)
+            value = valueStruct.unpack_from(buffer, offset + _SLOT_HEADER.size)[0]
+            if _COUNTER.unpack_from(buffer, offset)[0] == sequence:
+                return (value if count else None), count, stamp
+        return None, 0, 0.0
+
+    def read(self, message):
+        """Returns the latest value of a message, None while it was never written."""
+        return self.read_entry(message)[0]
+
+    def count(self, message):
+        """Returns the change counter of a message: how many times its value was written. Reading it takes no lock,
+        a reader compares it with the count it saw last to know whether the value was written again."""
+        return _COUNTER.unpack_from(self._buffer, self._slot(message)[0] + _COUNTER.size)[0]
+
+    # ===================================== CLOSE ============================================
+    def close(self):
+        """Releases the table. The owner also marks it as closed for the readers and removes it from the system."""
+        with self._lock:
+            if self._owner and self._buffer is not None:
+                self._buffer[0:len(_CLOSED)] = _CLOSED
+            self._buffer = None
+        if self._owner:
+            release_segment(self._segment)
+
+
+_tables = {}
+
+
+def get_value_table(name=TELEMETRY_TABLE):
+    """Returns a table created by another process, attaching to it the first time it is needed in this process.\n
+    A table closed by its owner is attached again, to the one the owner created after restarting.
+
+    Raises:
+        FileNotFoundError: The owner didn't create the table yet.
+    """
+    table = _tables.get(name)
+    if table is None:
+        table = _tables[name] = ValueTable.attach(name)
+    elif table.is_closed():
+        table = _tables[name] = ValueTable.attach(name, reopen=True)
+    return table
@@ -0,0 +1,66 @@
+# Copyright (c) 2019, Bosch Engineering Center Cluj and BFMC organizers
+# All rights reserved.
+
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met:
+
+# 1. Redistributions of source code must retain the above copyright notice, this
+#    list of conditions and the following disclaimer.
+
+# 2. Redistributions in binary form must reproduce the above copyright notice,
+#    this list of conditions and the following disclaimer in the documentation
+#    and/or other materials provided with the distribution.
+
+# 3. Neither the name of the copyright holder nor the names of its
+#    contributors may be used to endorse or promote products derived from
+#    this software without specific prior written permission.
+
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS"
+# AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE
+# IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE
+# DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT HOLDER OR CONTRIBUTORS BE LIABLE
+# FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL
+# DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR
+# SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER
+# CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY,
+# OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE
+# OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE
+
+import logging
+import time
+from multiprocessing import Queue
+
+from conftest import settle
+
+from src.gateway.threads.threadGateway import threadGateway
+from src.utils.messages.allMessages import mainCamera
+from src.utils.messages.messageHandlerSender import messageHandlerSender
+from src.utils.messages.messageHandlerSubscriber import messageHandlerSubscriber
+from src.utils.messages.messageSchema import topic_of
+from src.utils.sharedmemory.blobStore import BLOB_THRESHOLD
+
+
+# the gateway tells the subscriptions apart by the class of their receiver
+class Reader:
+    def subscribe(self, queueList):
+        return messageHandlerSubscriber(queueList, mainCamera, "fifo", True)
+
+
+def test_the_lease_never_frees_the_blob_of_a_latched_message(monkeypatch):
+    # no latched topic of allMessages is large enough for a blob
+    monkeypatch.setattr(topic_of(mainCamera), "latched", True)
+    queueList = {"Critical": Queue(), "Warning": Queue(), "General": Queue(), "Config": Queue()}
+    gateway = threadGateway(queueList, logging.getLogger(), False, blobLease=0.2)
+    gateway.start()
+    try:
+        # a subscriber which never reads, its reference to the blob expires
+        messageHandlerSubscriber(queueList, mainCamera, "fifo", True)
+        settle()
+        value = {"image": "x" * (2 * BLOB_THRESHOLD)}
+        messageHandlerSender(queueList, mainCamera).send(value)
+        # the gateway sweeps the expired blobs every second
+        time.sleep(1.5)
+        assert Reader().subscribe(queueList).receive_with_block() == value
+    finally:
+        gateway.stop()
+        gateway.join(2)
@@ -0,0 +1,106 @@
+# Copyright (c) 2019, Bosch Engineering Center Cluj and BFMC organizers
+# All rights reserved.
+
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met:
+
+# 1. Redistributions of source code must retain the above copyright notice, this
+#    list of conditions and the following disclaimer.
+
+# 2. Redistributions in binary form must reproduce the above copyright notice,
+#    this list of conditions and the following disclaimer in the documentation
+#    and/or other materials provided with the distribution.
+
+# 3. Neither the name of the copyright holder nor the names of its
+#    contributors may be used to endorse or promote products derived from
+#    this software without specific prior written permission.
+
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS"
+# AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE
+# IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE
+# DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT HOLDER OR CONTRIBUTORS BE LIABLE
+# FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL
+# DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR
+# SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER
+# CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY,
+# OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE
+# OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE
+
+import select
+import threading
+import time
+from multiprocessing import Queue
+
+import pytest
+
+from conftest import settle
+
+from src.utils.messages.allMessages import Brake, CurrentSpeed, mainCamera
+from src.utils.messages.dropCounters import create_drop_counters, read_drops
+from src.utils.messages.messageHandlerSender import messageHandlerSender
+from src.utils.messages.messageHandlerSubscriber import messageHandlerSubscriber
+from src.utils.messages.messageSchema import decode_value
+
+
+def read_slowly(subscriber, count, values):
+    """Reads count messages, pausing now and then so the pipe fills up."""
+    deadline = time.monotonic() + 20
+    while len(values) < count and time.monotonic() < deadline:
+        value = subscriber.receive()
+        if value is None:
+            time.sleep(0.001)
+            continue
+        values.append(value)
+        if len(values) % 500 == 0:
+            time.sleep(0.02)
+
+
+def test_never_drops_a_direct_frame(queueList):
+    create_drop_counters(queueList)
+    subscriber = messageHandlerSubscriber(queueList, Brake, "fifo", True)
+    settle()
+    sender = messageHandlerSender(queueList, Brake)
+    settle()
+    # the first send picks up the pipes of the subscribers, from then on the frames skip the gateway
+    sender.send("-1")
+    assert subscriber.receive_with_block() == "-1"
+    assert sender._channels
+
+    count = 10000
+    values = []
+    reader = threading.Thread(target=read_slowly, args=(subscriber, count, values))
+    reader.start()
+    for value in range(count):
+        sender.send(str(value))
+    reader.join()
+
+    assert values == [str(value) for value in range(count)]
+    assert read_drops(queueList) == {}
+
+
+def test_drop_newest_counts_the_drops_of_a_full_queue():
+    # no gateway reads the queues, the sender fills them
+    queueList = {name: Queue(maxsize=3) for name in ("Critical", "Warning", "General", "Config")}
+    create_drop_counters(queueList)
+    sender = messageHandlerSender(queueList, CurrentSpeed)
+    for value in range(10):
+        sender.send(float(value))
+    assert read_drops(queueList) == {"CurrentSpeed": 7}
+
+
+def test_drop_oldest_keeps_the_newest_messages_of_a_full_queue():
+    # no gateway reads the queues, the sender evicts the oldest frames to make room
+    queueList = {name: Queue(maxsize=3) for name in ("Critical", "Warning", "General", "Config")}
+    create_drop_counters(queueList)
+    sender = messageHandlerSender(queueList, mainCamera)
+    for value in range(10):
+        sender.send({"slot": value})
+    assert read_drops(queueList) == {"mainCamera": 7}
+    assert [decode_value(queueList["General"].get(timeout=1))["slot"] for _ in range(3)] == [7, 8, 9]
+
+
+def test_a_direct_frame_longer_than_pipe_buf_is_refused():
+    queueList = {name: Queue() for name in ("Critical", "Warning", "General", "Config")}
+    sender = messageHandlerSender(queueList, Brake)
+    with pytest.raises(ValueError):
+        sender.send("0" * select.PIPE_BUF)
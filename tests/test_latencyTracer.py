@@ -0,0 +1,84 @@
+# Copyright (c) 2019, Bosch Engineering Center Cluj and BFMC organizers
+# All rights reserved.
+
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met:
+
+# 1. Redistributions of source code must retain the above copyright notice, this
+#    list of conditions and the following disclaimer.
+
+# 2. Redistributions in binary form must reproduce the above copyright notice,
+#    this list of conditions and the following disclaimer in the documentation
+#    and/or other materials provided with the distribution.
+
+# 3. Neither the name of the copyright holder nor the names of its
+#    contributors may be used to endorse or promote products derived from
+#    this software without specific prior written permission.
+
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS"
+# AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE
+# IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE
+# DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT HOLDER OR CONTRIBUTORS BE LIABLE
+# FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL
+# DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR
+# SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER
+# CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY,
+# OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE
+# OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE
+
+import fnmatch
+import json
+import os
+import time
+from multiprocessing import get_context
+
+from conftest import settle
+
+from src.utils.messages.allMessages import CurrentSpeed
+from src.utils.messages.latencyTracer import enable_latency_tracing
+from src.utils.messages.messageHandlerSender import messageHandlerSender
+from src.utils.messages.messageHandlerSubscriber import messageHandlerSubscriber
+
+
+class Reader:
+    """Subscribes in the parent process and reads in the child, like a process subscribing in its constructor."""
+
+    def __init__(self, queueList):
+        self.subscriber = messageHandlerSubscriber(queueList, CurrentSpeed, "fifo", True, inbox=False)
+
+    def run(self):
+        deadline = time.monotonic() + 5
+        while self.subscriber.receive() is None and time.monotonic() < deadline:
+            time.sleep(0.01)
+        # the scheduler of the child reports every 0.2 s
+        time.sleep(0.6)
+
+
+class OtherReader(Reader):
+    """A second receiver of the topic, the gateway tells the subscriptions apart by the class of their receiver."""
+
+
+def test_every_process_dumps_its_own_report(queueList, tmp_path):
+    enable_latency_tracing(queueList, dumpDirectory=str(tmp_path), interval=0.2)
+    context = get_context("fork")
+    readers = []
+    for readerClass in (Reader, OtherReader):
+        reader = readerClass(queueList)
+        # the same name for both, the pid keeps their reports apart
+        readers.append(context.Process(target=reader.run, name="Reader"))
+    settle()
+    for process in readers:
+        process.start()
+    messageHandlerSender(queueList, CurrentSpeed).send(1.0)
+    for process in readers:
+        process.join(10)
+
+    reports = {}
+    # a report being replaced when the process exited leaves a .tmp behind
+    for name in fnmatch.filter(os.listdir(tmp_path), "*.json"):
+        with open(os.path.join(tmp_path, name)) as file:
+            reports[name] = json.load(file)
+    assert sorted(reports) == sorted("latency_Reader_%d.json" % process.pid for process in readers)
+    for report in reports.values():
+        assert report["process"] == "Reader"
+        assert report["topics"]["CurrentSpeed"]["count"] == 1
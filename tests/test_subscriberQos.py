@@ -0,0 +1,133 @@
+# Copyright (c) 2019, Bosch Engineering Center Cluj and BFMC organizers
+# All rights reserved.
+
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met:
+
+# 1. Redistributions of source code must retain the above copyright notice, this
+#    list of conditions and the following disclaimer.
+
+# 2. Redistributions in binary form must reproduce the above copyright notice,
+#    this list of conditions and the following disclaimer in the documentation
+#    and/or other materials provided with the distribution.
+
+# 3. Neither the name of the copyright holder nor the names of its
+#    contributors may be used to endorse or promote products derived from
+#    this software without specific prior written permission.
+
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS"
+# AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE
+# IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE
+# DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT HOLDER OR CONTRIBUTORS BE LIABLE
+# FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL
+# DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR
+# SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER
+# CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY,
+# OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE
+# OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE
+
+import asyncio
+import time
+
+from conftest import settle
+
+from src.utils.messages.allMessages import CurrentSpeed
+from src.utils.messages.messageHandlerAsyncSubscriber import messageHandlerAsyncSubscriber
+from src.utils.messages.messageHandlerSender import messageHandlerSender
+from src.utils.messages.messageHandlerSubscriber import messageHandlerSubscriber
+from src.utils.messages.messageSchema import MARK_SYNCED
+
+
+# the gateway tells the subscriptions apart by the class of their receiver
+class LastReader:
+    def subscribe(self, queueList, **kwargs):
+        return messageHandlerSubscriber(queueList, CurrentSpeed, "lastOnly", True, **kwargs)
+
+
+class AsyncLastReader:
+    def subscribe(self, queueList, **kwargs):
+        return messageHandlerAsyncSubscriber(queueList, CurrentSpeed, "lastOnly", True, **kwargs)
+
+
+class FifoReader:
+    def subscribe(self, queueList, **kwargs):
+        return messageHandlerSubscriber(queueList, CurrentSpeed, "fifo", True, **kwargs)
+
+
+def receive_all(subscriber):
+    values = []
+    value = subscriber.receive()
+    while value is not None:
+        values.append(value)
+        value = subscriber.receive()
+    return values
+
+
+def publish(queueList, values):
+    sender = messageHandlerSender(queueList, CurrentSpeed)
+    for value in values:
+        sender.send(float(value))
+    settle()
+
+
+def test_last_only_returns_the_newest_value(queueList):
+    subscriber = LastReader().subscribe(queueList)
+    settle()
+    publish(queueList, range(100))
+    assert subscriber.receive() == 99.0
+    assert subscriber.receive() is None
+
+
+def test_last_only_of_an_inbox_returns_the_newest_value(queueList):
+    subscriber = LastReader().subscribe(queueList, inbox=True)
+    settle()
+    publish(queueList, range(100))
+    assert subscriber.receive() == 99.0
+    assert subscriber.receive() is None
+
+
+def test_last_only_keeps_up_with_new_values(queueList):
+    subscriber = LastReader().subscribe(queueList)
+    settle()
+    for start in range(0, 50, 10):
+        publish(queueList, range(start, start + 10))
+        assert subscriber.receive() == float(start + 9)
+
+
+def test_fifo_with_a_depth_drops_the_oldest_messages(queueList):
+    subscriber = FifoReader().subscribe(queueList, depth=5)
+    settle()
+    publish(queueList, range(100))
+    assert receive_all(subscriber) == [95.0, 96.0, 97.0, 98.0, 99.0]
+
+
+def test_fifo_without_a_depth_drops_nothing(queueList):
+    subscriber = FifoReader().subscribe(queueList)
+    settle()
+    publish(queueList, range(100))
+    assert receive_all(subscriber) == [float(value) for value in range(100)]
+
+
+def test_receive_skips_a_late_mark_without_blocking(queueList):
+    subscriber = LastReader().subscribe(queueList)
+    settle()
+    # a MARK_SYNCED coming after the subscriber stopped waiting for it
+    subscriber._pipeSend.send_bytes(MARK_SYNCED)
+    started = time.monotonic()
+    assert subscriber.receive() is None
+    assert time.monotonic() - started < 0.5
+    publish(queueList, range(10))
+    assert subscriber.receive() == 9.0
+
+
+def test_async_receive_nowait_skips_a_late_mark(queueList):
+    subscriber = AsyncLastReader().subscribe(queueList)
+    settle()
+    subscriber._pipeSend.send_bytes(MARK_SYNCED)
+    assert subscriber.receive_nowait() is None
+    publish(queueList, range(10))
+
+    async def receive():
+        return await asyncio.wait_for(subscriber.receive(), 1)
+
+    assert asyncio.run(receive()) == 9.0